@@ -0,0 +1,279 @@
+"""Offline throughput and latency benchmark for the connector pipeline.
+
+Drives ``pipeline_search`` and ``profile`` from :mod:`services.api.main`
+through every connector in ``CONNECTORS`` against fixtures served by
+:class:`services.fetcher.replay.ReplayTransport`, and reports throughput
+and p50/p95/p99 latency per endpoint. The query cache and kept profile
+states are disabled, so every measured request does the full connector
+fan-out. Profiling the distinct queries as separate concurrent requests is
+then compared round by round with one ``POST /profiles:batch`` of the same
+queries, once for ``--queries`` and once for the Wikidata ids in ``--ids``,
+whose lookups the batch sends upstream together. ``benchmarks/fixtures``
+holds small sample responses for the default queries and ids;
+``--record`` replaces them with live ones (this hits the upstreams once).
+Replay adds simulated latency, jitter and error rates.
+
+Usage::
+
+    python benchmarks/bench_connectors.py --record --fixtures benchmarks/fixtures
+    python benchmarks/bench_connectors.py --fixtures benchmarks/fixtures \\
+        --requests 200 --concurrency 16 --latency-ms 80 --jitter-ms 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import math
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+DEFAULT_QUERIES = ["openai.com", "torvalds", "Ada Lovelace"]
+# Wikidata answers up to 50 of these per request (see WikidataConnector)
+DEFAULT_IDS = [
+    "Q42",
+    "Q7259",
+    "Q937",
+    "Q5879",
+    "Q1339",
+    "Q254",
+    "Q7186",
+    "Q935",
+    "Q1035",
+    "Q8016",
+    "Q76",
+    "Q9682",
+    "Q5582",
+    "Q762",
+    "Q307",
+    "Q34660",
+    "Q692",
+    "Q41421",
+    "Q1001",
+    "Q8023",
+]
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of *samples*."""
+
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarise(latencies: Sequence[float], items: int, elapsed: float) -> Dict:
+    """Throughput of *items* over *elapsed* seconds and latency percentiles."""
+
+    return {
+        "requests": items,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(items / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+async def drive(
+    call: Callable[[str], Awaitable[object]],
+    queries: Sequence[str],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    """Issue *requests* calls cycling through *queries*; return a summary."""
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        async with gate:
+            start = time.perf_counter()
+            await call(queries[i % len(queries)])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarise(latencies, requests, time.perf_counter() - start)
+
+
+async def compare_batch(
+    api, queries: Sequence[str], rounds: int, type: str, timeout_ms: int
+) -> Dict[str, Dict]:
+    """Profile the distinct *queries* separately, then as one batch, per round.
+
+    Latencies are per round: all separate requests, or the whole batch.
+    Returns ``separate`` and ``batch`` summaries.
+    """
+
+    unique = list(dict.fromkeys(queries))
+    items = [api.BatchProfileItem(q=q, type=type) for q in unique]
+    separate: List[float] = []
+    batched: List[float] = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await asyncio.gather(*(api.profile(q, type, timeout_ms) for q in unique))
+        separate.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        response = await api.profiles_batch(items, timeout_ms)
+        async for _ in response.body_iterator:
+            pass
+        batched.append((time.perf_counter() - start) * 1000)
+    count = rounds * len(unique)
+    return {
+        "separate": summarise(separate, count, sum(separate) / 1000),
+        "batch": summarise(batched, count, sum(batched) / 1000),
+    }
+
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixtures", type=Path, default=Path("benchmarks/fixtures"))
+    parser.add_argument(
+        "--record", action="store_true", help="record live responses and exit"
+    )
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES)
+    parser.add_argument(
+        "--ids", nargs="+", default=DEFAULT_IDS, help="Wikidata ids to batch"
+    )
+    parser.add_argument("--type", default="organization")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--rounds", type=int, default=20, help="batch vs separate comparisons"
+    )
+    parser.add_argument("--timeout-ms", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--phase1", action="store_true", help="include PHASE1_CONNECTORS"
+    )
+    parser.add_argument(
+        "--rate-limits",
+        action="store_true",
+        help="keep the sources' published request rates while replaying",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON only")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Sequence[str]) -> int:
+    args = parse_args(argv)
+    if args.phase1:
+        os.environ["PHASE1_CONNECTORS"] = "true"
+
+    # imported late so --phase1 is seen when CONNECTORS is built
+    from services.api import main as api
+    from services.connectors import WikidataConnector, limits
+    from services.connectors.policy import POLICIES
+    from services.fetcher import replay
+
+    if args.record:
+        recorder = replay.RecordingTransport(args.fixtures)
+        replay.install(recorder)
+        if not any(c.source == "wikidata" for c in api.CONNECTORS):
+            api.CONNECTORS.append(WikidataConnector())
+        for query in [*args.queries, *args.ids]:
+            await api.profile(query, args.type, args.timeout_ms)
+        # the batched lookup of the ids
+        await WikidataConnector().run_many(args.ids, timeout_ms=args.timeout_ms)
+        print(f"recorded {len(recorder.recorded)} responses into {args.fixtures}")
+        return 0
+
+    transport = replay.ReplayTransport(
+        args.fixtures,
+        replay.ReplayConfig(
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            seed=args.seed,
+        ),
+    )
+    replay.install(transport)
+    if not args.rate_limits:
+        # no upstream is contacted, so request quotas (GitHub's 60 per
+        # minute) would only measure the token bucket; concurrency caps stay
+        for source, policy in POLICIES.items():
+            unlimited = dataclasses.replace(policy, rate=None)
+            limits._LIMITERS[source] = limits.SourceLimiter(unlimited)
+
+    async def search(q: str) -> object:
+        return await api.pipeline_search(q, args.type, args.timeout_ms)
+
+    async def profile(q: str) -> object:
+        return await api.profile(q, args.type, args.timeout_ms)
+
+    # nothing is reused between measured requests: each one pays for the
+    # connector fan-out and builds its profile from scratch
+    api.QUERY_CACHE.clear()
+    api.QUERY_CACHE.max_entries = 0
+    api.PROFILE_STATES.clear()
+    api.PROFILE_STATES.max_entries = 0
+
+    report: Dict[str, object] = {"connectors": [c.source for c in api.CONNECTORS]}
+    # every endpoint starts without planner history
+    api.PLANNER.reset()
+    report["pipeline_search"] = await drive(
+        search, args.queries, args.requests, args.concurrency
+    )
+    api.PLANNER.reset()
+    report["profile"] = await drive(
+        profile, args.queries, args.requests, args.concurrency
+    )
+    api.PLANNER.reset()
+    shared = await compare_batch(
+        api, args.queries, args.rounds, args.type, args.timeout_ms
+    )
+    report["profile_separate"] = shared["separate"]
+    report["profiles_batch"] = shared["batch"]
+    # the planner sends ids to Wikidata only; add it unless --phase1 did
+    added = not any(c.source == "wikidata" for c in api.CONNECTORS)
+    if added:
+        api.CONNECTORS.append(WikidataConnector())
+    api.PLANNER.reset()
+    ids = await compare_batch(api, args.ids, args.rounds, args.type, args.timeout_ms)
+    if added:
+        api.CONNECTORS.pop()
+    report["ids_separate"] = ids["separate"]
+    report["ids_batch"] = ids["batch"]
+    report["replay"] = transport.stats()
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"connectors: {', '.join(report['connectors'])}")
+    print(f"{'endpoint':<18}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    names = (
+        "pipeline_search",
+        "profile",
+        "profile_separate",
+        "profiles_batch",
+        "ids_separate",
+        "ids_batch",
+    )
+    for name in names:
+        row = report[name]
+        print(
+            f"{name:<18}{row['throughput_rps']:>9}{row['p50_ms']:>9}"
+            f"{row['p95_ms']:>9}{row['p99_ms']:>9}"
+        )
+    print("separate and batch rows: p-values per round of all queries or ids")
+    print(f"replay: {report['replay']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,92 @@
+"""Per-document memory of compact docs versus normalised doc dicts.
+
+Normalises synthetic RDAP-like and RSS-like connector output both ways and
+measures retained memory with :mod:`tracemalloc`.
+
+Usage::
+
+    python benchmarks/bench_docs.py --docs 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+import tracemalloc
+from typing import Callable, List, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.api.main import normalise_doc  # noqa: E402
+
+
+def raw_docs(n: int) -> List[dict]:
+    docs = []
+    for i in range(n):
+        if i % 2:
+            raw = {
+                "content": f"Story {i} about example{i % 50}.com " * 8,
+                "item": {"title": f"Story {i}", "link": f"https://news.example/{i}"},
+            }
+            source = "google_news"
+        else:
+            raw = {
+                "ldhName": f"EXAMPLE{i}.COM",
+                "nameservers": [{"ldhName": f"NS{j}.HOST.NET"} for j in range(4)],
+                "events": [
+                    {"eventAction": a, "eventDate": "2020-01-01T00:00:00Z"}
+                    for a in ("registration", "expiration", "last changed")
+                ],
+                "entities": [
+                    {"roles": [r], "handle": f"{r.upper()}-{i}"}
+                    for r in ("registrant", "technical", "abuse")
+                ],
+            }
+            source = "rdap"
+        docs.append(
+            {
+                "title": f"Document {i}",
+                "summary": f"Summary for document {i}",
+                "url": f"https://{source}.example/{i}",
+                "source": source,
+                "fetched_at": "2026-01-01T00:00:00",
+                "raw": raw,
+            }
+        )
+    return docs
+
+
+def retained(build: Callable[[], object]) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main(argv: Sequence[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    def as_dicts():
+        # fresh payloads, as connectors produce them per request
+        return [normalise_doc(d).to_dict() for d in raw_docs(args.docs)]
+
+    def as_compact():
+        return [normalise_doc(d) for d in raw_docs(args.docs)]
+
+    loose = retained(as_dicts)
+    compact = retained(as_compact)
+    print(f"docs: {args.docs}")
+    print(f"dict docs:    {loose / args.docs:8.0f} bytes/doc")
+    print(f"compact docs: {compact / args.docs:8.0f} bytes/doc")
+    print(f"reduction:    {1 - compact / loose:8.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
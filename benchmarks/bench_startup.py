@@ -0,0 +1,95 @@
+"""Benchmark API process start-up: import time and first-use costs.
+
+Each sample runs in a fresh interpreter, as an autoscaled pod would, and
+times three steps: importing :mod:`services.api.main`, then ``warm_up()``
+(connectors, NER model, confidence weights), which is what the first
+request pays unless ``API_WARM_UP=true`` loads it in the background.
+
+Usage::
+
+    python benchmarks/bench_startup.py --repeat 10
+    python benchmarks/bench_startup.py --phase1 --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Sequence
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import services.api.main as api
+imported = time.perf_counter()
+loaded_at_import = sorted(m for m in ("spacy",) if m in sys.modules)
+eager = "CONNECTORS" in vars(api)
+api.warm_up()
+warmed = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "warm_up_s": warmed - imported,
+    "connectors_built_at_import": eager,
+    "modules_loaded_at_import": loaded_at_import,
+}))
+"""
+
+
+def sample(env: Dict[str, str]) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Sequence[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--phase1", action="store_true", help="include PHASE1_CONNECTORS"
+    )
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    if args.phase1:
+        env["PHASE1_CONNECTORS"] = "true"
+    sample(env)  # compile bytecode once so every sample reads the cache
+    runs: List[dict] = [sample(env) for _ in range(args.repeat)]
+    report = {
+        "repeat": args.repeat,
+        "import_ms_p50": statistics.median(r["import_s"] for r in runs) * 1000,
+        "warm_up_ms_p50": statistics.median(r["warm_up_s"] for r in runs) * 1000,
+        "connectors_built_at_import": any(
+            r["connectors_built_at_import"] for r in runs
+        ),
+        "modules_loaded_at_import": sorted(
+            {m for r in runs for m in r["modules_loaded_at_import"]}
+        ),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"samples: {args.repeat}")
+    print(f"import services.api.main  p50 {report['import_ms_p50']:8.1f} ms")
+    print(f"warm_up() / first use     p50 {report['warm_up_ms_p50']:8.1f} ms")
+    print(f"connectors built at import: {report['connectors_built_at_import']}")
+    loaded = ", ".join(report["modules_loaded_at_import"]) or "none"
+    print(f"heavy modules loaded at import: {loaded}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
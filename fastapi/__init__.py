@@ -1,5 +1,5 @@
 """Minimal FastAPI stub for tests when real dependency is absent."""
-from typing import Callable, Dict, Tuple
+from typing import Callable, Dict, List, Tuple
 
 
 class HTTPException(Exception):
@@ -12,6 +12,7 @@ class HTTPException(Exception):
 class FastAPI:
     def __init__(self) -> None:
         self.routes: Dict[Tuple[str, str], Callable] = {}
+        self.event_handlers: Dict[str, List[Callable]] = {}
 
     def get(self, path: str, **_: object) -> Callable:
         def decorator(func: Callable) -> Callable:
@@ -26,3 +27,10 @@ class FastAPI:
             return func
 
         return decorator
+
+    def on_event(self, event: str) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            self.event_handlers.setdefault(event, []).append(func)
+            return func
+
+        return decorator
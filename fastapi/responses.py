@@ -0,0 +1,32 @@
+"""Minimal ``fastapi.responses`` stub for tests when FastAPI isn't installed."""
+from typing import AsyncIterable, Dict, Optional, Union
+
+
+class Response:
+    def __init__(
+        self,
+        content: Union[str, bytes, None] = None,
+        media_type: Optional[str] = None,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        if isinstance(content, str):
+            content = content.encode()
+        self.body = content or b""
+        self.media_type = media_type
+        self.status_code = status_code
+        self.headers = dict(headers or {})
+
+
+class StreamingResponse:
+    def __init__(
+        self,
+        content: AsyncIterable,
+        media_type: Optional[str] = None,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.body_iterator = content
+        self.media_type = media_type
+        self.status_code = status_code
+        self.headers = dict(headers or {})
@@ -1,5 +1,6 @@
 """Confidence model based on tunable weights."""
 from __future__ import annotations
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -16,7 +17,18 @@ def _load_weights(path: Path) -> dict:
             weights[key.strip()] = float(val.strip())
     return weights
 
-WEIGHTS = _load_weights(Path(__file__).with_name("confidence.yaml"))
+
+@lru_cache(maxsize=None)
+def get_weights() -> dict:
+    """Weights from ``confidence.yaml``, read on first use."""
+    return _load_weights(Path(__file__).with_name("confidence.yaml"))
+
+
+def __getattr__(name: str):
+    # ``WEIGHTS`` used to be loaded at import time
+    if name == "WEIGHTS":
+        return get_weights()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def compute_confidence(
@@ -26,12 +38,13 @@ def compute_confidence(
     media_verification_score: float,
 ) -> float:
     """Compute confidence in range [0,1]."""
+    weights = get_weights()
     recency_score = max(0.0, 1 - recency_days / 365)
     corr_score = min(1.0, corroboration_count / 5)
     confidence = (
-        WEIGHTS.get("source_weight", 0) * source_weight
-        + WEIGHTS.get("corroboration_count", 0) * corr_score
-        + WEIGHTS.get("recency", 0) * recency_score
-        + WEIGHTS.get("media_verification_score", 0) * media_verification_score
+        weights.get("source_weight", 0) * source_weight
+        + weights.get("corroboration_count", 0) * corr_score
+        + weights.get("recency", 0) * recency_score
+        + weights.get("media_verification_score", 0) * media_verification_score
     )
     return round(min(confidence, 1.0), 3)
@@ -0,0 +1,81 @@
+"""Single-pass extraction of contact and identity signals from text.
+
+The text is split into whitespace-separated tokens once. Plain words are
+skipped with cheap string checks, runs of numeric tokens are joined and
+checked as phone numbers, and only the remaining candidate tokens are run
+through one alternation that classifies emails, domains, phones and
+handles together. Emails are tried first, so their local and domain parts
+are not re-matched as domains or handles.
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List
+
+from services.ner.ner import extract_locations
+
+SIGNAL_KINDS = ("emails", "domains", "usernames", "phones", "locations")
+
+_SIGNAL_RE = re.compile(
+    r"(?P<emails>[\w.\-]+@(?P<email_domain>[\w.\-]+\.[a-zA-Z]{2,}))"
+    r"|(?P<domains>\b(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}\b)"
+    r"|(?P<phones>\+?\d[\d\s-]{7,}\d)"
+    r"|(?P<usernames>@\w+)"
+)
+_PHONE_RE = re.compile(r"\+?\d[\d\s-]{7,}\d")
+# punctuation that may wrap a number without being part of it
+_EDGE = "\"'()[]{}<>,;:!?."
+# of those, the ones that separate numbers: a run never continues across them
+_BREAK = frozenset(",;()[]{}<>")
+
+
+def _is_numeric(core: str) -> bool:
+    return core.lstrip("+").replace("-", "").isdigit()
+
+
+def extract_signals(text: str, locations: bool = True) -> Dict[str, List[str]]:
+    """Return deduplicated signals of each kind in first-seen order.
+
+    The domain of every email is also reported as a domain. Phone numbers
+    split by whitespace are reassembled from adjacent numeric tokens, but
+    never across a comma, semicolon or bracket.
+    Locations come from :func:`services.ner.ner.extract_locations` unless
+    *locations* is false.
+    """
+    found: Dict[str, Dict[str, None]] = {k: {} for k in SIGNAL_KINDS}
+    phones = found["phones"]
+    run: List[str] = []
+
+    def flush() -> None:
+        for phone in _PHONE_RE.findall(" ".join(run)):
+            phones[phone] = None
+        run.clear()
+
+    for token in text.split():
+        if token.isalpha():
+            if run:
+                flush()
+            continue
+        core = token.strip(_EDGE)
+        if _is_numeric(core):
+            lead = token[: len(token) - len(token.lstrip(_EDGE))]
+            if run and not _BREAK.isdisjoint(lead):
+                flush()
+            run.append(core)
+            trail = token[len(token.rstrip(_EDGE)) :]
+            if not _BREAK.isdisjoint(trail):
+                flush()
+            continue
+        if run:
+            flush()
+        if not core or core.isalpha():
+            continue
+        for match in _SIGNAL_RE.finditer(token):
+            kind = match.lastgroup
+            found[kind][match.group(kind)] = None
+            if kind == "emails":
+                found["domains"][match.group("email_domain")] = None
+    if run:
+        flush()
+    if locations:
+        found["locations"] = dict.fromkeys(extract_locations(text))
+    return {k: list(v) for k, v in found.items()}
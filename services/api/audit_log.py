@@ -3,28 +3,33 @@
 from __future__ import annotations
 
 import hashlib
-import json
 from collections import defaultdict
 from datetime import date
 from typing import Dict, List
 
+from . import canonical
+
 
 class AuditLog:
     """Stores immutable audit events and computes daily Merkle roots."""
 
     def __init__(self) -> None:
         self._events: Dict[date, List[str]] = defaultdict(list)
+        self._leaves: Dict[date, List[bytes]] = defaultdict(list)
 
     def append(self, event: dict) -> None:
         """Append an *event* to the log."""
 
-        raw = json.dumps(event, sort_keys=True)
-        self._events[date.today()].append(raw)
+        raw = canonical.dumps(event)
+        today = date.today()
+        self._events[today].append(raw)
+        # hash each event once here rather than on every merkle_root call
+        self._leaves[today].append(hashlib.sha256(raw.encode()).digest())
 
     def merkle_root(self, day: date) -> str:
         """Return the Merkle root for *day* or an empty string."""
 
-        leaves = [hashlib.sha256(e.encode()).digest() for e in self._events.get(day, [])]
+        leaves = list(self._leaves.get(day, []))
         if not leaves:
             return ""
         while len(leaves) > 1:
@@ -0,0 +1,125 @@
+"""Canonical JSON encoding and hashing for entity ids and audit events.
+
+The canonical form is exactly ``json.dumps(obj, sort_keys=True)``; entity
+ids and audit Merkle leaves are defined over those bytes. Instead of
+building that string and hashing it in a second pass, :func:`iter_canonical`
+produces it piecewise: the top levels of an object (a profile and its
+``sources`` list, say) are walked here, and each deeper value, such as one
+source document, is encoded in one call to the C encoder. Chunks are fed to
+the hasher in bounded batches, so hashing a profile with thousands of
+sources never holds more than one document's encoding plus a small buffer.
+
+Compact encodings that are stored but never hashed (entity bodies) go
+through :func:`dumps_compact`, which uses ``orjson`` when it is installed.
+``orjson`` cannot produce the canonical form itself: it has no
+``", "``/``": "`` separators and does not escape non-ASCII text.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Iterator
+
+try:  # optional native backend
+    import orjson
+except ImportError:  # pragma: no cover - exercised where orjson is absent
+    orjson = None
+
+# one-shot encode() uses the C encoder; iterencode() would fall back to the
+# pure-Python one
+_ENCODE = json.JSONEncoder(sort_keys=True).encode
+_FLUSH_CHARS = 64 * 1024
+DEFAULT_DEPTH = 2
+
+
+def iter_canonical(obj: Any, depth: int = DEFAULT_DEPTH) -> Iterator[str]:
+    """Yield chunks that concatenate to ``json.dumps(obj, sort_keys=True)``.
+
+    Dicts and lists in the top *depth* levels are walked; anything deeper
+    is encoded whole.
+    """
+
+    if depth > 0:
+        if isinstance(obj, dict) and all(type(k) is str for k in obj):
+            if not obj:
+                yield "{}"
+                return
+            separator = "{"
+            for key in sorted(obj):
+                yield separator + _ENCODE(key) + ": "
+                yield from iter_canonical(obj[key], depth - 1)
+                separator = ", "
+            yield "}"
+            return
+        if isinstance(obj, (list, tuple)):
+            if not obj:
+                yield "[]"
+                return
+            separator = "["
+            for item in obj:
+                yield separator
+                yield from iter_canonical(item, depth - 1)
+                separator = ", "
+            yield "]"
+            return
+    # non-string keys are converted after sorting; leave that to json
+    yield _ENCODE(obj)
+
+
+def dumps(obj: Any) -> str:
+    """The canonical encoding of *obj* as one string."""
+
+    return _ENCODE(obj)
+
+
+def digest(obj: Any, algorithm: str = "sha256") -> "hashlib._Hash":
+    """Hash the canonical encoding of *obj* without materialising it."""
+
+    hasher = hashlib.new(algorithm)
+    buffer = []
+    size = 0
+    for chunk in iter_canonical(obj):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= _FLUSH_CHARS:
+            # the canonical form is ASCII (ensure_ascii), so len() is bytes
+            hasher.update("".join(buffer).encode("ascii"))
+            buffer.clear()
+            size = 0
+    hasher.update("".join(buffer).encode("ascii"))
+    return hasher
+
+
+def sha256_hex(obj: Any) -> str:
+    """Hex SHA-256 of the canonical encoding of *obj*."""
+
+    return digest(obj).hexdigest()
+
+
+def entity_id(profile: dict) -> str:
+    """Stable id of *profile*: the first 8 hex digits of its canonical hash."""
+
+    return sha256_hex(profile)[:8]
+
+
+def dumps_compact(obj: Any) -> bytes:
+    """Compact UTF-8 JSON for storage; key order and spacing are unspecified."""
+
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except (TypeError, orjson.JSONEncodeError):
+            pass  # e.g. integers beyond 64 bits; json handles them
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from ``bytes`` or ``str``, with ``orjson`` when available."""
+
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN written by the json module
+    return json.loads(data)
@@ -0,0 +1,323 @@
+"""Persistent entity profile store backed by SQLite.
+
+Profiles are stored as compact JSON under their id. Secondary index tables
+map canonical names, aliases and signal values to entity ids, so every
+lookup is an index search rather than a scan, however many profiles are
+stored. Signal values are also indexed reversed, which turns suffix
+queries such as "every email at a domain" into index range seeks. Entity
+ids are content hashes of the profile, so a stored body never changes
+under its id and the bounded in-process read cache cannot go stale, even
+when several API workers share one database file.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import canonical
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_LIMIT = 100
+# SQLite treats a negative LIMIT as none, so limits are checked up front
+MAX_LIMIT = 1000
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS entities ("
+    " id TEXT PRIMARY KEY, query TEXT, type TEXT,"
+    " canonical_name TEXT COLLATE NOCASE, body BLOB NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS entities_name ON entities (canonical_name, id)",
+    "CREATE TABLE IF NOT EXISTS entity_aliases ("
+    " alias TEXT COLLATE NOCASE, entity_id TEXT,"
+    " PRIMARY KEY (alias, entity_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS entity_aliases_entity"
+    " ON entity_aliases (entity_id)",
+    "CREATE TABLE IF NOT EXISTS entity_signals ("
+    " kind TEXT, value TEXT, entity_id TEXT, reversed TEXT,"
+    " PRIMARY KEY (kind, value, entity_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS entity_signals_entity"
+    " ON entity_signals (entity_id)",
+    # row count kept by triggers, so len() and stats() never scan
+    "CREATE TABLE IF NOT EXISTS entity_counts ("
+    " name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "CREATE TRIGGER IF NOT EXISTS entities_counted_insert AFTER INSERT ON entities"
+    " BEGIN UPDATE entity_counts SET value = value + 1 WHERE name = 'entities';"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS entities_counted_delete AFTER DELETE ON entities"
+    " BEGIN UPDATE entity_counts SET value = value - 1 WHERE name = 'entities';"
+    " END",
+)
+# suffix queries ("every email at example.com") are prefix queries on the
+# reversed value
+_REVERSED_INDEX = (
+    "CREATE INDEX IF NOT EXISTS entity_signals_reversed"
+    " ON entity_signals (kind, reversed, entity_id)"
+)
+
+
+def check_limit(limit: int) -> int:
+    """Return *limit*, raising ``ValueError`` unless 1 <= limit <= MAX_LIMIT."""
+
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def _prefix_bounds(prefix: str) -> Tuple[str, str]:
+    """Half-open range of strings starting with *prefix*, for index seeks."""
+
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class EntityStore:
+    """Entity profiles keyed by id with name, alias and signal indexes.
+
+    *path* is a database file, or ``":memory:"`` for a store that lives as
+    long as the process. Up to *cache_size* encoded profiles are kept in an
+    LRU read cache.
+    """
+
+    def __init__(
+        self, path: str = ":memory:", cache_size: int = DEFAULT_CACHE_SIZE
+    ) -> None:
+        self.path = path
+        self.cache_size = cache_size
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            # readers in other worker processes do not block the writer
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._migrate()
+        self._db.execute(_REVERSED_INDEX)
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _migrate(self) -> None:
+        columns = {
+            row[1] for row in self._db.execute("PRAGMA table_info(entity_signals)")
+        }
+        if "reversed" not in columns:
+            # databases written before suffix queries were supported
+            self._db.create_function("reverse", 1, lambda v: v[::-1])
+            self._db.execute("ALTER TABLE entity_signals ADD COLUMN reversed TEXT")
+            self._db.execute("UPDATE entity_signals SET reversed = reverse(value)")
+        # databases written before the count was kept: count them once
+        self._db.execute(
+            "INSERT OR IGNORE INTO entity_counts"
+            " SELECT 'entities', COUNT(*) FROM entities"
+        )
+
+    @classmethod
+    def from_env(cls) -> "EntityStore":
+        """Build a store from ``ENTITY_STORE_PATH``/``ENTITY_CACHE_SIZE``."""
+
+        return cls(
+            path=os.getenv("ENTITY_STORE_PATH") or ":memory:",
+            cache_size=int(os.getenv("ENTITY_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+        )
+
+    def _remember(self, entity_id: str, body: bytes) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[entity_id] = body
+        self._cache.move_to_end(entity_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _write(self, entity_id: str, profile: dict) -> bytes:
+        body = canonical.dumps_compact(profile)
+        for table in ("entity_aliases", "entity_signals"):
+            self._db.execute(f"DELETE FROM {table} WHERE entity_id = ?", (entity_id,))
+        # delete then insert rather than INSERT OR REPLACE, whose implicit
+        # delete does not fire the counting trigger
+        self._db.execute("DELETE FROM entities WHERE id = ?", (entity_id,))
+        self._db.execute(
+            "INSERT INTO entities VALUES (?, ?, ?, ?, ?)",
+            (
+                entity_id,
+                profile.get("query"),
+                profile.get("type"),
+                profile.get("canonical_name"),
+                body,
+            ),
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO entity_aliases VALUES (?, ?)",
+            [(alias, entity_id) for alias in profile.get("aliases") or ()],
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO entity_signals"
+            " (kind, value, entity_id, reversed) VALUES (?, ?, ?, ?)",
+            [
+                (kind, value, entity_id, value[::-1])
+                for kind, values in (profile.get("signals") or {}).items()
+                for value in values
+            ],
+        )
+        return body
+
+    def put(self, entity_id: str, profile: dict) -> None:
+        """Store *profile* under *entity_id*, replacing any previous one."""
+
+        self.put_many([(entity_id, profile)])
+
+    def put_many(self, items: Iterable[Tuple[str, dict]]) -> int:
+        """Store many ``(entity_id, profile)`` pairs in one transaction."""
+
+        with self._lock:
+            with self._db:
+                written = [(key, self._write(key, profile)) for key, profile in items]
+            # only cache bodies once the transaction has committed
+            for entity_id, body in written:
+                self._remember(entity_id, body)
+        return len(written)
+
+    def get(self, entity_id: str) -> Optional[dict]:
+        """Return the profile stored under *entity_id*, or ``None``."""
+
+        with self._lock:
+            body = self._cache.get(entity_id)
+            if body is not None:
+                self.hits += 1
+                self._cache.move_to_end(entity_id)
+            else:
+                self.misses += 1
+                row = self._db.execute(
+                    "SELECT body FROM entities WHERE id = ?", (entity_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                body = row[0]
+                self._remember(entity_id, body)
+        return canonical.loads(body)
+
+    def __contains__(self, entity_id: str) -> bool:
+        with self._lock:
+            if entity_id in self._cache:
+                return True
+            row = self._db.execute(
+                "SELECT 1 FROM entities WHERE id = ?", (entity_id,)
+            ).fetchone()
+        return row is not None
+
+    def _ids(self, sql: str, params: tuple, limit: int) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                sql + " LIMIT ?", params + (check_limit(limit),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def find_by_name(self, name: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        """Ids of entities whose canonical name is *name* (case-insensitive)."""
+
+        return self._ids(
+            "SELECT id FROM entities WHERE canonical_name = ? ORDER BY id",
+            (name,),
+            limit,
+        )
+
+    def find_by_alias(self, alias: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        """Ids of entities listing *alias* (case-insensitive) as an alias."""
+
+        return self._ids(
+            "SELECT entity_id FROM entity_aliases WHERE alias = ?"
+            " ORDER BY entity_id",
+            (alias,),
+            limit,
+        )
+
+    def find_by_signal(
+        self, kind: str, value: str, limit: int = DEFAULT_LIMIT
+    ) -> List[str]:
+        """Ids of entities with signal *value* of *kind* (e.g. ``emails``)."""
+
+        return self._ids(
+            "SELECT entity_id FROM entity_signals WHERE kind = ? AND value = ?"
+            " ORDER BY entity_id",
+            (kind, value),
+            limit,
+        )
+
+    def search_signals(
+        self,
+        kind: str,
+        value: Optional[str] = None,
+        prefix: Optional[str] = None,
+        suffix: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+    ) -> List[Tuple[str, str]]:
+        """``(value, entity_id)`` pairs for signals of *kind*.
+
+        Exactly one of *value* (exact match), *prefix* or *suffix* must be
+        given; e.g. ``suffix="@example.com"`` finds every stored email at
+        that domain. Every form is answered by an index range seek.
+        """
+
+        if sum(arg is not None for arg in (value, prefix, suffix)) != 1:
+            raise ValueError("exactly one of value, prefix or suffix is required")
+        if value is not None:
+            return self._pairs(
+                "SELECT value, entity_id FROM entity_signals"
+                " WHERE kind = ? AND value = ? ORDER BY entity_id",
+                (kind, value),
+                limit,
+            )
+        if prefix is not None:
+            if not prefix:
+                raise ValueError("prefix must not be empty")
+            return self._pairs(
+                "SELECT value, entity_id FROM entity_signals"
+                " WHERE kind = ? AND value >= ? AND value < ?"
+                " ORDER BY value, entity_id",
+                (kind, *_prefix_bounds(prefix)),
+                limit,
+            )
+        if not suffix:
+            raise ValueError("suffix must not be empty")
+        return self._pairs(
+            "SELECT value, entity_id FROM entity_signals"
+            " WHERE kind = ? AND reversed >= ? AND reversed < ?"
+            " ORDER BY reversed, entity_id",
+            (kind, *_prefix_bounds(suffix[::-1])),
+            limit,
+        )
+
+    def _pairs(self, sql: str, params: tuple, limit: int) -> List[Tuple[str, str]]:
+        with self._lock:
+            rows = self._db.execute(
+                sql + " LIMIT ?", params + (check_limit(limit),)
+            ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            for table in ("entity_signals", "entity_aliases", "entities"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._cache.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT value FROM entity_counts WHERE name = 'entities'"
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entities": len(self),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cached": len(self._cache),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
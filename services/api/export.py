@@ -0,0 +1,509 @@
+"""Streaming exports of entity profiles as JSON Lines, CSV or PDF.
+
+Each renderer is a generator over an iterable of profiles that yields
+encoded chunks as it goes, one source at a time, so memory use does not
+grow with the number of sources. Rendering is blocking work;
+:func:`iterate_off_loop` drives a renderer in a worker thread and hands
+batches of roughly ``CHUNK_SIZE`` bytes to the event loop. Exports too
+large for one request are written to disk by :class:`ExportJobs` and
+downloaded once complete.
+
+Every format carries the profile's classification, as exports must show a
+classification banner (see ``docs/control_matrix.md``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from dataclasses import asdict, dataclass
+import io
+import json
+import os
+from pathlib import Path
+import tempfile
+import textwrap
+import threading
+import time
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+    "pdf": "application/pdf",
+}
+
+SOURCE_FIELDS = (
+    "id",
+    "title",
+    "url",
+    "source",
+    "fetched_at",
+    "hash",
+    "classification",
+    "summary",
+)
+
+# spreadsheet applications evaluate cells starting with these as formulas
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# lowest to highest; unknown markings rank above all of these
+_CLASSIFICATIONS = (
+    "UNOFFICIAL",
+    "OFFICIAL",
+    "OFFICIAL: Sensitive",
+    "PROTECTED",
+    "SECRET",
+    "TOP SECRET",
+)
+
+
+def classification_of(profile: dict) -> str:
+    """The highest classification among *profile*'s sources."""
+
+    marking = "OFFICIAL"
+    for source in profile.get("sources") or ():
+        current = source.get("classification") or "OFFICIAL"
+        if _rank(current) > _rank(marking):
+            marking = current
+    return marking
+
+
+def _rank(marking: str) -> int:
+    try:
+        return _CLASSIFICATIONS.index(marking)
+    except ValueError:
+        return len(_CLASSIFICATIONS)
+
+
+def _header(profile: dict) -> dict:
+    header = {k: v for k, v in profile.items() if k != "sources"}
+    header["classification"] = classification_of(profile)
+    header["source_count"] = len(profile.get("sources") or ())
+    return header
+
+
+def render_jsonl(profiles: Iterable[dict]) -> Iterator[bytes]:
+    """One ``profile`` record per entity, followed by its ``source`` records."""
+
+    for profile in profiles:
+        header = {"record": "profile", **_header(profile)}
+        yield (json.dumps(header) + "\n").encode()
+        for source in profile.get("sources") or ():
+            yield (json.dumps({"record": "source", **source}) + "\n").encode()
+
+
+def _cell(value: object) -> object:
+    # scraped text must not run as a spreadsheet formula (CSV injection)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def render_csv(profiles: Iterable[dict]) -> Iterator[bytes]:
+    """One row per source, prefixed with the entity it belongs to.
+
+    Text cells that a spreadsheet would evaluate as a formula are prefixed
+    with ``'``.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(("entity", "canonical_name") + SOURCE_FIELDS)
+    for profile in profiles:
+        entity = (profile.get("id") or "", profile.get("canonical_name") or "")
+        for source in profile.get("sources") or ():
+            row = entity + tuple(source.get(f, "") for f in SOURCE_FIELDS)
+            writer.writerow([_cell(v) for v in row])
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _PDFWriter:
+    """Minimal PDF 1.4 writer emitting pages as soon as they are full.
+
+    Only object offsets and page ids are kept until the cross-reference
+    table is written at the end.
+    """
+
+    WIDTH, HEIGHT = 612, 792
+    MARGIN = 50
+    LEADING = 12
+    FONT_SIZE = 9
+    WRAP = 105
+    LINES_PER_PAGE = (HEIGHT - 2 * MARGIN - 2 * LEADING) // LEADING
+
+    # objects 1-4 are fixed; pages are allocated from 5 upwards
+    CATALOG, PAGES, FONT, BOLD = 1, 2, 3, 4
+
+    def __init__(self, banner: str) -> None:
+        self.banner = banner
+        self.offsets: Dict[int, int] = {}
+        self.page_ids: List[int] = []
+        self.position = 0
+        self.next_id = 5
+        self.lines: List[str] = []
+
+    def _emit(self, data: bytes) -> bytes:
+        self.position += len(data)
+        return data
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        self.offsets[number] = self.position
+        return self._emit(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def start(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def add(self, text: str, indent: int = 0) -> Iterator[bytes]:
+        """Queue *text* (wrapped) and yield any pages that fill up."""
+
+        width = self.WRAP - indent
+        for line in textwrap.wrap(text, width) or [""]:
+            self.lines.append(" " * indent + line)
+            if len(self.lines) >= self.LINES_PER_PAGE:
+                yield self.flush()
+
+    def flush(self) -> bytes:
+        """Emit the queued lines as a page, even if it is not full."""
+
+        top = self.HEIGHT - self.MARGIN
+        ops = [
+            b"BT /F2 9 Tf %d %d Td (%s) Tj ET"
+            % (self.MARGIN, top + 20, _pdf_text(self.banner)),
+            b"BT /F2 9 Tf %d %d Td (%s) Tj ET"
+            % (self.MARGIN, self.MARGIN - 25, _pdf_text(self.banner)),
+            b"BT /F1 %d Tf %d TL %d %d Td"
+            % (self.FONT_SIZE, self.LEADING, self.MARGIN, top),
+        ]
+        ops.extend(b"(%s) '" % _pdf_text(line) for line in self.lines)
+        ops.append(b"ET")
+        self.lines = []
+        stream = b"\n".join(ops)
+        page_id, content_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+        content = self._object(
+            content_id,
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        )
+        page = self._object(
+            page_id,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d]"
+            b" /Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >>"
+            b" /Contents %d 0 R >>"
+            % (self.PAGES, self.WIDTH, self.HEIGHT, self.FONT, self.BOLD, content_id),
+        )
+        return content + page
+
+    def finish(self) -> bytes:
+        parts = []
+        if self.lines or not self.page_ids:
+            parts.append(self.flush())
+        kids = b" ".join(b"%d 0 R" % i for i in self.page_ids)
+        parts.append(
+            self._object(
+                self.PAGES,
+                b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)),
+            )
+        )
+        catalog = b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES
+        parts.append(self._object(self.CATALOG, catalog))
+        fonts = ((self.FONT, b"Helvetica"), (self.BOLD, b"Helvetica-Bold"))
+        for number, name in fonts:
+            parts.append(
+                self._object(
+                    number,
+                    b"<< /Type /Font /Subtype /Type1 /BaseFont /%s"
+                    b" /Encoding /WinAnsiEncoding >>" % name,
+                )
+            )
+        xref_at = self.position
+        size = self.next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for number in range(1, size):
+            xref.append(b"%010d 00000 n \n" % self.offsets[number])
+        xref.append(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (size, self.CATALOG, xref_at)
+        )
+        parts.append(self._emit(b"".join(xref)))
+        return b"".join(parts)
+
+
+def _pdf_text(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return escaped.encode("cp1252", errors="replace")
+
+
+def render_pdf(profiles: Iterable[dict]) -> Iterator[bytes]:
+    """A text PDF; every page carries a classification banner top and bottom.
+
+    Each profile starts on a new page whose banner is that profile's
+    classification.
+    """
+
+    writer = _PDFWriter("OFFICIAL")
+    yield writer.start()
+    for profile in profiles:
+        if writer.lines:
+            yield writer.flush()
+        writer.banner = classification_of(profile)
+        yield from _profile_pages(writer, profile)
+    yield writer.finish()
+
+
+def _profile_pages(writer: _PDFWriter, profile: dict) -> Iterator[bytes]:
+    name = profile.get("canonical_name") or profile.get("query") or ""
+    yield from writer.add(f"Entity profile: {name}")
+    yield from writer.add(
+        f"Query: {profile.get('query', '')}  Type: {profile.get('type', '')}"
+        f"  Confidence: {profile.get('confidence', 0)}"
+    )
+    if profile.get("aliases"):
+        yield from writer.add("Aliases: " + ", ".join(profile["aliases"]))
+    if profile.get("description"):
+        yield from writer.add("Description: " + profile["description"])
+    for kind, values in (profile.get("signals") or {}).items():
+        if values:
+            yield from writer.add(f"{kind}: " + ", ".join(values))
+    sources = profile.get("sources") or ()
+    yield from writer.add("")
+    yield from writer.add(f"Sources ({len(sources)})")
+    for index, source in enumerate(sources, 1):
+        yield from writer.add(f"[{index}] {source.get('title', '')}")
+        yield from writer.add(source.get("url", ""), indent=4)
+        yield from writer.add(
+            f"{source.get('source', '')} | {source.get('fetched_at', '')}"
+            f" | {source.get('classification', '')} | {source.get('hash', '')[:16]}",
+            indent=4,
+        )
+        if source.get("summary"):
+            yield from writer.add(source["summary"], indent=4)
+    yield from writer.add("")
+
+
+RENDERERS: Dict[str, Callable[[Iterable[dict]], Iterator[bytes]]] = {
+    "jsonl": render_jsonl,
+    "csv": render_csv,
+    "pdf": render_pdf,
+}
+
+
+def render(format: str, profiles: Iterable[dict]) -> Iterator[bytes]:
+    """Chunks of *profiles* rendered as *format* (``jsonl``, ``csv``, ``pdf``)."""
+
+    try:
+        renderer = RENDERERS[format]
+    except KeyError:
+        raise ValueError(f"unsupported format: {format}") from None
+    return renderer(profiles)
+
+
+async def iterate_off_loop(
+    chunks: Iterator[bytes], executor: Optional[ThreadPoolExecutor] = None
+) -> AsyncIterator[bytes]:
+    """Drive the blocking *chunks* iterator in a thread.
+
+    Chunks are joined into batches of about ``CHUNK_SIZE`` bytes so the
+    thread hop is paid per batch rather than per source.
+    """
+
+    loop = asyncio.get_running_loop()
+
+    def take() -> Tuple[bytes, bool]:
+        parts = []
+        size = 0
+        for part in chunks:
+            parts.append(part)
+            size += len(part)
+            if size >= CHUNK_SIZE:
+                return b"".join(parts), False
+        return b"".join(parts), True
+
+    done = False
+    while not done:
+        data, done = await loop.run_in_executor(executor, take)
+        if data:
+            yield data
+
+
+def read_file(path: Path) -> Iterator[bytes]:
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+@dataclass
+class ExportJob:
+    """State of one background export."""
+
+    id: str
+    format: str
+    entities: int
+    status: str = "pending"
+    bytes: int = 0
+    error: Optional[str] = None
+    created_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ExportLimitError(RuntimeError):
+    """Raised when every export slot is taken by an unfinished job."""
+
+
+class ExportJobs:
+    """Exports rendered to files under *root* by a small thread pool.
+
+    Finished jobs and their files are kept for *ttl* seconds, and at most
+    *max_jobs* jobs are tracked; beyond that the oldest finished ones are
+    dropped early. Files left under *root* by an earlier process are
+    removed once they are older than *ttl*.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_workers: int = 2,
+        ttl: float = 3600.0,
+        max_jobs: int = 100,
+    ) -> None:
+        self.root = Path(root)
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, ExportJob] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ExportJobs":
+        """Jobs under ``EXPORT_DIR`` run by ``EXPORT_WORKERS`` threads.
+
+        ``EXPORT_TTL`` (seconds) and ``EXPORT_MAX_JOBS`` bound what is kept.
+        """
+
+        root = os.getenv("EXPORT_DIR") or os.path.join(
+            tempfile.gettempdir(), "osint-exports"
+        )
+        return cls(
+            Path(root),
+            max_workers=int(os.getenv("EXPORT_WORKERS", "2")),
+            ttl=float(os.getenv("EXPORT_TTL", "3600")),
+            max_jobs=int(os.getenv("EXPORT_MAX_JOBS", "100")),
+        )
+
+    def path(self, job: ExportJob) -> Path:
+        return self.root / f"{job.id}.{job.format}"
+
+    def submit(
+        self, format: str, profiles: Callable[[], Iterable[dict]], entities: int
+    ) -> ExportJob:
+        """Start rendering ``profiles()`` as *format* in the background.
+
+        *profiles* is called in the worker thread, so it may load entities
+        lazily one at a time. Raises :class:`ExportLimitError` when
+        *max_jobs* jobs are still unfinished.
+        """
+
+        if format not in RENDERERS:
+            raise ValueError(f"unsupported format: {format}")
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            format=format,
+            entities=entities,
+            created_at=time.time(),
+        )
+        with self._lock:
+            if self._executor is None:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self._sweep_files()
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="export"
+                )
+            self._evict(room=1)
+            if len(self._jobs) >= self.max_jobs:
+                raise ExportLimitError(f"{self.max_jobs} exports already running")
+            self._jobs[job.id] = job
+            # _run records failures on the job itself
+            self._executor.submit(self._run, job, profiles)
+        return job
+
+    def _evict(self, room: int = 0) -> None:
+        # caller holds the lock; unfinished jobs are never evicted
+        now = time.time()
+        finished = sorted(
+            (j for j in self._jobs.values() if j.finished_at is not None),
+            key=lambda j: j.finished_at,
+        )
+        excess = len(self._jobs) + room - self.max_jobs
+        for job in finished:
+            if now - job.finished_at < self.ttl and excess <= 0:
+                break
+            del self._jobs[job.id]
+            self.path(job).unlink(missing_ok=True)
+            excess -= 1
+
+    def _sweep_files(self) -> None:
+        cutoff = time.time() - self.ttl
+        for path in self.root.iterdir():
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass  # removed concurrently, or not ours to remove
+
+    def _run(self, job: ExportJob, profiles: Callable[[], Iterable[dict]]) -> None:
+        job.status = "running"
+        target = self.path(job)
+        partial = target.with_suffix(target.suffix + ".part")
+        try:
+            with open(partial, "wb") as fh:
+                for chunk in render(job.format, profiles()):
+                    fh.write(chunk)
+                    job.bytes += len(chunk)
+            os.replace(partial, target)
+            job.status = "done"
+        except Exception as exc:  # recorded on the job
+            partial.unlink(missing_ok=True)
+            job.status = "error"
+            job.error = str(exc) or exc.__class__.__name__
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            self._executor = None
@@ -5,18 +5,33 @@ import asyncio
 import hashlib
 import json
 import os
-import re
+import threading
 import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urlparse, urlunparse
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 
+from . import canonical, metrics
 from .audit_log import AuditLog
+from .entity_store import EntityStore, check_limit
+from .export import (
+    MEDIA_TYPES,
+    ExportJobs,
+    ExportLimitError,
+    iterate_off_loop,
+    read_file,
+    render,
+)
+from .profile_state import ProfileState, ProfileStates
+from .query_cache import QueryCache
+from .records import CompactDoc, to_dicts
 from services.connectors import (
     Connector,
+    ConnectorResult,
     GitHubUsersConnector,
     GoogleNewsConnector,
     MediaWikiConnector,
@@ -30,13 +45,63 @@ from services.connectors import (
     SecEdgarConnector,
     WaybackConnector,
     WikidataConnector,
+    singleflight_stats,
 )
-from services.facts import extract_facts
+from services.connectors.breaker import HALF_OPEN, OPEN, breaker_stats
+from services.connectors.limits import limiter_stats
+from services.connectors.planner import ConnectorPlanner, Plan, source_query
+from services.analytics import confidence
+from services.analytics.dedupe import Deduplicator
+from services.analytics.signals import SIGNAL_KINDS
+from services.ner import ner
 
 app = FastAPI()
 audit_log = AuditLog()
-# simple in-memory persistence stub
-ENTITIES: Dict[str, dict] = {}
+# per-request deadline; tail latency matters more than completeness
+DEADLINE_MS = int(os.getenv("PIPELINE_DEADLINE_MS", "5000"))
+# entity profiles with name, alias and signal indexes (ENTITY_STORE_PATH)
+ENTITIES = EntityStore.from_env()
+# normalised pipeline results per (query, type, connector set)
+QUERY_CACHE = QueryCache.from_env()
+# per-doc profile contributions kept between /profile calls
+PROFILE_STATES = ProfileStates.from_env()
+# largest accepted POST /profiles:batch request
+MAX_BATCH = int(os.getenv("PROFILE_BATCH_MAX", "1000"))
+# background exports of stored entities (EXPORT_DIR)
+EXPORTS = ExportJobs.from_env()
+# routes each query to the connectors that can answer it (PLANNER)
+PLANNER = ConnectorPlanner.from_env()
+
+metrics.REGISTRY.register_stats(
+    "osint_query_cache", "Query cache statistic", lambda: QUERY_CACHE.stats()
+)
+metrics.REGISTRY.register_stats(
+    "osint_entity_store", "Entity store statistic", lambda: ENTITIES.stats()
+)
+
+
+def _breaker_gauges() -> Dict[str, Dict[str, object]]:
+    # the state is a string; report it as 0/1 gauges so a quarantined
+    # source shows up as osint_breaker_open{source="..."} 1
+    return {
+        source: {
+            **stats,
+            "open": int(stats["state"] == OPEN),
+            "half_open": int(stats["state"] == HALF_OPEN),
+        }
+        for source, stats in breaker_stats().items()
+    }
+
+
+metrics.REGISTRY.register_stats(
+    "osint_breaker", "Circuit breaker statistic", _breaker_gauges, label="source"
+)
+metrics.REGISTRY.register_stats(
+    "osint_limiter", "Source limiter statistic", limiter_stats, label="source"
+)
+metrics.REGISTRY.register_stats(
+    "osint_singleflight", "Coalesced connector call statistic", singleflight_stats
+)
 
 
 @dataclass
@@ -61,6 +126,7 @@ class SearchResponse:
     type: Optional[str]
     count: int
     docs: List[DocModel]
+    connectors: Dict[str, str] = field(default_factory=dict)
 
 
 @dataclass
@@ -74,6 +140,27 @@ class EntityProfileModel:
     signals: dict = field(default_factory=dict)
     facts: dict = field(default_factory=dict)
     sources: List[DocModel] = field(default_factory=list)
+    connectors: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class BatchProfileItem:
+    q: str
+    type: str
+
+
+@dataclass
+class ExportRequest:
+    ids: List[str]
+    format: str
+
+
+@dataclass
+class PipelineResult:
+    """Deduplicated documents plus the status of every connector."""
+
+    docs: List[CompactDoc]
+    connectors: Dict[str, str] = field(default_factory=dict)
 
 
 # ---------------------------------------------------------------------------
@@ -87,95 +174,185 @@ def canonical_url(url: str) -> str:
     return urlunparse((parsed.scheme, parsed.netloc.lower(), path, "", "", ""))
 
 
-def extract_signals(text: str) -> Dict[str, List[str]]:
-    emails = re.findall(r"[\w.\-]+@[\w.\-]+\.[a-zA-Z]{2,}", text)
-    phones = re.findall(r"\+?\d[\d\s-]{7,}\d", text)
-    handles = re.findall(r"@\w+", text)
-    domains = re.findall(r"\b(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}\b", text)
-    return {
-        "emails": emails,
-        "domains": domains,
-        "usernames": handles,
-        "phones": phones,
-        "locations": [],  # TODO: NER for locations
-    }
+def normalise_doc(raw_doc: dict) -> CompactDoc:
+    url = canonical_url(raw_doc["url"])
+    # connectors whose document is the whole upstream payload pass the hash
+    # computed while streaming it, which avoids re-encoding and re-hashing
+    content_hash = raw_doc.get("content_hash")
+    if not content_hash:
+        content = raw_doc.get("raw", {}).get("content", "")
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+    return CompactDoc(
+        title=raw_doc.get("title", ""),
+        summary=raw_doc.get("summary", ""),
+        url=url,
+        source=raw_doc.get("source", ""),
+        fetched_at=raw_doc.get("fetched_at", datetime.utcnow().isoformat()),
+        hash=content_hash,
+        raw=raw_doc.get("raw", {}),
+        provenance_fetched_at=raw_doc.get("fetched_at", ""),
+    )
 
 
-def normalise_doc(raw_doc: dict) -> dict:
-    url = canonical_url(raw_doc["url"])
-    content = raw_doc.get("raw", {}).get("content", "")
-    content_hash = hashlib.sha256(content.encode()).hexdigest()
-    doc_id = content_hash[:8]
-    return {
-        "id": doc_id,
-        "title": raw_doc.get("title", ""),
-        "summary": raw_doc.get("summary", ""),
-        "url": url,
-        "source": raw_doc.get("source", ""),
-        "fetched_at": raw_doc.get("fetched_at", datetime.utcnow().isoformat()),
-        "raw": raw_doc.get("raw", {}),
-        "hash": content_hash,
-        "classification": "OFFICIAL",
-        "provenance": {
-            "url": url,
-            "fetched_at": raw_doc.get("fetched_at", ""),
-            "content_hash": content_hash,
-            "connector": raw_doc.get("source", ""),
-        },
-    }
+def build_connectors() -> List[Connector]:
+    """Instantiate the configured connectors (``PHASE1_CONNECTORS``)."""
 
+    connectors: List[Connector] = [
+        MediaWikiConnector(),
+        GoogleNewsConnector(),
+        RDAPConnector(),
+        GitHubUsersConnector(),
+    ]
+    if os.getenv("PHASE1_CONNECTORS") == "true":
+        connectors.extend(
+            [
+                WikidataConnector(),
+                OpenAlexConnector(),
+                AbnLookupConnector(),
+                SecEdgarConnector(),
+                CompaniesHouseConnector(),
+                OpenCorporatesConnector(),
+                GdeltConnector(),
+                CrtShConnector(),
+                WaybackConnector(),
+            ]
+        )
+    return connectors
 
-CONNECTORS: List[Connector] = [
-    MediaWikiConnector(),
-    GoogleNewsConnector(),
-    RDAPConnector(),
-    GitHubUsersConnector(),
-]
-
-if os.getenv("PHASE1_CONNECTORS") == "true":
-    CONNECTORS.extend(
-        [
-            WikidataConnector(),
-            OpenAlexConnector(),
-            AbnLookupConnector(),
-            SecEdgarConnector(),
-            CompaniesHouseConnector(),
-            OpenCorporatesConnector(),
-            GdeltConnector(),
-            CrtShConnector(),
-            WaybackConnector(),
-        ]
-    )
 
+_CONNECTORS_LOCK = threading.Lock()
 
-async def run_connectors(query: str, type: Optional[str] = None) -> List[dict]:
-    """Run all configured connectors concurrently for *query*."""
 
-    tasks = [c.search(query, type=type) for c in CONNECTORS]
-    results = await asyncio.gather(*tasks)
-async def connector_example(query: str) -> List[dict]:
-    """Dummy connector returning deterministic data."""
-
-    await asyncio.sleep(0)  # simulate IO
-    content = f"Contact alice@example.com for more on {query}."
-    doc = {
-        "title": "Example Title",
-        "summary": "Example Summary",
-        "url": "https://example.com/article",
-        "source": "example",
-        "fetched_at": datetime.utcnow().isoformat(),
-        "raw": {"content": content},
-    }
-    # return duplicate to exercise dedupe logic
-    return [doc, doc.copy()]
+def get_connectors() -> List[Connector]:
+    """The module's ``CONNECTORS`` list, built on first use.
+
+    Reading ``main.CONNECTORS`` from outside the module builds it too, so
+    callers that replace or extend the list in place keep working.
+    """
+
+    connectors = globals().get("CONNECTORS")
+    if connectors is None:
+        with _CONNECTORS_LOCK:
+            connectors = globals().get("CONNECTORS")
+            if connectors is None:
+                connectors = globals()["CONNECTORS"] = build_connectors()
+    return connectors
+
+
+def __getattr__(name: str):
+    if name == "CONNECTORS":
+        return get_connectors()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
+def warm_up() -> None:
+    """Build everything that is otherwise loaded on first use."""
 
-async def run_connectors(query: str) -> List[dict]:
-    """Run all connectors concurrently for *query*."""
+    get_connectors()
+    ner.load_model()
+    confidence.get_weights()
 
-    results = await asyncio.gather(connector_example(query))
-    # flatten
-    return [doc for docs in results for doc in docs]
+
+def plan_connectors(query: str, type: Optional[str] = None) -> Plan:
+    """Plan which configured connectors to call for *query* (see planner)."""
+
+    plan = PLANNER.plan(query, type, get_connectors())
+    for source, reason in plan.skipped.values():
+        metrics.CONNECTORS_SKIPPED.labels(source, reason).inc()
+    return plan
+
+
+async def run_connectors(
+    query: str, type: Optional[str] = None, timeout_ms: int = DEADLINE_MS
+) -> List[ConnectorResult]:
+    """Run the connectors planned for *query* concurrently.
+
+    Every connector is held to *timeout_ms*; slow or failing sources report
+    ``timeout``/``error`` without holding up the others. Connectors the
+    planner left out report ``skipped``. Results are in configured order.
+    """
+
+    plan = plan_connectors(query, type)
+    tasks = [
+        c.run(source_query(query, c), type=type, timeout_ms=timeout_ms)
+        for c in plan.connectors
+    ]
+    results = await asyncio.gather(*tasks)
+    for result in results:
+        PLANNER.record(plan.kind, result)
+    return plan.results(results)
+
+
+async def iter_connectors(
+    query: str, type: Optional[str] = None, timeout_ms: int = DEADLINE_MS
+) -> AsyncIterator[ConnectorResult]:
+    """Yield connector results in completion order.
+
+    ``skipped`` results for connectors the planner left out come first.
+    Connectors still running when the consumer stops (for example because
+    a streaming client disconnected) are cancelled.
+    """
+
+    plan = plan_connectors(query, type)
+    tasks = [
+        asyncio.ensure_future(
+            c.run(source_query(query, c), type=type, timeout_ms=timeout_ms)
+        )
+        for c in plan.connectors
+    ]
+    try:
+        for result in plan.skipped_results():
+            yield result
+        for completed in asyncio.as_completed(tasks):
+            result = await completed
+            PLANNER.record(plan.kind, result)
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def new_docs(result: ConnectorResult, dedupe: Deduplicator) -> List[CompactDoc]:
+    """Normalise *result*'s docs, dropping duplicates seen by *dedupe*.
+
+    Docs at an already seen URL are dropped. Near-duplicates of an earlier
+    doc (syndicated or mirrored copies) are recorded in that doc's
+    provenance instead of being returned. Every connector result passes
+    through here, so this is also where its metrics are recorded.
+    """
+
+    if result.status == "skipped":
+        return []
+    source = result.source
+    metrics.CONNECTOR_SECONDS.labels(source).observe(result.latency_ms / 1000)
+    if result.status != "ok":
+        metrics.CONNECTOR_ERRORS.labels(source, result.status).inc()
+    exact, near = dedupe.exact_dropped, dedupe.near_dropped
+    normalise_s = dedupe_s = 0.0
+    clock = time.perf_counter
+    docs = []
+    for raw in result.docs:
+        t0 = clock()
+        doc = normalise_doc(raw)
+        t1 = clock()
+        normalise_s += t1 - t0
+        if dedupe.seen(doc.url):
+            dedupe_s += clock() - t1
+            continue
+        representative = dedupe.cluster(doc.content or doc.summary, doc)
+        dedupe_s += clock() - t1
+        if representative is None:
+            docs.append(doc)
+        else:
+            representative.add_duplicate(doc)
+    if result.docs:
+        metrics.STAGE_SECONDS.labels("normalise").observe(normalise_s)
+        metrics.STAGE_SECONDS.labels("dedupe").observe(dedupe_s)
+        metrics.DOCS_FETCHED.labels(source).inc(len(result.docs))
+        metrics.DOCS_KEPT.labels(source).inc(len(docs))
+        metrics.DEDUPE_DROPPED.labels("url").inc(dedupe.exact_dropped - exact)
+        metrics.DEDUPE_DROPPED.labels("near").inc(dedupe.near_dropped - near)
+    return docs
 
 
 def audit(action: str, target: str, metadata: dict) -> None:
@@ -190,28 +367,139 @@ def audit(action: str, target: str, metadata: dict) -> None:
     )
 
 
-async def pipeline_search(query: str, type: Optional[str] = None) -> List[dict]:
-    raw_docs = await run_connectors(query, type)
-async def pipeline_search(query: str) -> List[dict]:
-    raw_docs = await run_connectors(query)
-    seen = set()
-    docs: List[dict] = []
-    for raw in raw_docs:
-        doc = normalise_doc(raw)
-        if doc["url"] in seen:
+def _cache_key(query: str, type: Optional[str]) -> tuple:
+    return (query, type, tuple(c.source for c in get_connectors()))
+
+
+def _complete(result: PipelineResult) -> bool:
+    # partial results (timeouts, errors) are never cached
+    return all(status in ("ok", "skipped") for status in result.connectors.values())
+
+
+def _pipeline_result(results: List[ConnectorResult]) -> PipelineResult:
+    dedupe = Deduplicator()
+    docs: List[CompactDoc] = []
+    for result in results:
+        docs.extend(new_docs(result, dedupe))
+    return PipelineResult(docs=docs, connectors={r.source: r.status for r in results})
+
+
+async def _run_pipeline(
+    query: str, type: Optional[str], timeout_ms: int
+) -> PipelineResult:
+    return _pipeline_result(await run_connectors(query, type, timeout_ms))
+
+
+async def pipeline_search(
+    query: str, type: Optional[str] = None, timeout_ms: int = DEADLINE_MS
+) -> PipelineResult:
+    """Return normalised, deduplicated docs for *query*.
+
+    Complete results are served from :data:`QUERY_CACHE`; stale entries are
+    returned immediately while a background refresh reruns the connectors.
+    """
+
+    result = await QUERY_CACHE.get_or_load(
+        _cache_key(query, type),
+        lambda: _run_pipeline(query, type, timeout_ms),
+        _complete,
+    )
+    return PipelineResult(docs=list(result.docs), connectors=dict(result.connectors))
+
+
+QueryKey = Tuple[str, Optional[str]]
+
+
+async def _from_fanout(
+    fanout: Dict[int, "asyncio.Future[Dict[str, ConnectorResult]]"],
+    plan: Plan,
+    query: str,
+    type: Optional[str],
+) -> PipelineResult:
+    results = [(await fanout[pos])[source_query(query, c)] for pos, c in plan.run]
+    for result in results:
+        PLANNER.record(plan.kind, result)
+    pipeline = _pipeline_result(plan.results(results))
+    if _complete(pipeline):
+        QUERY_CACHE.put(_cache_key(query, type), pipeline)
+    return PipelineResult(
+        docs=list(pipeline.docs), connectors=dict(pipeline.connectors)
+    )
+
+
+def pipeline_search_many(
+    keys: Iterable[QueryKey],
+    timeout_ms: int = DEADLINE_MS,
+    fanout_tasks: Optional[List["asyncio.Future"]] = None,
+) -> Dict[QueryKey, "asyncio.Future[PipelineResult]"]:
+    """Start :func:`pipeline_search` for many ``(query, type)`` pairs at once.
+
+    Cached pairs resolve immediately. The remaining queries of each type
+    share one :meth:`Connector.run_many` call per connector, covering the
+    queries planned for it, so batching connectors send them upstream
+    together and the others run them within their per-source limits.
+    Returns a future per distinct pair. The shared ``run_many`` tasks are
+    appended to *fanout_tasks*, so a caller that gives up can cancel them.
+    """
+
+    loop = asyncio.get_running_loop()
+    futures: Dict[QueryKey, "asyncio.Future[PipelineResult]"] = {}
+    missing: Dict[Optional[str], List[str]] = {}
+    for query, type in dict.fromkeys(keys):
+        cached = QUERY_CACHE.peek(
+            _cache_key(query, type),
+            lambda q=query, t=type: _run_pipeline(q, t, timeout_ms),
+            _complete,
+        )
+        if cached is None:
+            missing.setdefault(type, []).append(query)
             continue
-        seen.add(doc["url"])
-        docs.append(doc)
-    return docs
+        future = loop.create_future()
+        future.set_result(
+            PipelineResult(docs=list(cached.docs), connectors=dict(cached.connectors))
+        )
+        futures[(query, type)] = future
+    connectors = get_connectors()
+    for type, queries in missing.items():
+        plans = {q: plan_connectors(q, type) for q in queries}
+        planned: Dict[int, List[str]] = {}
+        for query, plan in plans.items():
+            for pos, connector in plan.run:
+                planned.setdefault(pos, []).append(source_query(query, connector))
+        fanout = {
+            pos: asyncio.ensure_future(
+                connectors[pos].run_many(subset, type=type, timeout_ms=timeout_ms)
+            )
+            for pos, subset in planned.items()
+        }
+        if fanout_tasks is not None:
+            fanout_tasks.extend(fanout.values())
+        for query, plan in plans.items():
+            futures[(query, type)] = asyncio.ensure_future(
+                _from_fanout(fanout, plan, query, type)
+            )
+    return futures
+
+
+def _ndjson(event: dict) -> bytes:
+    return (json.dumps(event) + "\n").encode()
 
 
 # ---------------------------------------------------------------------------
 # API endpoints
 # ---------------------------------------------------------------------------
-"""FastAPI service entry point."""
-from fastapi import FastAPI
 
-app = FastAPI()
+
+@app.on_event("startup")
+async def start_warm_up() -> None:
+    """With ``API_WARM_UP=true``, load lazy resources in the background.
+
+    The process accepts requests immediately; a request arriving before the
+    warm-up finishes loads what it needs itself.
+    """
+
+    if os.getenv("API_WARM_UP") == "true":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
 
 @app.get("/health")
@@ -221,77 +509,368 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    """Pipeline metrics in the Prometheus text exposition format."""
+
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/search", response_model=SearchResponse)
-async def search(q: str, type: Optional[str] = None):
+async def search(q: str, type: Optional[str] = None, timeout_ms: int = DEADLINE_MS):
     start = time.time()
     audit("search_start", q, {})
-    docs = await pipeline_search(q, type)
-    docs = await pipeline_search(q)
+    result = await pipeline_search(q, type, timeout_ms)
+    docs = result.docs
     audit("search_end", q, {"count": len(docs), "latency_ms": int((time.time() - start) * 1000)})
-    return {"query": q, "type": type, "count": len(docs), "docs": docs}
+    return {
+        "query": q,
+        "type": type,
+        "count": len(docs),
+        "docs": to_dicts(docs),
+        "connectors": result.connectors,
+    }
+
+
+@app.get("/search/stream")
+async def search_stream(
+    q: str, type: Optional[str] = None, timeout_ms: int = DEADLINE_MS
+):
+    """Stream search results as NDJSON while connectors complete.
+
+    One ``connector`` event per source carries its status and the docs it
+    added after deduplication; a final ``summary`` event closes the stream.
+    """
+
+    async def events() -> AsyncIterator[bytes]:
+        start = time.time()
+        audit("search_start", q, {"stream": True})
+        dedupe = Deduplicator()
+        docs: List[CompactDoc] = []
+        statuses: Dict[str, str] = {}
+        async for result in iter_connectors(q, type, timeout_ms):
+            statuses[result.source] = result.status
+            added = new_docs(result, dedupe)
+            docs.extend(added)
+            yield _ndjson(
+                {
+                    "event": "connector",
+                    "source": result.source,
+                    "status": result.status,
+                    "docs": to_dicts(added),
+                }
+            )
+        pipeline = PipelineResult(docs, statuses)
+        if _complete(pipeline):
+            QUERY_CACHE.put(_cache_key(q, type), pipeline)
+        latency_ms = int((time.time() - start) * 1000)
+        audit("search_end", q, {"count": len(docs), "latency_ms": latency_ms})
+        yield _ndjson(
+            {
+                "event": "summary",
+                "query": q,
+                "type": type,
+                "count": len(docs),
+                "connectors": statuses,
+            }
+        )
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 
 @app.get("/profile", response_model=EntityProfileModel)
-async def profile(q: str, type: str):
+async def profile(q: str, type: str, timeout_ms: int = DEADLINE_MS):
     start = time.time()
     audit("profile_start", q, {"type": type})
-    docs = await pipeline_search(q, type)
-    docs = await pipeline_search(q)
-    signals: Dict[str, List[str]] = {"emails": [], "domains": [], "usernames": [], "phones": [], "locations": []}
-    title_counts: Dict[str, int] = {}
-    description = None
-    for d in docs:
-        content = d["raw"].get("content", "")
-        sig = extract_signals(content)
-        for k, v in sig.items():
-            signals[k].extend(v)
-        title_counts[d["title"]] = title_counts.get(d["title"], 0) + 1
-        if d["source"].lower() in {"wikipedia", "wikidata"} and not description:
-            description = d["summary"]
-    canonical_name = max(title_counts, key=title_counts.get) if title_counts else q
-    aliases = [t for t in title_counts if t != canonical_name]
-    confidence = min(1.0, len(docs) / 5)
-    text_blob = " ".join(d["summary"] for d in docs)
-    facts = extract_facts(text_blob) if os.getenv("ADVANCED_FACTS") == "true" else {}
-    profile = {
-        "query": q,
-        "type": type,
-        "canonical_name": canonical_name,
-        "aliases": aliases,
-        "confidence": confidence,
-        "description": description,
-        "signals": {k: sorted(set(v)) for k, v in signals.items()},
-        "facts": facts,
-        "facts": {},
-        "sources": docs,
-    }
-    audit("profile_end", q, {"count": len(docs), "latency_ms": int((time.time() - start) * 1000)})
+    result = await pipeline_search(q, type, timeout_ms)
+    profile = await _build_profile(q, type, result)
+    audit("profile_end", q, {"count": len(result.docs), "latency_ms": int((time.time() - start) * 1000)})
+    return profile
+
+
+async def _build_profile(q: str, type: str, result: PipelineResult) -> dict:
+    state = PROFILE_STATES.get(q, type)
+    async with state.lock():
+        await state.refresh(result.docs)
+        profile = await state.build(result.connectors)
     if os.getenv("PERSIST_STUB") == "true":
-        key = hashlib.sha256(json.dumps(profile, sort_keys=True).encode()).hexdigest()[:8]
-        ENTITIES[key] = profile
+        key = canonical.entity_id(profile)
+        with metrics.stage("persist"):
+            ENTITIES.put(key, profile)
         profile["id"] = key
     return profile
 
 
+@app.get("/profile/stream")
+async def profile_stream(q: str, type: str, timeout_ms: int = DEADLINE_MS):
+    """Stream an entity profile as NDJSON while connectors complete.
+
+    Each ``connector`` event carries the source's new docs and the profile
+    aggregates (signals, canonical name, aliases, confidence) updated with
+    them. The closing ``summary`` event holds the complete profile without
+    repeating the already streamed sources. Signals are extracted only for
+    docs the kept profile state (see :func:`profile`) has not seen, and the
+    state is brought up to date with the streamed docs at the end.
+    """
+
+    async def events() -> AsyncIterator[bytes]:
+        start = time.time()
+        audit("profile_start", q, {"type": type, "stream": True})
+        kept = PROFILE_STATES.get(q, type)
+        # the kept state may still hold docs from earlier runs, so the
+        # per-event aggregates come from this run's docs only
+        state = ProfileState(q, type)
+        dedupe = Deduplicator()
+        statuses: Dict[str, str] = {}
+        async for result in iter_connectors(q, type, timeout_ms):
+            statuses[result.source] = result.status
+            docs = new_docs(result, dedupe)
+            await state.extend(docs, known=kept)
+            event = {
+                "event": "connector",
+                "source": result.source,
+                "status": result.status,
+                "docs": to_dicts(docs),
+            }
+            event.update(state.aggregates())
+            yield _ndjson(event)
+        pipeline = PipelineResult(list(state.docs), dict(statuses))
+        if _complete(pipeline):
+            QUERY_CACHE.put(_cache_key(q, type), pipeline)
+        async with kept.lock():
+            await kept.refresh(state.docs, known=state)
+            profile = await kept.build(statuses)
+        latency_ms = int((time.time() - start) * 1000)
+        audit("profile_end", q, {"count": len(state), "latency_ms": latency_ms})
+        del profile["sources"]
+        yield _ndjson({"event": "summary", "count": len(state), **profile})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/profiles:batch")
+async def profiles_batch(items: List[BatchProfileItem], timeout_ms: int = DEADLINE_MS):
+    """Profile many ``(q, type)`` pairs, streaming one NDJSON event per item.
+
+    Identical pairs are profiled once and the connector fan-out is shared
+    across the batch (see :func:`pipeline_search_many`). Each input item
+    gets an ``item`` event with its ``index`` and profile, or an ``error``
+    event, in completion order; a closing ``summary`` event reports counts.
+    *timeout_ms* applies to each connector call from the moment its source
+    admits it, so items queued behind a slow source are not timed out.
+    """
+
+    if len(items) > MAX_BATCH:
+        raise HTTPException(400, f"at most {MAX_BATCH} items per batch")
+
+    async def run(key: QueryKey, pipeline: "asyncio.Future[PipelineResult]"):
+        try:
+            return key, await _build_profile(*key, await pipeline), None
+        except Exception as exc:  # reported per item
+            return key, None, str(exc) or exc.__class__.__name__
+
+    async def events() -> AsyncIterator[bytes]:
+        start = time.time()
+        audit("profile_batch_start", "", {"items": len(items)})
+        indexes: Dict[QueryKey, List[int]] = {}
+        errors = 0
+        for index, item in enumerate(items):
+            if not item.q.strip():
+                errors += 1
+                yield _ndjson(
+                    {
+                        "event": "error",
+                        "index": index,
+                        "q": item.q,
+                        "type": item.type,
+                        "error": "q must not be empty",
+                    }
+                )
+                continue
+            indexes.setdefault((item.q, item.type), []).append(index)
+        fanout: List[asyncio.Future] = []
+        pipelines = pipeline_search_many(indexes, timeout_ms, fanout)
+        tasks = [asyncio.ensure_future(run(k, f)) for k, f in pipelines.items()]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                (q, type), profile, error = await completed
+                for index in indexes[(q, type)]:
+                    event = {"index": index, "q": q, "type": type}
+                    if error is None:
+                        yield _ndjson({"event": "item", **event, "profile": profile})
+                    else:
+                        errors += 1
+                        yield _ndjson({"event": "error", **event, "error": error})
+        finally:
+            # a disconnected client must not leave the upstream calls
+            # running and holding source limiter slots
+            for task in [*tasks, *pipelines.values(), *fanout]:
+                task.cancel()
+        latency_ms = int((time.time() - start) * 1000)
+        audit(
+            "profile_batch_end",
+            "",
+            {"items": len(items), "unique": len(indexes), "latency_ms": latency_ms},
+        )
+        yield _ndjson(
+            {
+                "event": "summary",
+                "count": len(items),
+                "unique": len(indexes),
+                "errors": errors,
+            }
+        )
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.post("/entities")
 async def create_entity(profile: EntityProfileModel):
-    data = profile.dict()
-    key = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:8]
-    ENTITIES[key] = data
+    data = asdict(profile)
+    key = canonical.entity_id(data)
+    with metrics.stage("persist"):
+        ENTITIES.put(key, data)
     return {"id": key}
 
 
+@app.post("/entities/bulk")
+async def create_entities(profiles: List[EntityProfileModel]):
+    """Store many profiles in one transaction."""
+
+    items = [(canonical.entity_id(data), data) for data in map(asdict, profiles)]
+    with metrics.stage("persist"):
+        ENTITIES.put_many(items)
+    return {"ids": [key for key, _ in items]}
+
+
+def _check_limit(limit: int) -> None:
+    try:
+        check_limit(limit)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
+
+@app.get("/entities")
+async def find_entities(
+    name: Optional[str] = None,
+    alias: Optional[str] = None,
+    kind: Optional[str] = None,
+    value: Optional[str] = None,
+    limit: int = 100,
+):
+    """Look up entity ids by canonical name, alias or signal value."""
+
+    _check_limit(limit)
+    if name is not None:
+        ids = ENTITIES.find_by_name(name, limit)
+    elif alias is not None:
+        ids = ENTITIES.find_by_alias(alias, limit)
+    elif kind is not None and value is not None:
+        ids = ENTITIES.find_by_signal(kind, value, limit)
+    else:
+        raise HTTPException(400, "name, alias or kind and value required")
+    return {"ids": ids}
+
+
+@app.get("/signals")
+async def find_signals(
+    kind: Optional[str] = None,
+    value: Optional[str] = None,
+    prefix: Optional[str] = None,
+    suffix: Optional[str] = None,
+    limit: int = 100,
+):
+    """Stored entities mentioning a signal value, prefix or suffix.
+
+    ``suffix=@example.com&kind=emails`` lists every stored email at that
+    domain; without *kind* every signal kind is searched.
+    """
+
+    _check_limit(limit)
+    matches: List[dict] = []
+    for signal_kind in [kind] if kind else SIGNAL_KINDS:
+        if len(matches) >= limit:
+            break
+        try:
+            pairs = ENTITIES.search_signals(
+                signal_kind, value, prefix, suffix, limit - len(matches)
+            )
+        except ValueError as exc:
+            raise HTTPException(400, str(exc))
+        matches.extend(
+            {"kind": signal_kind, "value": v, "entity_id": entity_id}
+            for v, entity_id in pairs
+        )
+    return {"matches": matches}
+
+
 @app.get("/entities/{entity_id}")
 async def get_entity(entity_id: str):
-    if entity_id not in ENTITIES:
+    entity = ENTITIES.get(entity_id)
+    if entity is None:
         raise HTTPException(404, "entity not found")
-    return ENTITIES[entity_id]
+    return entity
+
+
+def _download(chunks, format: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        iterate_off_loop(chunks),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
 
 
 @app.post("/export")
 async def export(profile: EntityProfileModel, format: str = "json"):
-    if format not in {"json", "pdf"}:
+    """Export one profile; ``jsonl``, ``csv`` and ``pdf`` stream as rendered."""
+
+    if format == "json":
+        return profile
+    if format not in MEDIA_TYPES:
         raise HTTPException(400, "unsupported format")
-    # stub: just return the profile
-    return profile
-    return {"status": "ok"}
+    audit("export", profile.query, {"format": format})
+    return _download(render(format, [asdict(profile)]), format, "profile")
+
+
+@app.post("/exports", status_code=202)
+async def create_export(request: ExportRequest):
+    """Export stored entities in the background; poll the returned job."""
+
+    if request.format not in MEDIA_TYPES:
+        raise HTTPException(400, "unsupported format")
+    missing = [i for i in request.ids if i not in ENTITIES]
+    if missing:
+        raise HTTPException(404, f"entities not found: {', '.join(missing)}")
+    ids = list(request.ids)
+
+    def profiles():
+        # runs in the export thread; entities are loaded one at a time
+        for entity_id in ids:
+            entity = ENTITIES.get(entity_id)
+            if entity is not None:
+                yield dict(entity, id=entity_id)
+
+    try:
+        job = EXPORTS.submit(request.format, profiles, len(ids))
+    except ExportLimitError as exc:
+        raise HTTPException(429, str(exc))
+    audit("export", job.id, {"format": request.format, "entities": len(ids)})
+    return job.to_dict()
+
+
+@app.get("/exports/{job_id}")
+async def get_export(job_id: str):
+    job = EXPORTS.get(job_id)
+    if job is None:
+        raise HTTPException(404, "export not found")
+    return job.to_dict()
+
+
+@app.get("/exports/{job_id}/file")
+async def download_export(job_id: str):
+    job = EXPORTS.get(job_id)
+    if job is None:
+        raise HTTPException(404, "export not found")
+    if job.status != "done":
+        raise HTTPException(409, f"export is {job.status}")
+    return _download(read_file(EXPORTS.path(job)), job.format, f"export-{job.id}")
@@ -0,0 +1,333 @@
+"""Process-wide pipeline metrics in the Prometheus text format.
+
+Counters and histograms are plain in-process objects: an update is a dict
+lookup for the label values plus an increment (a bisect for histograms)
+under an uncontended lock, so instrumentation can stay on in production.
+Stage timings are taken with :func:`time.perf_counter`. Components that
+already keep their own statistics (the query cache, the entity store, the
+per-source breakers and limiters) are exposed through
+:meth:`Registry.register_stats` and read only when ``/metrics`` is scraped.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; connector calls dominate the upper end, per-doc stages the lower
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "_HistogramValue") -> None:
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # the last slot counts observations above every bound (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+
+    def time(self) -> _Timer:
+        """Context manager observing the time spent in its block."""
+
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The series for *values*, one per label name, created on first use."""
+
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new())
+        return child
+
+    def clear(self) -> None:
+        with self._lock:
+            self._children.clear()
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. documents fetched per source."""
+
+    kind = "counter"
+
+    def _new(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increment the unlabelled series."""
+
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"
+            for values, child in self._series()
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of durations in seconds over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, seconds: float) -> None:
+        """Record one observation in the unlabelled series."""
+
+        self.labels().observe(seconds)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames
+        for values, child in self._series():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(
+                    f"{self.name}_bucket{_labels(names, values, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(names, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(names, values)} {cumulative}")
+        return lines
+
+
+StatsSource = Callable[[], Mapping[str, float]]
+# label value -> statistics, e.g. source -> breaker statistics
+LabelledStatsSource = Callable[[], Mapping[str, Mapping[str, float]]]
+
+
+def _numeric(value: object) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Registry:
+    """A set of metrics rendered together on ``/metrics``."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats: List[Tuple[str, str, Optional[str], LabelledStatsSource]] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def register_stats(
+        self,
+        prefix: str,
+        help: str,
+        source: StatsSource,
+        label: Optional[str] = None,
+    ) -> None:
+        """Expose each numeric entry of ``source()`` as gauge ``prefix_<key>``.
+
+        With *label*, ``source()`` maps label values to statistics and each
+        entry becomes series ``prefix_<key>{<label>="<value>"}``. *source*
+        is called at scrape time only.
+        """
+
+        if label is None:
+            self._stats.append((prefix, help, None, lambda: {"": source()}))
+        else:
+            self._stats.append((prefix, help, label, source))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def reset(self) -> None:
+        """Drop every recorded series (for tests)."""
+
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for prefix, help, label, source in self._stats:
+            series: Dict[str, List[str]] = {}
+            for label_value, stats in sorted(source().items()):
+                labels = _labels((label,), (label_value,)) if label else ""
+                for key, value in stats.items():
+                    if _numeric(value):
+                        series.setdefault(key, []).append(
+                            f"{prefix}_{key}{labels} {_number(value)}"
+                        )
+            for key, samples in series.items():
+                name = f"{prefix}_{key}"
+                lines.append(f"# HELP {name} {help}: {key}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "osint_stage_seconds",
+    "Time spent in a pipeline stage per connector result or profile",
+    ("stage",),
+)
+CONNECTOR_SECONDS = REGISTRY.histogram(
+    "osint_connector_fetch_seconds",
+    "Connector call latency, including timeouts and errors",
+    ("source",),
+)
+CONNECTOR_ERRORS = REGISTRY.counter(
+    "osint_connector_errors_total",
+    "Connector calls that did not complete ok, by status",
+    ("source", "status"),
+)
+CONNECTORS_SKIPPED = REGISTRY.counter(
+    "osint_connector_skipped_total",
+    "Connector calls the planner avoided, by reason",
+    ("source", "reason"),
+)
+DOCS_FETCHED = REGISTRY.counter(
+    "osint_docs_fetched_total", "Documents returned by connectors", ("source",)
+)
+DOCS_KEPT = REGISTRY.counter(
+    "osint_docs_kept_total", "Documents kept after deduplication", ("source",)
+)
+DEDUPE_DROPPED = REGISTRY.counter(
+    "osint_dedupe_dropped_total",
+    "Documents dropped as duplicates: same URL (url) or similar text (near)",
+    ("kind",),
+)
+
+
+def stage(name: str) -> _Timer:
+    """Time a block as pipeline stage *name*."""
+
+    return STAGE_SECONDS.labels(name).time()
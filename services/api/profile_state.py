@@ -0,0 +1,303 @@
+"""Incrementally maintained entity profiles.
+
+A profile is derived from per-document contributions: the signals found in
+the doc's content, its title and, for Wikipedia/Wikidata docs, its
+summary. :class:`ProfileState` keeps those contributions keyed by doc
+(URL and content hash) together with reference-counted aggregates, so
+re-profiling an entity only extracts signals for docs it has not seen and
+only adds or removes the contributions that changed. Profiles are kept
+between requests by :class:`ProfileStates`, a bounded LRU keyed by query
+and type. Requests for the same query and type update and read a kept
+state one at a time under :meth:`ProfileState.lock`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import weakref
+
+from services.analytics.signals import SIGNAL_KINDS, extract_signals
+from services.workers import pool as workers
+
+from . import metrics
+from .records import CompactDoc, to_dicts
+
+DocKey = Tuple[str, str]
+
+_DESCRIPTION_SOURCES = {"wikipedia", "wikidata"}
+
+
+def doc_key(doc: CompactDoc) -> DocKey:
+    # the content hash alone is not unique: every doc without content has
+    # the hash of the empty string
+    return (doc.url, doc.hash)
+
+
+@dataclass(frozen=True)
+class Contribution:
+    """What one document adds to a profile."""
+
+    title: str
+    description: Optional[str]
+    signals: Dict[str, Tuple[str, ...]]
+
+
+class ProfileState:
+    """Profile aggregates maintained by adding and removing documents.
+
+    Signal and fact extraction are CPU-bound and go through
+    :mod:`services.workers.pool`, which offloads them to worker processes
+    when ``PROFILE_WORKERS`` is set.
+    """
+
+    def __init__(self, query: str, type: Optional[str]) -> None:
+        self.query = query
+        self.type = type
+        self._docs: Dict[DocKey, CompactDoc] = {}
+        self._contributions: Dict[DocKey, Contribution] = {}
+        self._positions: Dict[DocKey, int] = {}
+        self._signals: Dict[str, Counter] = {k: Counter() for k in SIGNAL_KINDS}
+        self._titles: Dict[str, Dict[DocKey, None]] = {}
+        self._descriptions: Dict[DocKey, str] = {}
+        self._next_position = 0
+        self._version = 0
+        self._facts: Optional[Tuple[int, dict]] = None
+        self._locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.extracted = 0
+
+    def lock(self) -> asyncio.Lock:
+        """Lock to hold while updating the state and building from it.
+
+        Updates await signal and fact extraction, so without it concurrent
+        requests would interleave their changes.
+        """
+
+        # asyncio primitives bind to the loop they first wait on
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    @property
+    def docs(self) -> List[CompactDoc]:
+        """Current documents in profile order."""
+
+        keys = sorted(self._positions, key=self._positions.__getitem__)
+        return [self._docs[k] for k in keys]
+
+    def __len__(self) -> int:
+        return len(self._contributions)
+
+    def __contains__(self, doc: CompactDoc) -> bool:
+        return doc_key(doc) in self._contributions
+
+    def signals_of(self, doc: CompactDoc) -> Optional[Dict[str, List[str]]]:
+        """Signals already extracted for *doc*, or ``None`` if unknown."""
+
+        contribution = self._contributions.get(doc_key(doc))
+        if contribution is None:
+            return None
+        return {k: list(v) for k, v in contribution.signals.items()}
+
+    def add(self, doc: CompactDoc, signals: Dict[str, List[str]]) -> None:
+        """Append *doc* together with the signals extracted from its content."""
+
+        key = doc_key(doc)
+        if key in self._contributions:
+            self._update(key, doc)
+            return
+        description = None
+        if doc.source.lower() in _DESCRIPTION_SOURCES and doc.summary:
+            description = doc.summary
+        contribution = Contribution(
+            title=doc.title,
+            description=description,
+            signals={k: tuple(v) for k, v in signals.items() if v},
+        )
+        self._docs[key] = doc
+        self._contributions[key] = contribution
+        self._positions[key] = self._next_position
+        self._next_position += 1
+        for kind, values in contribution.signals.items():
+            self._signals[kind].update(values)
+        self._titles.setdefault(doc.title, {})[key] = None
+        if description is not None:
+            self._descriptions[key] = description
+        self._version += 1
+
+    def _update(self, key: DocKey, doc: CompactDoc) -> None:
+        # same URL and content, but title or summary may have been edited;
+        # re-apply the contribution without extracting signals again
+        old = self._docs[key]
+        self._docs[key] = doc
+        if (old.title, old.summary, old.source) == (doc.title, doc.summary, doc.source):
+            return
+        position = self._positions[key]
+        signals = self._contributions[key].signals
+        self.remove(key)
+        self.add(doc, {k: list(v) for k, v in signals.items()})
+        self._positions[key] = position
+
+    def remove(self, key: DocKey) -> None:
+        """Withdraw the contribution of the document with *key*."""
+
+        contribution = self._contributions.pop(key)
+        del self._docs[key]
+        del self._positions[key]
+        for kind, values in contribution.signals.items():
+            counts = self._signals[kind]
+            counts.subtract(values)
+            for value in values:
+                if counts[value] <= 0:
+                    del counts[value]
+        holders = self._titles[contribution.title]
+        del holders[key]
+        if not holders:
+            del self._titles[contribution.title]
+        self._descriptions.pop(key, None)
+        self._version += 1
+
+    async def _extract(
+        self, docs: Sequence[CompactDoc], known: Optional["ProfileState"] = None
+    ) -> List[Dict[str, List[str]]]:
+        found = [known.signals_of(d) if known else None for d in docs]
+        missing = [d for d, signals in zip(docs, found) if signals is None]
+        if missing:
+            self.extracted += len(missing)
+            with metrics.stage("signals"):
+                fresh = iter(
+                    await workers.extract_signals_many([d.content for d in missing])
+                )
+            found = [next(fresh) if s is None else s for s in found]
+        return found
+
+    async def extend(
+        self, docs: Iterable[CompactDoc], known: Optional["ProfileState"] = None
+    ) -> None:
+        """Extract signals for the new docs in *docs* and append them in order.
+
+        Signals *known* already holds for a doc are reused, not extracted.
+        """
+
+        pending = [d for d in docs if d not in self]
+        for doc, signals in zip(pending, await self._extract(pending, known)):
+            self.add(doc, signals)
+
+    async def refresh(
+        self, docs: Sequence[CompactDoc], known: Optional["ProfileState"] = None
+    ) -> None:
+        """Make *docs* the profile's documents, applying only the difference.
+
+        Signals are extracted only for docs neither in the profile nor in
+        *known*; contributions of docs missing from *docs* are removed.
+        """
+
+        pending = [d for d in docs if d not in self]
+        extracted = dict(
+            zip(map(doc_key, pending), await self._extract(pending, known))
+        )
+        wanted = {doc_key(d) for d in docs}
+        for key in [k for k in self._contributions if k not in wanted]:
+            self.remove(key)
+        for position, doc in enumerate(docs):
+            key = doc_key(doc)
+            if key not in self._contributions:
+                # another refresh may have removed it while we extracted
+                signals = extracted.get(key) or extract_signals(doc.content)
+                self.add(doc, signals)
+            else:
+                self._update(key, doc)
+            if self._positions[key] != position:
+                self._positions[key] = position
+                self._version += 1
+        self._next_position = len(docs)
+
+    def aggregates(self) -> dict:
+        """Profile fields derived from the current documents."""
+
+        positions = self._positions
+        first_seen = {
+            title: min(positions[k] for k in holders)
+            for title, holders in self._titles.items()
+        }
+        titles = sorted(first_seen, key=first_seen.__getitem__)
+        canonical_name = (
+            max(titles, key=lambda t: len(self._titles[t])) if titles else self.query
+        )
+        description = None
+        if self._descriptions:
+            first = min(self._descriptions, key=positions.__getitem__)
+            description = self._descriptions[first]
+        return {
+            "canonical_name": canonical_name,
+            "aliases": [t for t in titles if t != canonical_name],
+            "confidence": min(1.0, len(self) / 5),
+            "description": description,
+            "signals": {k: sorted(v) for k, v in self._signals.items()},
+        }
+
+    async def facts(self) -> dict:
+        """Advanced facts, recomputed only when the documents changed."""
+
+        if os.getenv("ADVANCED_FACTS") != "true":
+            return {}
+        if self._facts is None or self._facts[0] != self._version:
+            version = self._version
+            text_blob = " ".join(d.summary for d in self.docs)
+            with metrics.stage("facts"):
+                facts = await workers.extract_facts_async(text_blob)
+            self._facts = (version, facts)
+        return self._facts[1]
+
+    async def build(self, connectors: Dict[str, str]) -> dict:
+        """Return the complete profile, including facts and sources."""
+
+        facts = await self.facts()
+        profile = {"query": self.query, "type": self.type}
+        profile.update(self.aggregates())
+        profile["facts"] = facts
+        profile["sources"] = to_dicts(self.docs)
+        profile["connectors"] = connectors
+        return profile
+
+
+class ProfileStates:
+    """Bounded LRU of :class:`ProfileState` per query and type."""
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._states: "OrderedDict[Tuple[str, Optional[str]], ProfileState]" = (
+            OrderedDict()
+        )
+
+    @classmethod
+    def from_env(cls) -> "ProfileStates":
+        """Build the LRU sized by ``PROFILE_STATE_SIZE``."""
+
+        return cls(max_entries=int(os.getenv("PROFILE_STATE_SIZE", "256")))
+
+    def get(self, query: str, type: Optional[str]) -> ProfileState:
+        """Return the kept state for *query*, creating an empty one if needed."""
+
+        key = (query, type)
+        state = self._states.get(key)
+        if state is None:
+            state = ProfileState(query, type)
+            if self.max_entries <= 0:
+                return state
+            self._states[key] = state
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+        self._states.move_to_end(key)
+        return state
+
+    def clear(self) -> None:
+        self._states.clear()
+
+    def __len__(self) -> int:
+        return len(self._states)
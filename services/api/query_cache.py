@@ -0,0 +1,168 @@
+"""In-memory LRU cache of pipeline results with stale-while-revalidate."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+_MISSING = object()
+
+
+class QueryCache:
+    """LRU cache whose entries are fresh for *ttl* seconds.
+
+    For a further *stale_for* seconds an entry is still returned
+    immediately, but the first such read starts one background refresh.
+    Older entries are treated as misses. Callers decide what may be stored
+    by passing *cacheable* to :meth:`get_or_load`.
+    """
+
+    def __init__(
+        self, max_entries: int = 256, ttl: float = 60.0, stale_for: float = 300.0
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_for = stale_for
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.refresh_ms_total = 0.0
+        self.last_refresh_ms = 0.0
+
+    @classmethod
+    def from_env(cls) -> "QueryCache":
+        """Build a cache from ``QUERY_CACHE_*`` environment variables."""
+
+        return cls(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("QUERY_CACHE_TTL", "60")),
+            stale_for=float(os.getenv("QUERY_CACHE_STALE", "300")),
+        )
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        for task in self._refreshing.values():
+            task.cancel()
+        self._refreshing.clear()
+        self._entries.clear()
+        self.hits = self.stale_hits = self.misses = 0
+        self.refreshes = self.refresh_failures = 0
+        self.refresh_ms_total = self.last_refresh_ms = 0.0
+
+    def _lookup(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool],
+    ) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            if age < self.ttl + self.stale_for:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._refreshing:
+                    self._start_refresh(key, load, cacheable)
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return _MISSING
+
+    def peek(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Optional[Any]:
+        """Return the cached value for *key*, or ``None`` on a miss.
+
+        Unlike :meth:`get_or_load` a miss is left to the caller, which can
+        then load several keys together; *load* is only used to refresh a
+        stale entry in the background.
+        """
+
+        value = self._lookup(key, load, cacheable)
+        return None if value is _MISSING else value
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """Return the cached value for *key*, loading it on a miss."""
+
+        value = self._lookup(key, load, cacheable)
+        if value is not _MISSING:
+            return value
+        value = await load()
+        if cacheable(value):
+            self.put(key, value)
+        return value
+
+    def _start_refresh(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool],
+    ) -> None:
+        async def refresh() -> None:
+            start = time.perf_counter()
+            try:
+                value = await load()
+            except Exception:
+                self.refresh_failures += 1
+                return
+            finally:
+                self._refreshing.pop(key, None)
+            self.refreshes += 1
+            self.last_refresh_ms = (time.perf_counter() - start) * 1000
+            self.refresh_ms_total += self.last_refresh_ms
+            if cacheable(value):
+                self.put(key, value)
+
+        task = asyncio.ensure_future(refresh())
+        self._refreshing[key] = task
+        # hold a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit ratio and refresh latency counters."""
+
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "last_refresh_ms": round(self.last_refresh_ms, 1),
+            "avg_refresh_ms": (
+                round(self.refresh_ms_total / self.refreshes, 1)
+                if self.refreshes
+                else 0.0
+            ),
+            "entries": len(self._entries),
+            "refreshing": len(self._refreshing),
+        }
@@ -0,0 +1,208 @@
+"""Compact in-memory representation of normalised documents.
+
+A plain normalised doc dict keeps the parsed upstream payload (a whole
+RDAP or GitHub JSON document), repeats URL and hash inside ``provenance``
+and carries its own copy of strings such as ``source``. Large profiles and
+cached results hold thousands of them. :class:`CompactDoc` instead:
+
+* uses ``__slots__``, so there is no per-instance ``__dict__``;
+* interns ``source`` and ``classification``;
+* keeps ``raw`` as compact JSON bytes, shared between docs with identical
+  payloads and decoded only when accessed; the decoded payload is kept
+  next to the shared bytes, so repeated responses do not decode it again;
+* derives ``id`` and ``provenance`` instead of storing them.
+
+:meth:`CompactDoc.to_dict` produces the ``doc.schema.json`` shape and is
+meant to be called only at the response boundary.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import json
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+# payloads run from a few hundred bytes to whole RDAP documents, so the
+# table is bounded by size rather than by count
+_BLOB_INTERN_BYTES = 16 * 1024 * 1024
+
+
+class _BlobInterner:
+    """Table bounded by bytes so identical payloads share one bytes object.
+
+    Each entry also caches the payload decoded from its bytes. A decoded
+    payload is charged at the length of its bytes; blobs larger than an
+    eighth of the budget are neither shared nor cached.
+    """
+
+    def __init__(self, max_bytes: int = _BLOB_INTERN_BYTES) -> None:
+        self.max_bytes = max_bytes
+        # blob -> [shared blob, decoded payload or None]
+        self._blobs: "OrderedDict[bytes, list]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def intern(self, blob: bytes) -> bytes:
+        with self._lock:
+            entry = self._blobs.get(blob)
+            if entry is not None:
+                self._blobs.move_to_end(blob)
+                return entry[0]
+            if len(blob) * 8 > self.max_bytes:
+                return blob
+            self._blobs[blob] = [blob, None]
+            self._bytes += len(blob)
+            self._evict()
+            return blob
+
+    def decode(self, blob: bytes) -> dict:
+        """The payload in *blob*, decoded once while *blob* stays interned."""
+
+        with self._lock:
+            entry = self._blobs.get(blob)
+            if entry is not None and entry[1] is not None:
+                self._blobs.move_to_end(blob)
+                return entry[1]
+        decoded = json.loads(blob)
+        with self._lock:
+            entry = self._blobs.get(blob)
+            if entry is not None and entry[1] is None:
+                entry[1] = decoded
+                self._bytes += len(blob)
+                self._evict()
+        return decoded
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._blobs:
+            blob, (_, decoded) = self._blobs.popitem(last=False)
+            self._bytes -= len(blob) * (1 if decoded is None else 2)
+
+    def total_bytes(self) -> int:
+        return self._bytes
+
+
+_BLOBS = _BlobInterner()
+
+
+def encode_payload(raw: dict) -> bytes:
+    """Serialise *raw* compactly for storage in a :class:`CompactDoc`."""
+
+    blob = json.dumps(raw, separators=(",", ":"), ensure_ascii=False).encode()
+    return _BLOBS.intern(blob)
+
+
+class CompactDoc:
+    """Slotted normalised document; see the module docstring."""
+
+    __slots__ = (
+        "title",
+        "summary",
+        "url",
+        "source",
+        "fetched_at",
+        "hash",
+        "classification",
+        "content",
+        "_raw",
+        "_provenance_fetched_at",
+        "_duplicates",
+    )
+
+    def __init__(
+        self,
+        *,
+        title: str,
+        summary: str,
+        url: str,
+        source: str,
+        fetched_at: str,
+        hash: str,
+        raw: dict,
+        classification: str = "OFFICIAL",
+        provenance_fetched_at: Optional[str] = None,
+    ) -> None:
+        self.title = title
+        self.summary = summary
+        self.url = url
+        self.source = sys.intern(source)
+        self.fetched_at = fetched_at
+        self.hash = hash
+        self.classification = sys.intern(classification)
+        # signal extraction reads the content of every doc, so keep it
+        # decoded; the rest of the payload is decoded on demand
+        self.content: str = raw.get("content", "")
+        self._raw = encode_payload(raw)
+        # normalise_doc stamps docs without a fetch time; provenance keeps
+        # the upstream value, which may be empty
+        self._provenance_fetched_at = (
+            None if provenance_fetched_at == fetched_at else provenance_fetched_at
+        )
+        self._duplicates: Optional[List["CompactDoc"]] = None
+
+    @property
+    def id(self) -> str:
+        return self.hash[:8]
+
+    @property
+    def raw(self) -> dict:
+        """The upstream payload, decoded from its stored bytes.
+
+        The decoded payload is shared by docs with the same payload, so
+        callers must not modify it.
+        """
+
+        return _BLOBS.decode(self._raw)
+
+    @property
+    def duplicates(self) -> List["CompactDoc"]:
+        """Near-duplicate documents this one represents."""
+
+        return self._duplicates or []
+
+    def add_duplicate(self, doc: "CompactDoc") -> None:
+        if self._duplicates is None:
+            self._duplicates = []
+        self._duplicates.append(doc)
+
+    @property
+    def provenance(self) -> Dict[str, Any]:
+        fetched_at = self._provenance_fetched_at
+        provenance: Dict[str, Any] = {
+            "url": self.url,
+            "fetched_at": self.fetched_at if fetched_at is None else fetched_at,
+            "content_hash": self.hash,
+            "connector": self.source,
+        }
+        if self._duplicates:
+            provenance["duplicates"] = [
+                {"url": d.url, "connector": d.source, "content_hash": d.hash}
+                for d in self._duplicates
+            ]
+        return provenance
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the document in ``doc.schema.json`` form."""
+
+        return {
+            "id": self.id,
+            "title": self.title,
+            "summary": self.summary,
+            "url": self.url,
+            "source": self.source,
+            "fetched_at": self.fetched_at,
+            "raw": self.raw,
+            "hash": self.hash,
+            "classification": self.classification,
+            "provenance": self.provenance,
+        }
+
+    def __repr__(self) -> str:
+        return f"CompactDoc(id={self.id!r}, source={self.source!r}, url={self.url!r})"
+
+
+def to_dicts(docs: Sequence[CompactDoc]) -> List[Dict[str, Any]]:
+    """Serialise *docs* at the response boundary."""
+
+    return [doc.to_dict() for doc in docs]
@@ -3,22 +3,73 @@ import asyncio
 import json
 import logging
 import re
+import time
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
-from urllib.parse import urlencode
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from urllib.parse import quote, urlencode
 import xml.etree.ElementTree as ET
 
-from services.fetcher.fetcher import fetch
+from services.fetcher.cache import get_cache
+from services.fetcher.fetcher import HTTPStatusError, afetch, astream
+
+from .breaker import CircuitOpenError, backoff, breaker_for, budget_for
+from .deadline import Deadline, current_deadline, set_deadline
+from .limits import limiter_for
+from .policy import policy_for_host
+from .singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 
+# concurrent identical requests share one upstream call
+FLIGHTS = SingleFlight()
+
+
+def singleflight_stats() -> Dict[str, int]:
+    return FLIGHTS.stats()
+
+
+@dataclass
+class ConnectorResult:
+    """Outcome of one connector call: ``ok``, ``timeout`` or ``error``.
+
+    The planner reports connectors it did not call as ``skipped``.
+    """
+
+    source: str
+    status: str
+    docs: List[Dict[str, Any]] = field(default_factory=list)
+    latency_ms: int = 0
+
+
 class Connector(ABC):
-    """Base connector providing rate limiting and error logging."""
+    """Base connector providing rate limiting and error logging.
+
+    Limits are per source (see :mod:`services.connectors.limits`), so
+    different connectors run concurrently while each stays within the
+    limits its upstream publishes. Identical concurrent searches against the
+    same source are coalesced into a single upstream call. ``timeout_ms`` is
+    enforced as a deadline covering the fetch helpers and their retries, and
+    a source whose circuit breaker is open fails fast.
+    """
 
     source: str = ""
-    _semaphore = asyncio.Semaphore(1)
+    # query kinds (see services.connectors.planner) this source can answer;
+    # None means every kind
+    kinds: Optional[FrozenSet[str]] = None
 
     async def search(
         self,
@@ -28,16 +79,129 @@ class Connector(ABC):
         limit: int = 5,
         timeout_ms: int = 10000,
     ) -> List[Dict[str, Any]]:
-        try:
-            async with self._semaphore:
-                return await self._search(
-                    query, type=type, context=context, limit=limit, timeout_ms=timeout_ms
+        result = await self.run(
+            query, type=type, context=context, limit=limit, timeout_ms=timeout_ms
+        )
+        return result.docs
+
+    async def run(
+        self,
+        query: str,
+        type: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+        limit: int = 5,
+        timeout_ms: int = 10000,
+        *,
+        queued: bool = False,
+    ) -> ConnectorResult:
+        """Search like :meth:`search` but report status and latency too.
+
+        Never raises: failures are logged and reported as ``error`` and an
+        exceeded deadline as ``timeout``, both with no documents. With
+        *queued* the deadline, and the reported latency, start only once the
+        source's limiter admits the call, so time spent waiting behind the
+        other queries of a batch does not count against it.
+        """
+
+        start = time.monotonic()
+        if breaker_for(self.source).is_open():
+            # quarantined: fail fast without spending limiter capacity
+            logger.warning("connector_circuit_open", extra={"connector": self.source})
+            return ConnectorResult(source=self.source, status="error")
+        deadline = None if queued else Deadline.after_ms(timeout_ms)
+
+        async def call() -> List[Dict[str, Any]]:
+            nonlocal start
+            async with limiter_for(self.source):
+                if queued:
+                    start = time.monotonic()
+                admitted = deadline or Deadline.after_ms(timeout_ms)
+                set_deadline(admitted)
+                search = self._search(
+                    query,
+                    type=type,
+                    context=context,
+                    limit=limit,
+                    timeout_ms=timeout_ms,
                 )
+                return await asyncio.wait_for(search, admitted.remaining())
+
+        status = "ok"
+        docs: List[Dict[str, Any]] = []
+        try:
+            if context is None:
+                shared = FLIGHTS.do((self.source, query, type, limit), call)
+            else:  # caller-specific context cannot be shared
+                shared = call()
+            if deadline is None:
+                # bounded by the deadline started in call()
+                docs = await shared
+            else:
+                docs = await asyncio.wait_for(shared, deadline.remaining())
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.warning(
+                "connector_timeout",
+                extra={"connector": self.source, "timeout_ms": timeout_ms},
+            )
         except Exception as exc:  # never raise
+            status = "error"
             logger.error(
                 "connector_error", extra={"connector": self.source, "error": str(exc)}
             )
-            return []
+        return ConnectorResult(
+            source=self.source,
+            status=status,
+            # each caller gets its own records, whether it led or joined the call
+            docs=[dict(doc) for doc in docs],
+            latency_ms=int((time.monotonic() - start) * 1000),
+        )
+
+    async def search_many(
+        self,
+        queries: Iterable[str],
+        type: Optional[str] = None,
+        limit: int = 5,
+        timeout_ms: int = 10000,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Search several *queries* and return documents keyed by query.
+
+        Failed or timed-out queries map to an empty list; see
+        :meth:`run_many`.
+        """
+
+        results = await self.run_many(
+            queries, type=type, limit=limit, timeout_ms=timeout_ms
+        )
+        return {q: r.docs for q, r in results.items()}
+
+    async def run_many(
+        self,
+        queries: Iterable[str],
+        type: Optional[str] = None,
+        limit: int = 5,
+        timeout_ms: int = 10000,
+    ) -> Dict[str, ConnectorResult]:
+        """Run several *queries* and return a result per distinct query.
+
+        By default each distinct query is searched concurrently, within the
+        source's limits. A :class:`BatchConnector` with ``batch_size > 1``
+        sends the queries upstream in batches instead, and every query in a
+        failed batch reports that batch's status. Each query or batch gets
+        *timeout_ms* from the moment the source's limiter admits it (see
+        ``queued`` in :meth:`run`), however long it waited behind the others.
+        """
+
+        unique = list(dict.fromkeys(queries))
+        if isinstance(self, BatchConnector) and self.batch_size > 1:
+            return await self._run_batches(unique, type, limit, timeout_ms)
+        results = await asyncio.gather(
+            *(
+                self.run(q, type=type, limit=limit, timeout_ms=timeout_ms, queued=True)
+                for q in unique
+            )
+        )
+        return dict(zip(unique, results))
 
     @abstractmethod
     async def _search(
@@ -51,28 +215,224 @@ class Connector(ABC):
         ...
 
 
-async def _fetch_json(url: str, allowed_host: str) -> Dict[str, Any]:
-    for attempt in range(3):
+class BatchConnector(ABC):
+    """Mixin for connectors whose upstream answers several queries at once.
+
+    Mixed into a :class:`Connector`, it makes :meth:`Connector.run_many`
+    send up to ``batch_size`` queries per upstream request through
+    :meth:`_search_batch`. Batches get the same handling as single
+    searches: an open circuit breaker fails them fast, and identical
+    concurrent batches share one upstream call.
+    """
+
+    source: str
+    # queries per upstream request; 1 searches them one by one
+    batch_size: int = 10
+
+    async def _run_batches(
+        self,
+        queries: List[str],
+        type: Optional[str],
+        limit: int,
+        timeout_ms: int,
+    ) -> Dict[str, ConnectorResult]:
+        batches = [
+            queries[i : i + self.batch_size]
+            for i in range(0, len(queries), self.batch_size)
+        ]
+        found: Dict[str, ConnectorResult] = {}
+        for part in await asyncio.gather(
+            *(self._run_batch(b, type, limit, timeout_ms) for b in batches)
+        ):
+            found.update(part)
+        return {q: found[q] for q in queries}
+
+    async def _run_batch(
+        self, batch: List[str], type: Optional[str], limit: int, timeout_ms: int
+    ) -> Dict[str, ConnectorResult]:
+        start = time.monotonic()
+        if breaker_for(self.source).is_open():
+            logger.warning("connector_circuit_open", extra={"connector": self.source})
+            return {
+                q: ConnectorResult(source=self.source, status="error") for q in batch
+            }
+
+        async def call() -> Dict[str, List[Dict[str, Any]]]:
+            nonlocal start
+            async with limiter_for(self.source):
+                start = time.monotonic()
+                deadline = Deadline.after_ms(timeout_ms)
+                set_deadline(deadline)
+                search = self._search_batch(batch, type=type, limit=limit)
+                return await asyncio.wait_for(search, deadline.remaining())
+
+        status = "ok"
+        found: Dict[str, List[Dict[str, Any]]] = {}
         try:
-            res = await asyncio.to_thread(fetch, url, allowed_hosts={allowed_host})
-            return json.loads(res.content.decode())
-        except Exception:
-            if attempt == 2:
-                raise
-            await asyncio.sleep(0.5 * (2**attempt))
-    return {}
+            # bounded by the deadline started in call()
+            found = await FLIGHTS.do((self.source, tuple(batch), type, limit), call)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.warning(
+                "connector_timeout",
+                extra={"connector": self.source, "timeout_ms": timeout_ms},
+            )
+        except Exception as exc:  # never raise
+            status = "error"
+            logger.error(
+                "connector_error", extra={"connector": self.source, "error": str(exc)}
+            )
+        latency_ms = int((time.monotonic() - start) * 1000)
+        return {
+            q: ConnectorResult(
+                source=self.source,
+                status=status,
+                # each caller gets its own records, whether it led or joined
+                docs=[dict(doc) for doc in found.get(q, [])],
+                latency_ms=latency_ms,
+            )
+            for q in batch
+        }
 
+    @abstractmethod
+    async def _search_batch(
+        self, queries: List[str], type: Optional[str] = None, limit: int = 5
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Documents for each of *queries*; queries with none may be left out."""
 
-async def _fetch_text(url: str, allowed_host: str) -> str:
+
+T = TypeVar("T")
+
+
+def _fetch_options(allowed_host: str) -> Dict[str, Any]:
+    """Fetch keyword arguments for *allowed_host*, including its cache policy.
+
+    Redirects may also reach the hosts the source's policy lists.
+    """
+
+    policy = policy_for_host(allowed_host)
+    hosts = {allowed_host, *(policy.redirect_hosts if policy else ())}
+    options: Dict[str, Any] = {"allowed_hosts": hosts}
+    cache = get_cache()
+    if cache is not None and policy is not None:
+        options.update(cache=cache, cache_policy=policy.cache)
+    return options
+
+
+async def _hedged(operation: Callable[[], Awaitable[T]], delay: float) -> T:
+    """Run *operation*, starting a duplicate if it is slower than *delay*."""
+
+    tasks = [asyncio.ensure_future(operation())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.append(asyncio.ensure_future(operation()))
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not pending:
+                return done.pop().result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _retryable(exc: BaseException) -> bool:
+    """Transport failures, timeouts, 5xx and 429 are worth another attempt."""
+
+    if isinstance(exc, HTTPStatusError):
+        return exc.retryable
+    return isinstance(exc, (OSError, asyncio.TimeoutError, EOFError))
+
+
+async def _retry(operation: Callable[[], Awaitable[T]], allowed_host: str) -> T:
+    """Run *operation* with jittered backoff behind the source's breaker.
+
+    Retries stop at the current connector deadline, when the source's retry
+    budget is spent, or as soon as the failure is not retryable. While the
+    breaker is open the operation is not attempted at all.
+    """
+
+    deadline = current_deadline()
+    policy = policy_for_host(allowed_host)
+    source = policy.source if policy else allowed_host
+    hedge_after = policy.hedge_after if policy else None
+    breaker = breaker_for(source)
+    budget = budget_for(source)
+    budget.deposit()
     for attempt in range(3):
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit open for {source}")
         try:
-            res = await asyncio.to_thread(fetch, url, allowed_hosts={allowed_host})
-            return res.content.decode()
-        except Exception:
-            if attempt == 2:
+            pending = _hedged(operation, hedge_after) if hedge_after else operation()
+            if deadline is None:
+                result = await pending
+            else:
+                result = await asyncio.wait_for(pending, deadline.remaining())
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except Exception as exc:
+            if not _retryable(exc):
+                # the upstream answered; the request itself was at fault
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            delay = backoff(attempt)
+            if (
+                attempt == 2
+                or (deadline and deadline.remaining() <= delay)
+                or not budget.withdraw()
+            ):
                 raise
-            await asyncio.sleep(0.5 * (2**attempt))
-    return ""
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+    raise AssertionError("unreachable")
+
+
+async def _fetch_payload(url: str, allowed_host: str) -> Tuple[Any, str]:
+    """Return the decoded JSON body of *url* and the SHA-256 of its bytes."""
+
+    async def operation() -> Tuple[Any, str]:
+        res = await afetch(url, **_fetch_options(allowed_host))
+        return json.loads(res.content), res.sha256
+
+    return await _retry(operation, allowed_host)
+
+
+async def _fetch_json(url: str, allowed_host: str) -> Dict[str, Any]:
+    data, _ = await _fetch_payload(url, allowed_host)
+    return data
+
+
+async def _fetch_text(url: str, allowed_host: str) -> str:
+    async def operation() -> str:
+        res = await afetch(url, **_fetch_options(allowed_host))
+        return res.content.decode()
+
+    return await _retry(operation, allowed_host)
+
+
+async def _fetch_xml(url: str, allowed_host: str) -> ET.Element:
+    """Parse the XML body of *url* incrementally as chunks arrive."""
+
+    async def operation() -> ET.Element:
+        parser = ET.XMLParser()
+        async with astream(url, **_fetch_options(allowed_host)) as stream:
+            async for chunk in stream:
+                parser.feed(chunk)
+        if not stream.size:
+            return ET.Element("rss")
+        return parser.close()
+
+    return await _retry(operation, allowed_host)
 
 
 def _is_domain(query: str) -> bool:
@@ -81,6 +441,7 @@ def _is_domain(query: str) -> bool:
 
 class MediaWikiConnector(Connector):
     source = "wikipedia"
+    kinds = frozenset({"person", "company", "domain"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         limit = kwargs.get("limit", 5)
@@ -113,13 +474,13 @@ class MediaWikiConnector(Connector):
 
 class GoogleNewsConnector(Connector):
     source = "google_news"
+    kinds = frozenset({"person", "company", "domain", "email"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         limit = kwargs.get("limit", 5)
         params = {"q": query, "hl": "en-AU", "gl": "AU", "ceid": "AU:en"}
         url = f"https://news.google.com/rss/search?{urlencode(params)}"
-        text = await _fetch_text(url, "news.google.com")
-        root = ET.fromstring(text or "<rss/>")
+        root = await _fetch_xml(url, "news.google.com")
         docs: List[Dict[str, Any]] = []
         for item in root.findall("channel/item")[:limit]:
             title = item.findtext("title", default="")
@@ -140,12 +501,13 @@ class GoogleNewsConnector(Connector):
 
 class RDAPConnector(Connector):
     source = "rdap"
+    kinds = frozenset({"domain"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         if not _is_domain(query):
             return []
-        url = f"https://rdap.org/domain/{query}"
-        data = await _fetch_json(url, "rdap.org")
+        url = f"https://rdap.org/domain/{quote(query, safe='')}"
+        data, content_hash = await _fetch_payload(url, "rdap.org")
         return [
             {
                 "title": f"RDAP data for {query}",
@@ -154,16 +516,24 @@ class RDAPConnector(Connector):
                 "source": self.source,
                 "fetched_at": datetime.utcnow().isoformat(),
                 "raw": data,
+                "content_hash": content_hash,
             }
         ]
 
 
 class GitHubUsersConnector(Connector):
     source = "github_users"
+    kinds = frozenset({"username"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
-        url = f"https://api.github.com/users/{query}"
-        data = await _fetch_json(url, "api.github.com")
+        url = f"https://api.github.com/users/{quote(query, safe='')}"
+        try:
+            data, content_hash = await _fetch_payload(url, "api.github.com")
+        except HTTPStatusError as exc:
+            if exc.status == 404:
+                # no such user: an answer, not a failure
+                return []
+            raise
         if not data:
             return []
         return [
@@ -174,6 +544,7 @@ class GitHubUsersConnector(Connector):
                 "source": self.source,
                 "fetched_at": datetime.utcnow().isoformat(),
                 "raw": data,
+                "content_hash": content_hash,
             }
         ]
 
@@ -181,15 +552,60 @@ class GitHubUsersConnector(Connector):
 # Phase-1 stub connectors ---------------------------------------------------
 
 
-class WikidataConnector(Connector):
+class WikidataConnector(BatchConnector, Connector):
+    """Looks up Wikidata entity ids (``Q42``) via ``wbgetentities``.
+
+    Other queries return no documents. Bulk lookups are sent 50 ids per
+    request, the API's limit for anonymous clients.
+    """
+
     source = "wikidata"
+    kinds = frozenset({"wikidata_id"})
+    batch_size = 50
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
-        return []
+        found = await self._search_batch([query])
+        return found.get(query, [])
+
+    async def _search_batch(
+        self, queries: List[str], type: Optional[str] = None, limit: int = 5
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        ids = [q for q in queries if re.fullmatch(r"Q\d+", q)]
+        if not ids:
+            return {}
+        params = {
+            "action": "wbgetentities",
+            "ids": "|".join(ids),
+            "props": "labels|descriptions",
+            "languages": "en",
+            "format": "json",
+        }
+        url = f"https://www.wikidata.org/w/api.php?{urlencode(params)}"
+        data = await _fetch_json(url, "www.wikidata.org")
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        for entity_id, entity in data.get("entities", {}).items():
+            if "missing" in entity:
+                continue
+            label = entity.get("labels", {}).get("en", {}).get("value", entity_id)
+            description = (
+                entity.get("descriptions", {}).get("en", {}).get("value", "")
+            )
+            found[entity_id] = [
+                {
+                    "title": label,
+                    "summary": description,
+                    "url": f"https://www.wikidata.org/wiki/{entity_id}",
+                    "source": self.source,
+                    "fetched_at": datetime.utcnow().isoformat(),
+                    "raw": {"content": description, "entity": entity},
+                }
+            ]
+        return found
 
 
 class OpenAlexConnector(Connector):
     source = "openalex"
+    kinds = frozenset({"person", "company"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
@@ -197,6 +613,7 @@ class OpenAlexConnector(Connector):
 
 class AbnLookupConnector(Connector):
     source = "abn_lookup"
+    kinds = frozenset({"company"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
@@ -204,6 +621,7 @@ class AbnLookupConnector(Connector):
 
 class SecEdgarConnector(Connector):
     source = "sec_edgar"
+    kinds = frozenset({"company"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
@@ -211,6 +629,7 @@ class SecEdgarConnector(Connector):
 
 class CompaniesHouseConnector(Connector):
     source = "companies_house"
+    kinds = frozenset({"company", "person"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
@@ -218,6 +637,7 @@ class CompaniesHouseConnector(Connector):
 
 class OpenCorporatesConnector(Connector):
     source = "open_corporates"
+    kinds = frozenset({"company"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
@@ -225,6 +645,7 @@ class OpenCorporatesConnector(Connector):
 
 class GdeltConnector(Connector):
     source = "gdelt"
+    kinds = frozenset({"person", "company", "domain"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
@@ -232,6 +653,7 @@ class GdeltConnector(Connector):
 
 class CrtShConnector(Connector):
     source = "crt_sh"
+    kinds = frozenset({"domain", "email"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
@@ -239,6 +661,7 @@ class CrtShConnector(Connector):
 
 class WaybackConnector(Connector):
     source = "wayback"
+    kinds = frozenset({"domain"})
 
     async def _search(self, query: str, **kwargs: Any) -> List[Dict[str, Any]]:
         return []
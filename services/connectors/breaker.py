@@ -0,0 +1,151 @@
+"""Circuit breakers and retry budgets for connector fetches.
+
+A source that keeps failing is quarantined: its breaker opens and calls
+fail immediately instead of paying timeouts and retries. After
+``reset_timeout`` a single probe is let through (half-open); success closes
+the breaker again, failure re-opens it. A retry budget additionally caps
+retries to a fraction of recent requests so a struggling upstream is not
+hit with a multiple of its normal traffic.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from typing import Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling a source whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker counting consecutive failures."""
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected, without changing state."""
+
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at < self.reset_timeout
+        return self.state == HALF_OPEN and self._probing
+
+    def allow(self) -> bool:
+        """Return whether a call may proceed, admitting one half-open probe."""
+
+        if self.state == OPEN and not self.is_open():
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def abandon(self) -> None:
+        """Release a half-open probe that ended without an outcome."""
+
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": OPEN if self.is_open() else self.state,
+            "failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """Allow retries up to *ratio* of requests, plus a small reserve."""
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 3.0) -> None:
+        self.ratio = ratio
+        self.cap = reserve
+        self._tokens = reserve
+
+    def deposit(self) -> None:
+        """Credit one original request."""
+
+        self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Spend one retry if the budget allows it."""
+
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 4.0) -> float:
+    """Full-jitter exponential backoff for retry *attempt* (0-based)."""
+
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BUDGETS: Dict[str, RetryBudget] = {}
+
+
+def breaker_for(source: str) -> CircuitBreaker:
+    breaker = _BREAKERS.get(source)
+    if breaker is None:
+        breaker = _BREAKERS[source] = CircuitBreaker()
+    return breaker
+
+
+def budget_for(source: str) -> RetryBudget:
+    budget = _BUDGETS.get(source)
+    if budget is None:
+        budget = _BUDGETS[source] = RetryBudget()
+    return budget
+
+
+def breaker_stats() -> Dict[str, Dict[str, object]]:
+    """Return breaker state per source."""
+
+    return {source: b.stats() for source, b in _BREAKERS.items()}
+
+
+def reset(source: Optional[str] = None) -> None:
+    """Forget breaker and budget state for *source*, or for all sources."""
+
+    if source is None:
+        _BREAKERS.clear()
+        _BUDGETS.clear()
+    else:
+        _BREAKERS.pop(source, None)
+        _BUDGETS.pop(source, None)
@@ -0,0 +1,45 @@
+"""Request deadlines shared by connectors and their fetch helpers.
+
+A :class:`Deadline` is installed in a context variable for the duration of
+a connector search so that the fetch helpers, including their retries and
+backoff sleeps, stop as soon as the caller's time budget is spent.
+"""
+
+from __future__ import annotations
+
+from contextvars import ContextVar
+import time
+from typing import Optional
+
+
+class Deadline:
+    """Absolute point in time after which work should be abandoned."""
+
+    def __init__(self, expires_at: float) -> None:
+        self.expires_at = expires_at
+
+    @classmethod
+    def after_ms(cls, timeout_ms: float) -> "Deadline":
+        return cls(time.monotonic() + timeout_ms / 1000)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+_CURRENT: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Return the deadline of the connector call in progress, if any."""
+
+    return _CURRENT.get()
+
+
+def set_deadline(deadline: Optional[Deadline]) -> None:
+    _CURRENT.set(deadline)
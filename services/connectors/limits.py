@@ -0,0 +1,130 @@
+"""Per-source concurrency and token-bucket rate limiting.
+
+Each source gets its own :class:`SourceLimiter` built from its
+:class:`~services.connectors.policy.SourcePolicy`, so connectors for
+different sources run in parallel while each one stays within the limits
+its upstream publishes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict, Optional
+import weakref
+
+from .policy import SourcePolicy, policy_for
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``capacity / period`` per second.
+
+    Callers reserve a token immediately and sleep until it would have been
+    available, which keeps waiters in arrival order without a queue.
+    """
+
+    def __init__(self, capacity: int, period: float) -> None:
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it."""
+
+        self._refill()
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class SourceLimiter:
+    """Concurrency cap plus optional rate limit for one source."""
+
+    def __init__(self, policy: SourcePolicy) -> None:
+        self.policy = policy
+        self.bucket: Optional[TokenBucket] = (
+            TokenBucket(*policy.rate) if policy.rate else None
+        )
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives bind to the loop they first wait on
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = self._semaphores[loop] = asyncio.Semaphore(self.policy.concurrency)
+        return sem
+
+    async def __aenter__(self) -> "SourceLimiter":
+        sem = self._semaphore()
+        self.waiting += 1
+        try:
+            await sem.acquire()
+            try:
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+            except BaseException:
+                sem.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.in_flight -= 1
+        self._semaphore().release()
+
+    def headroom(self) -> float:
+        """Fraction of capacity currently free, in ``[0, 1]``."""
+
+        limit = self.policy.concurrency
+        free = max(0, limit - self.in_flight) / limit
+        if self.bucket is not None:
+            free = min(free, max(0.0, self.bucket.tokens) / self.bucket.capacity)
+        return free
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency": self.policy.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "tokens": round(self.bucket.tokens, 3) if self.bucket else -1,
+        }
+
+
+_LIMITERS: Dict[str, SourceLimiter] = {}
+
+
+def limiter_for(source: str) -> SourceLimiter:
+    """Return the shared limiter for *source*."""
+
+    limiter = _LIMITERS.get(source)
+    if limiter is None:
+        limiter = _LIMITERS[source] = SourceLimiter(policy_for(source))
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    """Return per-source limiter state."""
+
+    return {source: lim.stats() for source, lim in _LIMITERS.items()}
@@ -0,0 +1,280 @@
+"""Query planning: which connectors to call for a query, and in what order.
+
+A query is classified by shape and by the caller's ``type`` into one or
+more kinds (:data:`KINDS`). Only connectors whose :attr:`Connector.kinds`
+include one of them are called, so RDAP never sees a person's name and
+GitHub never sees a domain. Connectors that declare no kinds take every
+query. :func:`source_query` adapts the query to each source; for example,
+an ``@handle`` reaches username sources as ``handle``.
+
+Among applicable connectors, the planner keeps per-source history: an
+exponentially weighted latency and, per query kind, how many calls
+returned documents. A source whose hit rate for a kind stays below
+``min_hit_rate`` after ``min_calls`` calls is skipped for that kind. Every
+``explore_every``-th such query still reaches it, so recovery is noticed.
+The rest are ranked by expected documents per second, discounted by the
+source's free rate-limit capacity. The ranking only matters when
+``max_sources`` is set: it decides which sources the cap keeps. Every
+planned connector is started at once, so without a cap the order has no
+effect on latency, and results are reported in configured order anyway.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import Connector, ConnectorResult
+from .limits import limiter_for
+
+KINDS = ("domain", "email", "username", "person", "company", "wikidata_id")
+
+_WIKIDATA_RE = re.compile(r"Q\d+")
+_EMAIL_RE = re.compile(r"[^@\s]+@(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,}")
+_DOMAIN_RE = re.compile(r"(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,}")
+_HANDLE_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*")
+
+_TYPE_HINTS = {
+    "person": "person",
+    "people": "person",
+    "company": "company",
+    "organisation": "company",
+    "organization": "company",
+    "org": "company",
+    "domain": "domain",
+    "email": "email",
+    "username": "username",
+    "handle": "username",
+}
+
+_COMPANY_SUFFIXES = {
+    "ag",
+    "co",
+    "company",
+    "corp",
+    "corporation",
+    "gmbh",
+    "group",
+    "holdings",
+    "inc",
+    "incorporated",
+    "limited",
+    "llc",
+    "llp",
+    "ltd",
+    "plc",
+    "pty",
+    "sa",
+}
+
+DEFAULT_LATENCY_MS = 500.0
+
+
+def classify(query: str, type: Optional[str] = None) -> Tuple[str, ...]:
+    """Plausible kinds of *query*, most likely first.
+
+    Unambiguous shapes (Wikidata ids, emails, domains, ``@handles``) win
+    over the *type* hint; otherwise the hint decides, and a single bare
+    token may also be a login.
+    """
+
+    q = query.strip()
+    if _WIKIDATA_RE.fullmatch(q):
+        return ("wikidata_id",)
+    if _EMAIL_RE.fullmatch(q):
+        return ("email",)
+    if _DOMAIN_RE.fullmatch(q):
+        return ("domain",)
+    if q.startswith("@") and _HANDLE_RE.fullmatch(q[1:]):
+        return ("username",)
+    hint = _TYPE_HINTS.get((type or "").lower())
+    words = q.split()
+    if len(words) == 1 and _HANDLE_RE.fullmatch(q):
+        if hint in ("person", "company"):
+            return (hint, "username")
+        if hint:
+            return (hint,)
+        if not q.isalpha() or q.islower():
+            return ("username", "person")
+        return ("person", "company", "username")
+    if hint:
+        return (hint,)
+    if words and words[-1].lower().rstrip(".,") in _COMPANY_SUFFIXES:
+        return ("company",)
+    return ("person", "company")
+
+
+def source_query(query: str, connector: Connector) -> str:
+    """*query* as *connector* should receive it.
+
+    Username sources get an ``@handle`` without its ``@``: GitHub looks
+    up ``torvalds``, not ``@torvalds``. Other queries pass unchanged.
+    """
+
+    q = query.strip()
+    accepted = connector.kinds
+    if accepted is not None and "username" in accepted and q.startswith("@"):
+        if _HANDLE_RE.fullmatch(q[1:]):
+            return q[1:]
+    return query
+
+
+@dataclass
+class SourceHistory:
+    """What the planner has learned about one source."""
+
+    latency_ms: Optional[float] = None
+    calls: Dict[str, int] = field(default_factory=dict)
+    hits: Dict[str, int] = field(default_factory=dict)
+    pruned: Dict[str, int] = field(default_factory=dict)
+
+    def hit_rate(self, kind: str) -> float:
+        # Laplace estimate: unknown sources start at 0.5
+        return (self.hits.get(kind, 0) + 1) / (self.calls.get(kind, 0) + 2)
+
+
+@dataclass
+class Plan:
+    """Connectors to call for one query, highest ranked first.
+
+    Positions refer to the configured connector list, so results can be
+    reported in configured order whatever order they were launched in.
+    """
+
+    kinds: Tuple[str, ...]
+    run: List[Tuple[int, Connector]]
+    skipped: Dict[int, Tuple[str, str]] = field(default_factory=dict)
+
+    @property
+    def kind(self) -> str:
+        return self.kinds[0]
+
+    @property
+    def connectors(self) -> List[Connector]:
+        return [connector for _, connector in self.run]
+
+    def skipped_results(self) -> List[ConnectorResult]:
+        return [
+            ConnectorResult(source=source, status="skipped")
+            for _, (source, _) in sorted(self.skipped.items())
+        ]
+
+    def results(self, results: Sequence[ConnectorResult]) -> List[ConnectorResult]:
+        """*results* of :attr:`connectors` plus the skipped, in configured order."""
+
+        by_position = {pos: result for (pos, _), result in zip(self.run, results)}
+        for pos, (source, _) in self.skipped.items():
+            by_position[pos] = ConnectorResult(source=source, status="skipped")
+        return [by_position[pos] for pos in sorted(by_position)]
+
+
+class ConnectorPlanner:
+    """Route queries to applicable connectors using per-source history."""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_sources: int = 0,
+        min_calls: int = 20,
+        min_hit_rate: float = 0.05,
+        explore_every: int = 20,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.enabled = enabled
+        self.max_sources = max_sources
+        self.min_calls = min_calls
+        self.min_hit_rate = min_hit_rate
+        self.explore_every = explore_every
+        self.smoothing = smoothing
+        self._history: Dict[str, SourceHistory] = {}
+
+    @classmethod
+    def from_env(cls) -> "ConnectorPlanner":
+        """Build a planner from ``PLANNER`` and ``PLANNER_MAX_SOURCES``.
+
+        ``PLANNER=off`` sends every query to every connector.
+        """
+
+        return cls(
+            enabled=os.getenv("PLANNER", "on") != "off",
+            max_sources=int(os.getenv("PLANNER_MAX_SOURCES", "0")),
+        )
+
+    def history(self, source: str) -> SourceHistory:
+        history = self._history.get(source)
+        if history is None:
+            history = self._history[source] = SourceHistory()
+        return history
+
+    def score(self, source: str, kind: str) -> float:
+        """Expected documents per second, discounted by rate-limit headroom."""
+
+        history = self.history(source)
+        latency = history.latency_ms or DEFAULT_LATENCY_MS
+        headroom = limiter_for(source).headroom()
+        return history.hit_rate(kind) * (0.25 + 0.75 * headroom) / (latency + 50)
+
+    def _pruned(self, source: str, kind: str) -> bool:
+        history = self.history(source)
+        if history.calls.get(kind, 0) < self.min_calls:
+            return False
+        if history.hit_rate(kind) >= self.min_hit_rate:
+            return False
+        skips = history.pruned[kind] = history.pruned.get(kind, 0) + 1
+        return skips % self.explore_every != 0
+
+    def plan(
+        self, query: str, type: Optional[str], connectors: Iterable[Connector]
+    ) -> Plan:
+        kinds = classify(query, type)
+        indexed = list(enumerate(connectors))
+        if not self.enabled:
+            return Plan(kinds, indexed)
+        plan = Plan(kinds, [])
+        candidates = []
+        for pos, connector in indexed:
+            source = connector.source
+            accepted = connector.kinds
+            if accepted is not None and accepted.isdisjoint(kinds):
+                plan.skipped[pos] = (source, "not_applicable")
+            elif self._pruned(source, kinds[0]):
+                plan.skipped[pos] = (source, "low_hit_rate")
+            else:
+                candidates.append((-self.score(source, kinds[0]), pos, connector))
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        for rank, (_, pos, connector) in enumerate(candidates):
+            if self.max_sources and rank >= self.max_sources:
+                plan.skipped[pos] = (connector.source, "budget")
+            else:
+                plan.run.append((pos, connector))
+        return plan
+
+    def record(self, kind: str, result: ConnectorResult) -> None:
+        """Learn from the outcome of one planned connector call."""
+
+        if result.status == "skipped":
+            return
+        history = self.history(result.source)
+        latency = float(result.latency_ms)
+        if history.latency_ms is None:
+            history.latency_ms = latency
+        else:
+            history.latency_ms += self.smoothing * (latency - history.latency_ms)
+        history.calls[kind] = history.calls.get(kind, 0) + 1
+        if result.status == "ok" and result.docs:
+            history.hits[kind] = history.hits.get(kind, 0) + 1
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            source: {
+                "latency_ms": round(h.latency_ms or 0.0, 1),
+                "calls": dict(h.calls),
+                "hits": dict(h.hits),
+            }
+            for source, h in self._history.items()
+        }
+
+    def reset(self) -> None:
+        self._history.clear()
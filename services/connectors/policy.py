@@ -0,0 +1,112 @@
+"""Per-source operating policy for connectors.
+
+Values mirror ``docs/source_registry.md``: every source keeps fetched data
+for at most its registry retention TTL. ``fresh_for`` is how long a cached
+response is served without asking the upstream again; after that it is
+revalidated with a conditional request until the retention TTL expires.
+
+``concurrency`` bounds simultaneous requests to a source and ``rate`` is its
+published request budget as ``(requests, per_seconds)``. Sources the
+registry lists as "polite usage" are kept to one request at a time.
+``hedge_after`` optionally duplicates a request that is still outstanding
+after that many seconds; it is off unless a source opts in.
+``redirect_hosts`` are the hosts a source may redirect to besides its own.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from services.fetcher.cache import DAY, CachePolicy
+
+HOUR = 60 * 60
+
+# rdap.org redirects every lookup to the registry named for the TLD in the
+# IANA RDAP bootstrap (https://data.iana.org/rdap/dns.json); these are the
+# registries of the most common TLDs. Other TLDs fail as not allowlisted.
+RDAP_REGISTRIES = frozenset(
+    {
+        "rdap.verisign.com",  # com, net
+        "rdap.publicinterestregistry.org",  # org
+        "rdap.identitydigital.services",  # info, io and many gTLDs
+        "pubapi.registry.google",  # app, dev and other Google TLDs
+        "rdap.centralnic.com",  # xyz, online and other CentralNic TLDs
+        "rdap.nominet.uk",  # uk
+    }
+)
+
+
+@dataclass(frozen=True)
+class SourcePolicy:
+    """Operating limits for one upstream source."""
+
+    source: str
+    registry: str
+    host: Optional[str] = None
+    fresh_for: float = DAY
+    retention_days: int = 180
+    concurrency: int = 4
+    rate: Optional[Tuple[int, float]] = None
+    hedge_after: Optional[float] = None
+    redirect_hosts: FrozenSet[str] = frozenset()
+
+    @property
+    def cache(self) -> CachePolicy:
+        return CachePolicy(
+            fresh_for=self.fresh_for, retention=self.retention_days * DAY
+        )
+
+
+POLICIES: Dict[str, SourcePolicy] = {
+    p.source: p
+    for p in [
+        SourcePolicy(
+            "wikipedia",
+            "Wikipedia API",
+            "en.wikipedia.org",
+            fresh_for=DAY,
+            concurrency=1,
+        ),
+        SourcePolicy(
+            "google_news", "Google News RSS", "news.google.com", fresh_for=HOUR / 4
+        ),
+        SourcePolicy(
+            "rdap",
+            "RDAP",
+            "rdap.org",
+            fresh_for=DAY,
+            redirect_hosts=RDAP_REGISTRIES,
+        ),
+        SourcePolicy(
+            "github_users",
+            "GitHub Users API",
+            "api.github.com",
+            fresh_for=HOUR,
+            rate=(60, 60.0),
+        ),
+        # SEC's published fair access limit is 10 requests per second
+        SourcePolicy("sec_edgar", "SEC EDGAR", rate=(10, 1.0)),
+        SourcePolicy("companies_house", "Companies House", rate=(600, 300.0)),
+        SourcePolicy("open_corporates", "OpenCorporates", rate=(1000, DAY)),
+        SourcePolicy("gdelt", "GDELT", fresh_for=HOUR),
+        SourcePolicy("crt_sh", "crt.sh", concurrency=2),
+        SourcePolicy("wayback", "Wayback Machine", concurrency=1),
+        SourcePolicy("openalex", "OpenAlex", rate=(100_000, DAY)),
+        SourcePolicy("wikidata", "Wikidata", "www.wikidata.org", concurrency=1),
+    ]
+}
+
+_BY_HOST = {p.host: p for p in POLICIES.values() if p.host}
+
+
+def policy_for(source: str) -> SourcePolicy:
+    """Return the policy for *source*, or permissive defaults if unlisted."""
+
+    return POLICIES.get(source) or SourcePolicy(source, registry="")
+
+
+def policy_for_host(host: str) -> Optional[SourcePolicy]:
+    """Return the policy of the source served from *host*, if any."""
+
+    return _BY_HOST.get(host)
@@ -0,0 +1,71 @@
+"""Coalescing of identical in-flight connector requests.
+
+When several callers ask the same source the same question at the same
+time only the first one (the leader) reaches the upstream; the others wait
+for and share its result. Nothing is cached once the call completes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Flight:
+    __slots__ = ("loop", "task", "waiters")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task) -> None:
+        self.loop = loop
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Share one in-flight call per key among concurrent callers."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of ``fn()``, sharing it with identical callers.
+
+        The call runs in its own task, so a cancelled caller never cancels
+        the work other callers are waiting for. Once every caller waiting
+        for it has been cancelled the call is cancelled too, so abandoned
+        work does not keep holding source limiter slots.
+        """
+
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        flight = self._calls.get(key)
+        if flight is not None and flight.loop is loop:
+            self.coalesced += 1
+        else:
+            flight = _Flight(loop, loop.create_task(fn()))
+            self._calls[key] = flight
+            task = flight.task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        current = self._calls.get(key)
+        if current is not None and current.task is task:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "leaders": self.calls - self.coalesced,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
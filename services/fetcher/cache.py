@@ -0,0 +1,373 @@
+"""Content-addressed on-disk cache for fetched responses.
+
+Bodies are stored once per SHA-256 under ``objects/`` while a small SQLite
+index maps canonical URLs to their current body, validators (``ETag`` and
+``Last-Modified``) and timestamps. Each source supplies a
+:class:`CachePolicy`: entries younger than ``fresh_for`` are served without
+contacting the upstream, older ones are revalidated with a conditional
+request, and anything older than the source's retention TTL is purged.
+The total size of cached bodies is kept under a byte budget by evicting the
+least recently used entries. The total is kept as a running count rather
+than summed per write, and cache hits only note their access time in
+memory; those are written in one batch before eviction picks a victim or
+once :data:`_ACCESS_BATCH` have accumulated. :meth:`ResponseCache.aopen`
+reads bodies in a worker thread so disk I/O stays off the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+_READ_SIZE = 64 * 1024
+DAY = 24 * 60 * 60
+# pending last-access updates written back in one transaction
+_ACCESS_BATCH = 256
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Freshness and retention limits for one source, in seconds."""
+
+    fresh_for: float
+    retention: float = 180 * DAY
+
+
+@dataclass
+class CacheEntry:
+    """Index row describing one cached URL."""
+
+    url: str
+    content_hash: str
+    content_type: str
+    etag: str
+    last_modified: str
+    stored_at: float
+    size: int
+
+    def is_fresh(self, policy: CachePolicy, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.stored_at < policy.fresh_for
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Validators for a conditional revalidation request."""
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def canonical_key(url: str) -> str:
+    """Return *url* with a lowercase host, sorted query and no fragment."""
+
+    parsed = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse(
+        (
+            parsed.scheme.lower(),
+            parsed.netloc.lower(),
+            parsed.path or "/",
+            "",
+            query,
+            "",
+        )
+    )
+
+
+class PendingWrite:
+    """Body being written to the cache while it streams from the network."""
+
+    def __init__(
+        self,
+        cache: "ResponseCache",
+        url: str,
+        content_type: str,
+        etag: str,
+        last_modified: str,
+    ) -> None:
+        self._cache = cache
+        self._url = url
+        self._content_type = content_type
+        self._etag = etag
+        self._last_modified = last_modified
+        fd, name = tempfile.mkstemp(dir=cache.root / "tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._path = Path(name)
+        self._size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._size += len(chunk)
+
+    def commit(self, content_hash: str) -> None:
+        """Move the body into place under *content_hash* and index it."""
+
+        self._file.close()
+        self._cache._index(
+            self._path,
+            CacheEntry(
+                url=self._url,
+                content_hash=content_hash,
+                content_type=self._content_type,
+                etag=self._etag,
+                last_modified=self._last_modified,
+                stored_at=time.time(),
+                size=self._size,
+            ),
+        )
+
+    def abort(self) -> None:
+        self._file.close()
+        self._path.unlink(missing_ok=True)
+
+
+class ResponseCache:
+    """On-disk response cache bounded by *max_bytes* of stored bodies."""
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        (self.root / "tmp").mkdir(exist_ok=True)
+        self._db = sqlite3.connect(
+            str(self.root / "index.sqlite3"), check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " url TEXT PRIMARY KEY, content_hash TEXT, content_type TEXT,"
+            " etag TEXT, last_modified TEXT, stored_at REAL, size INTEGER,"
+            " last_access REAL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_access ON entries (last_access)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_hash ON entries (content_hash)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._bytes = self._sum_bytes()
+        self._accessed: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """Return a cache rooted at ``FETCH_CACHE_DIR`` or ``None`` if unset."""
+
+        root = os.getenv("FETCH_CACHE_DIR")
+        if not root:
+            return None
+        max_bytes = int(os.getenv("FETCH_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        return cls(Path(root), max_bytes=max_bytes)
+
+    def _blob_path(self, content_hash: str) -> Path:
+        return self.root / "objects" / content_hash[:2] / content_hash
+
+    def lookup(self, url: str, policy: CachePolicy) -> Optional[CacheEntry]:
+        """Return the entry for *url*, purging it if past retention."""
+
+        key = canonical_key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, content_hash, content_type, etag, last_modified,"
+                " stored_at, size FROM entries WHERE url = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            entry = CacheEntry(*row)
+            expired = time.time() - entry.stored_at >= policy.retention
+            if expired or not self._blob_path(entry.content_hash).exists():
+                self._delete(key, entry.content_hash, entry.size)
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= _ACCESS_BATCH:
+                self._flush_access()
+                self._db.commit()
+            self.hits += 1
+            return entry
+
+    def read(self, entry: CacheEntry) -> Iterator[bytes]:
+        """Yield the cached body of *entry* in chunks."""
+
+        with open(self._blob_path(entry.content_hash), "rb") as fh:
+            while True:
+                chunk = fh.read(_READ_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def aopen(self, entry: CacheEntry) -> Optional[AsyncIterator[bytes]]:
+        """Open the body of *entry*, or return ``None`` if it is gone.
+
+        Eviction may remove a body between :meth:`lookup` and reading it;
+        callers treat that as a miss. Once open, the body stays readable.
+        Opening and each chunk read run in a worker thread.
+        """
+
+        path = self._blob_path(entry.content_hash)
+        try:
+            fh = await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return self._aiter(fh)
+
+    async def _aiter(self, fh: BinaryIO) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await asyncio.to_thread(fh.read, _READ_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            fh.close()
+
+    def begin(
+        self, url: str, content_type: str, etag: str = "", last_modified: str = ""
+    ) -> PendingWrite:
+        """Start caching a body for *url*; commit it once fully read."""
+
+        return PendingWrite(self, canonical_key(url), content_type, etag, last_modified)
+
+    def mark_revalidated(self, entry: CacheEntry) -> None:
+        """Record that the upstream confirmed *entry* is still current."""
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET stored_at = ? WHERE url = ?",
+                (time.time(), entry.url),
+            )
+            self._db.commit()
+            self.revalidated += 1
+
+    def _index(self, body: Path, entry: CacheEntry) -> None:
+        """Move *body* into place as the blob of *entry* and index it."""
+
+        blob = self._blob_path(entry.content_hash)
+        # placed under the lock, so a concurrent drop of the same content
+        # hash cannot unlink the blob before its row exists
+        with self._lock:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(body, blob)
+            previous = self._db.execute(
+                "SELECT content_hash, size FROM entries WHERE url = ?", (entry.url,)
+            ).fetchone()
+            if not self._in_use(entry.content_hash):
+                self._bytes += entry.size
+            self._accessed.pop(entry.url, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.url,
+                    entry.content_hash,
+                    entry.content_type,
+                    entry.etag,
+                    entry.last_modified,
+                    entry.stored_at,
+                    entry.size,
+                    time.time(),
+                ),
+            )
+            if previous and previous[0] != entry.content_hash:
+                self._drop_blob_if_unused(*previous)
+            self._evict()
+            self._db.commit()
+
+    def _flush_access(self) -> None:
+        """Write pending access times; the caller commits."""
+
+        if self._accessed:
+            self._db.executemany(
+                "UPDATE entries SET last_access = ? WHERE url = ?",
+                [(at, url) for url, at in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def _delete(self, key: str, content_hash: str, size: int) -> None:
+        self._db.execute("DELETE FROM entries WHERE url = ?", (key,))
+        self._accessed.pop(key, None)
+        self._drop_blob_if_unused(content_hash, size)
+
+    def _in_use(self, content_hash: str) -> bool:
+        row = self._db.execute(
+            "SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        return row is not None
+
+    def _drop_blob_if_unused(self, content_hash: str, size: int) -> None:
+        if not self._in_use(content_hash):
+            self._blob_path(content_hash).unlink(missing_ok=True)
+            self._bytes -= size
+
+    def _sum_bytes(self) -> int:
+        row = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM"
+            " (SELECT DISTINCT content_hash, size FROM entries)"
+        ).fetchone()
+        return int(row[0])
+
+    def total_bytes(self) -> int:
+        """Size of the stored bodies, each shared body counted once."""
+
+        return self._bytes
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        self._flush_access()
+        while self._bytes > self.max_bytes:
+            row = self._db.execute(
+                "SELECT url, content_hash, size FROM entries"
+                " ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+            self._delete(*row)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._bytes,
+            }
+
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOADED = False
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache configured by ``FETCH_CACHE_DIR``."""
+
+    global _CACHE, _CACHE_LOADED
+    if not _CACHE_LOADED:
+        _CACHE = ResponseCache.from_env()
+        _CACHE_LOADED = True
+    return _CACHE
@@ -4,28 +4,74 @@ This module exposes :func:`fetch` which retrieves remote resources while
 enforcing a strict egress allowlist, DNS pinning and basic response
 validation. It purposely blocks requests to private or link-local
 addresses to reduce the risk of Server Side Request Forgery (SSRF).
+
+:func:`afetch` applies the same policy natively on the event loop and
+reuses keep-alive connections from :mod:`services.fetcher.pool`;
+:func:`astream` exposes the body chunk by chunk with an incremental size
+limit and content hash. Both paths
+cache validated DNS answers in :data:`RESOLVER` and connect to the cached
+address, so the address that was checked is the one that is contacted.
+Redirects are followed up to :data:`MAX_REDIRECTS` hops, and every hop is
+checked against the allowlist and pinned like the original URL.
 """
 
 from __future__ import annotations
 
+import asyncio
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from functools import partial
+import hashlib
+import http.client
 import ipaddress
 import socket
-from typing import Iterable, Optional
-from urllib.parse import urlparse
-from urllib.request import Request, urlopen
+import ssl
+from typing import AsyncIterator, Callable, Iterable, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import ParseResult, urljoin, urlparse
+from urllib.request import (
+    HTTPHandler,
+    HTTPRedirectHandler,
+    HTTPSHandler,
+    Request,
+    build_opener,
+)
+
+from .cache import CachePolicy, PendingWrite, ResponseCache
+from . import replay
+from .pool import ConnectionPool, get_pool
+from .resolver import ResolverCache
 
 
 DEFAULT_TIMEOUT = 5
 MAX_BYTES = 1_000_000  # 1 MiB
-ALLOWED_MIME_PREFIXES = ("text/", "application/json")
+# RDAP servers answer with application/rdap+json (RFC 9083)
+ALLOWED_MIME_PREFIXES = ("text/", "application/json", "application/rdap+json")
+USER_AGENT = "osint-pro-fetcher"
+MAX_REDIRECTS = 5
+_REDIRECT_STATUSES = {301, 302, 303, 307, 308}
 
+RESOLVER = ResolverCache.from_env()
 
-def _resolve_host(host: str) -> Iterable[str]:
-    """Resolve *host* and ensure no address is private or local."""
 
-    infos = socket.getaddrinfo(host, None)
-    addresses = {info[4][0] for info in infos}
+class HTTPStatusError(ValueError):
+    """Raised by the async fetch path for non-2xx upstream responses."""
+
+    def __init__(self, status: int) -> None:
+        super().__init__(f"upstream returned HTTP {status}")
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        """Server errors and rate limiting may succeed on a later attempt."""
+
+        return self.status >= 500 or self.status == 429
+
+
+def _check_addresses(infos: Iterable[tuple]) -> Tuple[str, ...]:
+    """Return addresses from *infos*, refusing any private or local one."""
+
+    addresses = tuple(dict.fromkeys(info[4][0] for info in infos))
     for addr in addresses:
         ip = ipaddress.ip_address(addr)
         if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
@@ -33,6 +79,130 @@ def _resolve_host(host: str) -> Iterable[str]:
     return addresses
 
 
+def _resolve_host(host: str) -> Tuple[str, ...]:
+    """Resolve *host* and ensure no address is private or local."""
+
+    addresses = RESOLVER.get(host)
+    if addresses is None:
+        addresses = _check_addresses(socket.getaddrinfo(host, None))
+        RESOLVER.put(host, addresses)
+    return addresses
+
+
+async def _aresolve_host(host: str) -> Tuple[str, ...]:
+    """Async variant of :func:`_resolve_host` using the loop's resolver."""
+
+    addresses = RESOLVER.get(host)
+    if addresses is None:
+        loop = asyncio.get_running_loop()
+        addresses = _check_addresses(await loop.getaddrinfo(host, None))
+        RESOLVER.put(host, addresses)
+    return addresses
+
+
+def resolver_stats() -> dict:
+    """Return hit/miss counters of the DNS cache."""
+
+    return RESOLVER.stats()
+
+
+def _check_url(url: str, allowed_hosts: Optional[Iterable[str]]) -> ParseResult:
+    """Validate scheme and allowlist for *url* and return the parsed URL."""
+
+    parsed = urlparse(url)
+    if parsed.scheme not in {"http", "https"}:
+        raise ValueError("unsupported URL scheme")
+
+    if allowed_hosts is not None and parsed.hostname not in allowed_hosts:
+        raise ValueError("host not allowlisted")
+    return parsed
+
+
+def _redirect(
+    url: str, location: str, allowed_hosts: Optional[Iterable[str]], hops: int
+) -> str:
+    """The absolute target of a redirect from *url*, checked like *url*."""
+
+    if hops >= MAX_REDIRECTS:
+        raise ValueError("too many redirects")
+    target = urljoin(url, location)
+    _check_url(target, allowed_hosts)
+    return target
+
+
+def _check_content_type(ctype: str) -> None:
+    if not any(ctype.startswith(prefix) for prefix in ALLOWED_MIME_PREFIXES):
+        raise ValueError("unsupported content type")
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection that dials a pre-validated address."""
+
+    def __init__(self, *args, address: str, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._address = address
+
+    def connect(self) -> None:
+        self.sock = socket.create_connection(
+            (self._address, self.port), self.timeout, self.source_address
+        )
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection that dials a pre-validated address.
+
+    The certificate is still verified against the requested hostname.
+    """
+
+    def __init__(self, *args, address: str, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._address = address
+
+    def connect(self) -> None:
+        sock = socket.create_connection(
+            (self._address, self.port), self.timeout, self.source_address
+        )
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+class _PinnedHTTPHandler(HTTPHandler):
+    def __init__(self, address: str) -> None:
+        super().__init__()
+        self._address = address
+
+    def http_open(self, req):
+        return self.do_open(partial(_PinnedHTTPConnection, address=self._address), req)
+
+
+class _PinnedHTTPSHandler(HTTPSHandler):
+    def __init__(self, address: str) -> None:
+        super().__init__(context=ssl.create_default_context())
+        self._address = address
+
+    def https_open(self, req):
+        return self.do_open(
+            partial(_PinnedHTTPSConnection, address=self._address),
+            req,
+            context=self._context,
+        )
+
+
+class _NoRedirectHandler(HTTPRedirectHandler):
+    """Leave redirects to :func:`fetch`, which checks and pins every hop."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _open(req: Request, address: str):
+    """Open *req* connecting to the validated *address*."""
+
+    opener = build_opener(
+        _PinnedHTTPHandler(address), _PinnedHTTPSHandler(address), _NoRedirectHandler
+    )
+    return opener.open(req, timeout=DEFAULT_TIMEOUT)
+
+
 @dataclass
 class FetchResult:
     """Container for fetched content."""
@@ -40,6 +210,7 @@ class FetchResult:
     url: str
     content: bytes
     content_type: str
+    sha256: str = ""
 
 
 def fetch(url: str, *, allowed_hosts: Optional[Iterable[str]] = None) -> FetchResult:
@@ -56,34 +227,219 @@ def fetch(url: str, *, allowed_hosts: Optional[Iterable[str]] = None) -> FetchRe
     Raises
     ------
     ValueError
-        If the host is not allowlisted or resolves to a private address, or if
-        the response exceeds limits.
+        If the host (or a redirect target) is not allowlisted or resolves to
+        a private address, or if the response exceeds limits.
     """
 
-    parsed = urlparse(url)
-    if parsed.scheme not in {"http", "https"}:
-        raise ValueError("unsupported URL scheme")
+    target = url
+    hops = 0
+    while True:
+        parsed = _check_url(target, allowed_hosts)
+        addresses = _resolve_host(parsed.hostname or "")
+        req = Request(target, headers={"User-Agent": USER_AGENT})
+        try:
+            with _open(req, addresses[0]) as resp:
+                ctype = resp.headers.get("Content-Type", "")
+                _check_content_type(ctype)
+                content = resp.read(MAX_BYTES + 1)
+                if len(content) > MAX_BYTES:
+                    raise ValueError("response too large")
+            break
+        except HTTPError as exc:
+            location = exc.headers.get("Location")
+            exc.close()
+            if exc.code not in _REDIRECT_STATUSES or not location:
+                raise
+            target = _redirect(target, location, allowed_hosts, hops)
+            hops += 1
+
+    return FetchResult(
+        url=url,
+        content=content,
+        content_type=ctype,
+        sha256=hashlib.sha256(content).hexdigest(),
+    )
 
-    if allowed_hosts is not None and parsed.hostname not in allowed_hosts:
-        raise ValueError("host not allowlisted")
 
-    _resolve_host(parsed.hostname or "")
+class FetchStream:
+    """Incrementally readable response body.
+
+    Iterating yields raw chunks while enforcing the byte limit and feeding a
+    SHA-256 digest, so callers never need to hold or re-hash the full body.
+    When a cache sink is attached the body is written through to the cache,
+    from a worker thread, and committed only once it has been read
+    completely.
+    """
 
-    req = Request(url, headers={"User-Agent": "osint-pro-fetcher"})
-    with urlopen(req, timeout=DEFAULT_TIMEOUT) as resp:
-        ctype = resp.headers.get("Content-Type", "")
-        if not any(ctype.startswith(prefix) for prefix in ALLOWED_MIME_PREFIXES):
-            raise ValueError("unsupported content type")
-        content = resp.read(MAX_BYTES + 1)
-        if len(content) > MAX_BYTES:
-            raise ValueError("response too large")
+    def __init__(
+        self,
+        url: str,
+        content_type: str,
+        chunks: AsyncIterator[bytes],
+        limit: int,
+        *,
+        sink: Optional[Callable[[], PendingWrite]] = None,
+        cached: bool = False,
+    ):
+        self.url = url
+        self.content_type = content_type
+        self.cached = cached
+        self.size = 0
+        self._chunks = chunks
+        self._limit = limit
+        self._sink = sink
+        self._digest = hashlib.sha256()
 
-    return FetchResult(url=url, content=content, content_type=ctype)
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        pending = await asyncio.to_thread(self._sink) if self._sink else None
+        try:
+            async for chunk in self._chunks:
+                self.size += len(chunk)
+                if self.size > self._limit:
+                    raise ValueError("response too large")
+                self._digest.update(chunk)
+                if pending:
+                    await asyncio.to_thread(pending.write, chunk)
+                yield chunk
+            if pending:
+                await asyncio.to_thread(pending.commit, self.sha256)
+                pending = None
+        finally:
+            if pending:
+                pending.abort()
 
-"""Sandboxed HTTP fetcher stub."""
-from typing import Any
+    @property
+    def sha256(self) -> str:
+        """Hex digest of the bytes consumed so far."""
+
+        return self._digest.hexdigest()
+
+
+@asynccontextmanager
+async def astream(
+    url: str,
+    *,
+    allowed_hosts: Optional[Iterable[str]] = None,
+    pool: Optional[ConnectionPool] = None,
+    max_bytes: int = MAX_BYTES,
+    cache: Optional[ResponseCache] = None,
+    cache_policy: Optional[CachePolicy] = None,
+) -> AsyncIterator[FetchStream]:
+    """Open *url* and yield a :class:`FetchStream` over its body.
+
+    The same allowlist, private address, MIME type and size checks as
+    :func:`fetch` apply; a declared ``Content-Length`` above *max_bytes* is
+    rejected before any body bytes are read. Redirects are followed up to
+    :data:`MAX_REDIRECTS` hops; each target must pass the allowlist and is
+    resolved and pinned before it is contacted. The response is cached
+    under the original *url*.
+
+    Parameters
+    ----------
+    url:
+        The absolute URL to retrieve.
+    allowed_hosts:
+        Iterable of permitted hostnames.
+    pool:
+        Connection pool to use; defaults to the transport installed in
+        :mod:`services.fetcher.replay`, if any, and otherwise to the pool
+        bound to the running event loop.
+    max_bytes:
+        Maximum body size.
+    cache, cache_policy:
+        Optional response cache and the source's freshness/retention
+        policy. Fresh entries are served from disk, stale ones are
+        revalidated with ``If-None-Match``/``If-Modified-Since``. A body
+        evicted after the lookup counts as a miss and is fetched again.
+
+    Raises
+    ------
+    ValueError
+        If the request violates policy or the upstream answers with a
+        non-2xx status.
+    """
+
+    parsed = _check_url(url, allowed_hosts)
+    use_cache = cache is not None and cache_policy is not None
+    entry = cache.lookup(url, cache_policy) if use_cache else None
+    if entry and entry.is_fresh(cache_policy):
+        chunks = await cache.aopen(entry)
+        if chunks is not None:
+            yield FetchStream(url, entry.content_type, chunks, max_bytes, cached=True)
+            return
+        entry = None  # evicted since the lookup: fetch it again
+
+    pool = pool or replay.active() or get_pool()
+    headers = {"User-Agent": USER_AGENT}
+    if entry:
+        headers.update(entry.conditional_headers())
+    target = url
+    hops = 0
+    while True:
+        address = None
+        if not pool.offline:
+            address = (await _aresolve_host(parsed.hostname or ""))[0]
+        async with pool.request(parsed, headers, address=address) as resp:
+            location = resp.headers.get("Location")
+            if resp.status in _REDIRECT_STATUSES and location:
+                target = _redirect(target, location, allowed_hosts, hops)
+                parsed = urlparse(target)
+                hops += 1
+                continue
+            if entry and resp.status == 304:
+                chunks = await cache.aopen(entry)
+                if chunks is None:
+                    # evicted since the lookup: ask again unconditionally
+                    entry = None
+                    headers = {"User-Agent": USER_AGENT}
+                    continue
+                cache.mark_revalidated(entry)
+                yield FetchStream(
+                    url, entry.content_type, chunks, max_bytes, cached=True
+                )
+                return
+            if not 200 <= resp.status < 300:
+                raise HTTPStatusError(resp.status)
+            ctype = resp.headers.get("Content-Type", "")
+            _check_content_type(ctype)
+            if int(resp.headers.get("Content-Length") or 0) > max_bytes:
+                raise ValueError("response too large")
+            sink = None
+            no_store = "no-store" in resp.headers.get("Cache-Control", "")
+            if use_cache and not no_store:
+                sink = partial(
+                    cache.begin,
+                    url,
+                    ctype,
+                    resp.headers.get("ETag", ""),
+                    resp.headers.get("Last-Modified", ""),
+                )
+            yield FetchStream(url, ctype, resp.iter_chunks(), max_bytes, sink=sink)
+            return
+
+
+async def afetch(
+    url: str,
+    *,
+    allowed_hosts: Optional[Iterable[str]] = None,
+    pool: Optional[ConnectionPool] = None,
+    cache: Optional[ResponseCache] = None,
+    cache_policy: Optional[CachePolicy] = None,
+) -> FetchResult:
+    """Asynchronously fetch *url* over a pooled keep-alive connection.
+
+    This is :func:`astream` collected into a :class:`FetchResult`.
+    """
 
+    async with astream(
+        url,
+        allowed_hosts=allowed_hosts,
+        pool=pool,
+        cache=cache,
+        cache_policy=cache_policy,
+    ) as stream:
+        content = b"".join([chunk async for chunk in stream])
 
-def fetch(url: str) -> Any:
-    """Fetch content from URL (stub)."""
-    return {"url": url, "content": ""}
+    return FetchResult(
+        url=url, content=content, content_type=stream.content_type, sha256=stream.sha256
+    )
@@ -0,0 +1,373 @@
+"""Keep-alive HTTP/1.1 connection pool for the async fetch path.
+
+The pool keeps idle connections per ``(scheme, host, port)`` so that
+repeated connector calls against the same upstream reuse an established
+TCP/TLS session instead of paying a fresh handshake on every request. It
+implements only the small subset of HTTP/1.1 the fetcher needs: ``GET``
+requests, ``Content-Length`` and chunked bodies, and ``Connection: close``.
+Policy checks (allowlist, private address blocking, MIME and size limits)
+remain the responsibility of :mod:`services.fetcher.fetcher`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from email.parser import Parser
+from http.client import HTTPMessage
+import os
+import re
+import ssl
+import time
+from typing import AsyncIterator, Awaitable, Deque, Dict, Mapping, Optional, Tuple
+from urllib.parse import ParseResult
+import weakref
+
+
+_NO_BODY_STATUSES = {204, 304}
+_CHUNK_SIZE = 64 * 1024
+# whitespace and control characters would split or end the request line or
+# a header; http.client refuses them in _validate_path/_validate_host too
+_UNSAFE_CHARS = re.compile(r"[\x00-\x20\x7f]")
+_UNSAFE_VALUE_CHARS = re.compile(r"[\x00-\x08\x0a-\x1f\x7f]")
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """Sizing knobs for :class:`ConnectionPool`."""
+
+    max_per_host: int = 8
+    idle_timeout: float = 30.0
+    timeout: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        """Build a config from ``FETCHER_POOL_*`` environment variables."""
+
+        return cls(
+            max_per_host=int(os.getenv("FETCHER_POOL_SIZE", cls.max_per_host)),
+            idle_timeout=float(
+                os.getenv("FETCHER_POOL_IDLE_TIMEOUT", cls.idle_timeout)
+            ),
+            timeout=float(os.getenv("FETCHER_POOL_TIMEOUT", cls.timeout)),
+        )
+
+
+HostKey = Tuple[str, str, int]
+
+
+def _target(parsed: ParseResult) -> str:
+    target = parsed.path or "/"
+    return f"{target}?{parsed.query}" if parsed.query else target
+
+
+def _validate(parsed: ParseResult, headers: Mapping[str, str]) -> None:
+    """Refuse input that would inject into the request line or headers."""
+
+    if _UNSAFE_CHARS.search(_target(parsed)):
+        raise ValueError("control character or space in URL path")
+    if _UNSAFE_CHARS.search(parsed.hostname or ""):
+        raise ValueError("control character or space in URL host")
+    for name, value in headers.items():
+        if _UNSAFE_CHARS.search(name) or _UNSAFE_VALUE_CHARS.search(value):
+            raise ValueError(f"control character in header {name!r}")
+
+
+class _Connection:
+    """A single pooled stream pair."""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.fresh = True
+
+    def usable(self, idle_timeout: float) -> bool:
+        if self.writer.is_closing() or self.reader.at_eof():
+            return False
+        return time.monotonic() - self.last_used < idle_timeout
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class Response:
+    """Response headers plus an incrementally readable body.
+
+    Instances are produced by :meth:`ConnectionPool.request`; the connection
+    is handed back to the pool only once the body has been fully consumed.
+    """
+
+    def __init__(
+        self,
+        conn: _Connection,
+        status: int,
+        headers: HTTPMessage,
+        has_body: bool,
+        timeout: float,
+    ) -> None:
+        self._conn = conn
+        self._timeout = timeout
+        self.status = status
+        self.headers = headers
+        self._remaining: Optional[int] = None
+        self._chunked = False
+        self._done = not has_body
+        if has_body:
+            encoding = headers.get("Transfer-Encoding", "").lower()
+            length = headers.get("Content-Length")
+            if "chunked" in encoding:
+                self._chunked = True
+            elif length is not None:
+                self._remaining = int(length)
+                self._done = self._remaining == 0
+        self.keep_alive = (
+            headers.get("Connection", "").lower() != "close"
+            and (self._chunked or self._remaining is not None or self._done)
+        )
+
+    @property
+    def complete(self) -> bool:
+        return self._done
+
+    async def _io(self, awaitable: Awaitable[bytes]) -> bytes:
+        return await asyncio.wait_for(awaitable, self._timeout)
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Yield body chunks as they arrive from the socket."""
+
+        reader = self._conn.reader
+        while not self._done:
+            if self._chunked:
+                size_line = await self._io(reader.readline())
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # consume optional trailers up to the terminating blank line
+                    while (await self._io(reader.readline())) not in (
+                        b"\r\n",
+                        b"\n",
+                        b"",
+                    ):
+                        pass
+                    self._done = True
+                    break
+                chunk = await self._io(reader.readexactly(size))
+                await self._io(reader.readexactly(2))
+                yield chunk
+            elif self._remaining is not None:
+                chunk = await self._io(
+                    reader.read(min(_CHUNK_SIZE, self._remaining))
+                )
+                if not chunk:
+                    raise ConnectionError("connection closed mid-body")
+                self._remaining -= len(chunk)
+                self._done = self._remaining == 0
+                yield chunk
+            else:
+                chunk = await self._io(reader.read(_CHUNK_SIZE))
+                if not chunk:
+                    self._done = True
+                    break
+                yield chunk
+
+    async def read(self, limit: int) -> bytes:
+        """Read the whole body, raising ``ValueError`` beyond *limit* bytes."""
+
+        if self._remaining is not None and self._remaining > limit:
+            raise ValueError("response too large")
+        parts = []
+        size = 0
+        async for chunk in self.iter_chunks():
+            size += len(chunk)
+            if size > limit:
+                raise ValueError("response too large")
+            parts.append(chunk)
+        return b"".join(parts)
+
+
+class ConnectionPool:
+    """Per-host pool of keep-alive HTTP/1.1 connections."""
+
+    offline = False
+
+    def __init__(self, config: Optional[PoolConfig] = None) -> None:
+        self.config = config or PoolConfig.from_env()
+        self._idle: Dict[HostKey, Deque[_Connection]] = {}
+        self._slots: Dict[HostKey, asyncio.Semaphore] = {}
+        self._ssl = ssl.create_default_context()
+        self.opened = 0
+        self.reused = 0
+
+    def _slot(self, key: HostKey) -> asyncio.Semaphore:
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(self.config.max_per_host)
+        return self._slots[key]
+
+    async def _connect(self, key: HostKey, address: Optional[str]) -> _Connection:
+        scheme, host, port = key
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            if conn.usable(self.config.idle_timeout):
+                conn.fresh = False
+                self.reused += 1
+                return conn
+            conn.close()
+        reader, writer = await asyncio.open_connection(
+            address or host,
+            port,
+            ssl=self._ssl if scheme == "https" else None,
+            server_hostname=host if scheme == "https" else None,
+        )
+        self.opened += 1
+        return _Connection(reader, writer)
+
+    def _release(self, key: HostKey, conn: _Connection, response: Response) -> None:
+        if response.complete and response.keep_alive and not conn.writer.is_closing():
+            conn.last_used = time.monotonic()
+            self._idle.setdefault(key, deque()).append(conn)
+        else:
+            conn.close()
+
+    def request(
+        self,
+        parsed: ParseResult,
+        headers: Optional[Mapping[str, str]] = None,
+        *,
+        address: Optional[str] = None,
+    ) -> "_RequestContext":
+        """Issue ``GET`` for *parsed*; use as ``async with pool.request(...)``.
+
+        When *address* is given new connections dial it directly instead of
+        resolving the hostname again; TLS still verifies the hostname.
+        Raises ``ValueError`` if the target or a header carries control
+        characters.
+        """
+
+        headers = dict(headers or {})
+        _validate(parsed, headers)
+        return _RequestContext(self, parsed, headers, address)
+
+    async def _send(
+        self,
+        key: HostKey,
+        parsed: ParseResult,
+        headers: Dict[str, str],
+        address: Optional[str],
+    ) -> Tuple[_Connection, Response]:
+        while True:
+            conn = await self._connect(key, address)
+            try:
+                return conn, await self._exchange(conn, key, parsed, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.close()
+                # an idle connection may have been dropped by the server;
+                # retry on a fresh one, but never retry a fresh connection
+                if conn.fresh:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+
+    async def _exchange(
+        self,
+        conn: _Connection,
+        key: HostKey,
+        parsed: ParseResult,
+        headers: Dict[str, str],
+    ) -> Response:
+        scheme, host, port = key
+        default_port = 443 if scheme == "https" else 80
+        lines = [
+            f"GET {_target(parsed)} HTTP/1.1",
+            f"Host: {host}" if port == default_port else f"Host: {host}:{port}",
+            "Accept-Encoding: identity",
+            "Connection: keep-alive",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        conn.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await conn.writer.drain()
+
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed before response")
+        parts = status_line.decode("latin-1").split(None, 2)
+        status = int(parts[1])
+        header_lines = []
+        while True:
+            line = await conn.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            header_lines.append(line.decode("latin-1"))
+        message = Parser(_class=HTTPMessage).parsestr("".join(header_lines))
+        has_body = status >= 200 and status not in _NO_BODY_STATUSES
+        return Response(conn, status, message, has_body, self.config.timeout)
+
+    async def close(self) -> None:
+        """Close every idle connection."""
+
+        for idle in self._idle.values():
+            while idle:
+                idle.pop().close()
+        self._idle.clear()
+
+
+class _RequestContext:
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        parsed: ParseResult,
+        headers: Dict[str, str],
+        address: Optional[str],
+    ) -> None:
+        self._pool = pool
+        self._parsed = parsed
+        self._headers = headers
+        self._address = address
+        scheme = parsed.scheme
+        port = parsed.port or (443 if scheme == "https" else 80)
+        self._key: HostKey = (scheme, parsed.hostname or "", port)
+        self._conn: Optional[_Connection] = None
+        self._response: Optional[Response] = None
+
+    async def __aenter__(self) -> Response:
+        slot = self._pool._slot(self._key)
+        await slot.acquire()
+        try:
+            self._conn, self._response = await asyncio.wait_for(
+                self._pool._send(
+                    self._key, self._parsed, self._headers, self._address
+                ),
+                self._pool.config.timeout,
+            )
+        except BaseException:
+            slot.release()
+            raise
+        return self._response
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None and self._conn and self._response:
+                self._pool._release(self._key, self._conn, self._response)
+            elif self._conn:
+                self._conn.close()
+        finally:
+            self._pool._slot(self._key).release()
+
+
+_POOLS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ConnectionPool]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_pool() -> ConnectionPool:
+    """Return the connection pool bound to the running event loop."""
+
+    loop = asyncio.get_running_loop()
+    pool = _POOLS.get(loop)
+    if pool is None:
+        pool = _POOLS[loop] = ConnectionPool()
+    return pool
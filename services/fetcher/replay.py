@@ -0,0 +1,314 @@
+"""Record and replay upstream responses for offline runs.
+
+:class:`RecordingTransport` wraps the live connection pool and writes every
+successfully read response, and every redirect, to a fixture directory,
+one JSON file per canonical URL. :class:`ReplayTransport` serves those fixtures back without
+touching the network, with configurable latency, jitter and error rate, so
+connector and fetcher changes can be measured reproducibly.
+
+Both transports expose the same ``request(parsed, headers, *, address=None)``
+interface as :class:`~services.fetcher.pool.ConnectionPool`. The fetcher
+picks one up from :func:`active`, which honours ``FETCH_RECORD_DIR`` and
+``FETCH_REPLAY_DIR`` unless a transport was installed explicitly.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import hashlib
+from http.client import HTTPMessage
+import json
+import os
+from pathlib import Path
+import random
+from typing import AsyncIterator, Dict, Mapping, Optional, Union
+from urllib.parse import ParseResult, urlunparse
+
+from .cache import canonical_key
+from .pool import ConnectionPool, get_pool
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def fixture_path(root: Path, url: str) -> Path:
+    """Return the fixture file for *url* under *root*."""
+
+    digest = hashlib.sha256(canonical_key(url).encode()).hexdigest()
+    return Path(root) / f"{digest}.json"
+
+
+def _url(parsed: ParseResult) -> str:
+    return urlunparse(parsed)
+
+
+def _message(headers: Mapping[str, str]) -> HTTPMessage:
+    message = HTTPMessage()
+    for name, value in headers.items():
+        message[name] = value
+    return message
+
+
+@dataclass
+class Fixture:
+    """One recorded response."""
+
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def to_json(self) -> dict:
+        data: dict = {"url": self.url, "status": self.status, "headers": self.headers}
+        try:
+            data["body"] = self.body.decode("utf-8")
+        except UnicodeDecodeError:
+            data["body_b64"] = base64.b64encode(self.body).decode("ascii")
+        return data
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Fixture":
+        if "body_b64" in data:
+            body = base64.b64decode(data["body_b64"])
+        else:
+            body = data.get("body", "").encode("utf-8")
+        return cls(data["url"], data["status"], dict(data["headers"]), body)
+
+    def save(self, root: Path) -> Path:
+        path = fixture_path(root, self.url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.to_json(), indent=1, sort_keys=True))
+        os.replace(tmp, path)
+        return path
+
+
+class ReplayResponse:
+    """In-memory response with the same reading API as the pooled one."""
+
+    def __init__(self, status: int, headers: HTTPMessage, body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self._body = body
+        self.complete = False
+        self.keep_alive = True
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        for start in range(0, len(self._body), _CHUNK_SIZE):
+            yield self._body[start : start + _CHUNK_SIZE]
+        self.complete = True
+
+    async def read(self, limit: int) -> bytes:
+        if len(self._body) > limit:
+            raise ValueError("response too large")
+        self.complete = True
+        return self._body
+
+
+@dataclass(frozen=True)
+class ReplayConfig:
+    """Simulated network conditions for :class:`ReplayTransport`.
+
+    ``latency`` and ``jitter`` are in seconds; each request waits
+    ``latency`` plus a uniform draw from ``[0, jitter]``. A fraction
+    ``error_rate`` of requests fail: with a connection error when
+    ``error_status`` is ``None``, otherwise with that HTTP status.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: Optional[int] = None
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ReplayConfig":
+        """Build a config from ``FETCH_REPLAY_*`` environment variables."""
+
+        status = os.getenv("FETCH_REPLAY_ERROR_STATUS")
+        seed = os.getenv("FETCH_REPLAY_SEED")
+        return cls(
+            latency=float(os.getenv("FETCH_REPLAY_LATENCY_MS", "0")) / 1000,
+            jitter=float(os.getenv("FETCH_REPLAY_JITTER_MS", "0")) / 1000,
+            error_rate=float(os.getenv("FETCH_REPLAY_ERROR_RATE", "0")),
+            error_status=int(status) if status else None,
+            seed=int(seed) if seed else None,
+        )
+
+
+class ReplayTransport:
+    """Serve recorded fixtures from *root* instead of the network.
+
+    URLs without a fixture answer ``404`` so a missing recording shows up
+    as a connector error rather than a hang.
+    """
+
+    # no sockets are opened, so the fetcher skips DNS resolution
+    offline = True
+
+    def __init__(self, root: Path, config: Optional[ReplayConfig] = None) -> None:
+        self.root = Path(root)
+        self.config = config or ReplayConfig()
+        self._random = random.Random(self.config.seed)
+        self._fixtures: Dict[Path, Optional[Fixture]] = {}
+        self.served = 0
+        self.missing = 0
+        self.errors = 0
+
+    def _load(self, url: str) -> Optional[Fixture]:
+        path = fixture_path(self.root, url)
+        if path not in self._fixtures:
+            self._fixtures[path] = (
+                Fixture.from_json(json.loads(path.read_text()))
+                if path.exists()
+                else None
+            )
+        return self._fixtures[path]
+
+    @asynccontextmanager
+    async def request(
+        self,
+        parsed: ParseResult,
+        headers: Optional[Mapping[str, str]] = None,
+        *,
+        address: Optional[str] = None,
+    ) -> AsyncIterator[ReplayResponse]:
+        config = self.config
+        delay = config.latency + self._random.uniform(0, config.jitter)
+        failed = self._random.random() < config.error_rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if failed:
+            self.errors += 1
+            if config.error_status is None:
+                raise ConnectionError("replayed connection failure")
+            yield ReplayResponse(config.error_status, _message({}), b"")
+            return
+        fixture = self._load(_url(parsed))
+        if fixture is None:
+            self.missing += 1
+            yield ReplayResponse(404, _message({}), b"")
+            return
+        self.served += 1
+        yield ReplayResponse(fixture.status, _message(fixture.headers), fixture.body)
+
+    def stats(self) -> Dict[str, int]:
+        return {"served": self.served, "missing": self.missing, "errors": self.errors}
+
+
+class _RecordedResponse:
+    """Proxy that copies a live response body as it is read."""
+
+    def __init__(self, response, url: str, root: Path, sink: list) -> None:
+        self._response = response
+        self._url = url
+        self._root = root
+        self._sink = sink
+        self.status = response.status
+        self.headers = response.headers
+
+    @property
+    def complete(self) -> bool:
+        return self._response.complete
+
+    @property
+    def keep_alive(self) -> bool:
+        return self._response.keep_alive
+
+    def _save(self, body: bytes) -> None:
+        headers = {
+            name: value
+            for name, value in self.headers.items()
+            if name.lower() not in {"transfer-encoding", "connection", "set-cookie"}
+        }
+        headers["Content-Length"] = str(len(body))
+        path = Fixture(self._url, self.status, headers, body).save(self._root)
+        self._sink.append(path)
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        parts = []
+        async for chunk in self._response.iter_chunks():
+            parts.append(chunk)
+            yield chunk
+        self._save(b"".join(parts))
+
+    async def read(self, limit: int) -> bytes:
+        body = await self._response.read(limit)
+        self._save(body)
+        return body
+
+
+class RecordingTransport:
+    """Pass requests to the live pool and record fully read responses."""
+
+    offline = False
+
+    def __init__(self, root: Path, pool: Optional[ConnectionPool] = None) -> None:
+        self.root = Path(root)
+        self._pool = pool
+        self.recorded: list = []
+
+    @asynccontextmanager
+    async def request(
+        self,
+        parsed: ParseResult,
+        headers: Optional[Mapping[str, str]] = None,
+        *,
+        address: Optional[str] = None,
+    ) -> AsyncIterator[_RecordedResponse]:
+        pool = self._pool or get_pool()
+        # conditional requests would record bodiless 304s
+        headers = {
+            name: value
+            for name, value in (headers or {}).items()
+            if name not in {"If-None-Match", "If-Modified-Since"}
+        }
+        async with pool.request(parsed, headers, address=address) as resp:
+            recorded = _RecordedResponse(resp, _url(parsed), self.root, self.recorded)
+            if 300 <= resp.status < 400 and resp.headers.get("Location"):
+                # the fetcher follows a redirect without reading its body
+                recorded._save(b"")
+            yield recorded
+
+
+Transport = Union[ReplayTransport, RecordingTransport]
+
+_ACTIVE: Optional[Transport] = None
+_ACTIVE_LOADED = False
+
+
+def from_env() -> Optional[Transport]:
+    """Return the transport selected by the environment, if any."""
+
+    replay = os.getenv("FETCH_REPLAY_DIR")
+    if replay:
+        return ReplayTransport(Path(replay), ReplayConfig.from_env())
+    record = os.getenv("FETCH_RECORD_DIR")
+    if record:
+        return RecordingTransport(Path(record))
+    return None
+
+
+def install(transport: Optional[Transport]) -> Optional[Transport]:
+    """Route fetches through *transport* (``None`` restores the live pool).
+
+    Returns the previously active transport.
+    """
+
+    global _ACTIVE, _ACTIVE_LOADED
+    previous = active()
+    _ACTIVE = transport
+    _ACTIVE_LOADED = True
+    return previous
+
+
+def active() -> Optional[Transport]:
+    """Return the installed transport, loading it from the environment once."""
+
+    global _ACTIVE, _ACTIVE_LOADED
+    if not _ACTIVE_LOADED:
+        _ACTIVE = from_env()
+        _ACTIVE_LOADED = True
+    return _ACTIVE
@@ -0,0 +1,79 @@
+"""TTL-bounded cache of validated DNS answers.
+
+Only addresses that already passed the private/loopback checks in
+:mod:`services.fetcher.fetcher` are stored, so a cache hit can be connected
+to directly. Pinning the connection to the cached address also closes the
+gap between validating a name and the socket layer resolving it again.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+
+class ResolverCache:
+    """LRU cache mapping hostnames to validated addresses."""
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[str, ...]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ResolverCache":
+        """Build a cache from ``FETCHER_DNS_*`` environment variables."""
+
+        return cls(
+            ttl=float(os.getenv("FETCHER_DNS_TTL", "60")),
+            max_entries=int(os.getenv("FETCHER_DNS_CACHE_SIZE", "1024")),
+        )
+
+    def get(self, host: str) -> Optional[Tuple[str, ...]]:
+        """Return cached addresses for *host* or ``None`` on a miss."""
+
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[host]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(host)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, host: str, addresses: Sequence[str]) -> None:
+        """Store validated *addresses* for *host*."""
+
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[host] = (time.monotonic() + self.ttl, tuple(addresses))
+            self._entries.move_to_end(host)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size."""
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
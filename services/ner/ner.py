@@ -1,19 +1,48 @@
-"""NER service with fallback and Wikidata linking."""
+"""NER service with fallback and Wikidata linking.
+
+spaCy and its model take seconds to import and load, so they are loaded
+on first use by :func:`get_nlp` rather than at import time. Call
+:func:`load_model` to pay that cost up front, for example from a
+start-up warm-up.
+"""
 from __future__ import annotations
 import re
-from typing import Dict, List
-
-try:  # pragma: no cover - optional dependency
-    import spacy
-    try:
-        _NLP = spacy.load("en_core_web_sm")
-    except Exception:  # model may not be available
-        _NLP = spacy.blank("en")
-        if "ner" not in _NLP.pipe_names:
-            _NLP.add_pipe("ner")
-except Exception:  # pragma: no cover - spaCy not installed
-    spacy = None
-    _NLP = None
+import threading
+from typing import Any, Dict, List
+
+_UNLOADED: Any = object()
+_NLP: Any = _UNLOADED
+_NLP_LOCK = threading.Lock()
+
+
+def _load() -> Any:
+    try:  # pragma: no cover - optional dependency
+        import spacy
+    except Exception:  # pragma: no cover - spaCy not installed
+        return None
+    try:  # pragma: no cover - optional dependency
+        return spacy.load("en_core_web_sm")
+    except Exception:  # pragma: no cover - model may not be available
+        nlp = spacy.blank("en")
+        if "ner" not in nlp.pipe_names:
+            nlp.add_pipe("ner")
+        return nlp
+
+
+def get_nlp() -> Any:
+    """The spaCy pipeline, loaded on first call; ``None`` without spaCy."""
+    global _NLP
+    if _NLP is _UNLOADED:
+        with _NLP_LOCK:
+            if _NLP is _UNLOADED:
+                _NLP = _load()
+    return _NLP
+
+
+def load_model() -> bool:
+    """Load the NER model now; return whether spaCy is available."""
+    return get_nlp() is not None
+
 
 # minimal mapping for offline Wikidata linking
 _ENTITY_LINKS = {
@@ -39,8 +68,9 @@ def _link_entity(text: str) -> str | None:
 def extract_entities(text: str) -> List[Dict[str, str]]:
     """Extract PERSON/ORG/GPE entities with optional Wikidata IDs."""
     entities: List[Dict[str, str]] = []
-    if _NLP and _NLP.pipe_names:
-        doc = _NLP(text)
+    nlp = get_nlp()
+    if nlp and nlp.pipe_names:
+        doc = nlp(text)
         for ent in doc.ents:
             if ent.label_ in {"PERSON", "ORG", "GPE"}:
                 entities.append(
@@ -70,10 +100,8 @@ def extract_entities(text: str) -> List[Dict[str, str]]:
                 }
             )
     return entities
-"""NER service stub."""
-from typing import List
 
 
-def extract_entities(text: str) -> List[str]:
-    """Extract entities from text (stub)."""
-    return []
+def extract_locations(text: str) -> List[str]:
+    """Return place names (GPE entities) mentioned in *text*."""
+    return [e["text"] for e in extract_entities(text) if e["label"] == "GPE"]
@@ -0,0 +1,147 @@
+"""Process pool for CPU-bound profile stages.
+
+Signal extraction (including NER for locations) and fact extraction run in
+worker processes so that one large profile does not block the event loop
+for every other request. Work is sent in chunks of documents and results
+are reassembled in input order, so the output is identical to running the
+same functions inline.
+
+The pool is off unless ``PROFILE_WORKERS`` is set to a positive number of
+processes. When it is on, every non-empty input is offloaded, like single
+fact extractions, and split evenly across the processes in chunks of at
+most ``PROFILE_CHUNK_SIZE`` documents. Both are read once, at import.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import math
+from dataclasses import dataclass
+import multiprocessing
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from services.analytics.signals import extract_signals
+from services.facts import extract_facts
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class WorkerConfig:
+    """Sizing knobs for the profile worker pool."""
+
+    processes: int = 0
+    chunk_size: int = 64
+
+    @classmethod
+    def from_env(cls) -> "WorkerConfig":
+        """Build a config from ``PROFILE_WORKERS``/``PROFILE_CHUNK_SIZE``."""
+
+        return cls(
+            processes=int(os.getenv("PROFILE_WORKERS", cls.processes)),
+            chunk_size=int(os.getenv("PROFILE_CHUNK_SIZE", cls.chunk_size)),
+        )
+
+
+# read once at start-up, like the other subsystems' settings
+CONFIG = WorkerConfig.from_env()
+
+
+def signals_chunk(texts: Sequence[str]) -> List[Dict[str, List[str]]]:
+    """Extract signals for every text in one chunk (runs in a worker)."""
+
+    return [extract_signals(text) for text in texts]
+
+
+def facts_task(text: str) -> Dict[str, Any]:
+    """Extract advanced facts from *text* (runs in a worker)."""
+
+    return extract_facts(text)
+
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_EXECUTOR_CONFIG: Optional[WorkerConfig] = None
+
+
+def get_executor(
+    config: Optional[WorkerConfig] = None,
+) -> Optional[ProcessPoolExecutor]:
+    """Return the shared executor, or ``None`` when offloading is disabled."""
+
+    global _EXECUTOR, _EXECUTOR_CONFIG
+    config = config or CONFIG
+    if config.processes <= 0:
+        return None
+    if _EXECUTOR is None or _EXECUTOR_CONFIG != config:
+        shutdown()
+        # spawn: forking a process that runs an event loop and holds
+        # sockets and sqlite handles is not safe
+        _EXECUTOR = ProcessPoolExecutor(
+            max_workers=config.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        _EXECUTOR_CONFIG = config
+    return _EXECUTOR
+
+
+def shutdown() -> None:
+    """Stop the worker processes, if any were started."""
+
+    global _EXECUTOR, _EXECUTOR_CONFIG
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(cancel_futures=True)
+    _EXECUTOR = None
+    _EXECUTOR_CONFIG = None
+
+
+def _chunks(items: Sequence[T], config: WorkerConfig) -> List[Sequence[T]]:
+    """Split *items* so every process gets work, at most ``chunk_size`` each."""
+
+    per_process = math.ceil(len(items) / max(1, config.processes))
+    size = max(1, min(config.chunk_size, per_process))
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+async def map_chunked(
+    fn: Callable[[Sequence[T]], List[R]],
+    items: Sequence[T],
+    config: Optional[WorkerConfig] = None,
+) -> List[R]:
+    """Apply chunk function *fn* to *items* and return results in order.
+
+    *fn* must be a module-level function so it can be sent to a worker.
+    """
+
+    config = config or CONFIG
+    executor = get_executor(config)
+    if executor is None or not items:
+        return fn(items)
+    loop = asyncio.get_running_loop()
+    chunks = _chunks(items, config)
+    parts = await asyncio.gather(
+        *(loop.run_in_executor(executor, fn, chunk) for chunk in chunks)
+    )
+    return [result for part in parts for result in part]
+
+
+async def extract_signals_many(
+    texts: Sequence[str], config: Optional[WorkerConfig] = None
+) -> List[Dict[str, List[str]]]:
+    """Per-text signals for *texts*, offloaded in chunks when enabled."""
+
+    return await map_chunked(signals_chunk, texts, config)
+
+
+async def extract_facts_async(
+    text: str, config: Optional[WorkerConfig] = None
+) -> Dict[str, Any]:
+    """Facts for *text*, computed in a worker when the pool is enabled."""
+
+    executor = get_executor(config)
+    if executor is None:
+        return facts_task(text)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, facts_task, text)
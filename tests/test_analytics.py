@@ -7,6 +7,8 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 from services.ner.ner import extract_entities
 from services.analytics.events import extract_events
 from services.analytics.confidence import compute_confidence
+from services.analytics.dedupe import Deduplicator, LSHIndex, minhash, similarity
+from services.analytics.signals import extract_signals
 from services.analytics.graph import build_graph, centrality, components, shortest_path
 
 
@@ -64,3 +66,50 @@ def test_graph_analytics():
     assert len(comps) == 1
     path = shortest_path(g, "alice", "bob")
     assert path == ["alice", "alice@example.com", "example.com", "bob@example.com", "bob"]
+
+
+def test_signal_extraction_single_pass():
+    text = (
+        "Mail alice.smith@example.com or @bob, call +61 2 9999 9999 or "
+        "+61 2 9999 9999, see www.acme.org. Barack Obama visited Paris."
+    )
+    signals = extract_signals(text)
+    assert signals == {
+        "emails": ["alice.smith@example.com"],
+        # the email's domain is reported, its local part and "@example" are not
+        "domains": ["example.com", "www.acme.org"],
+        "usernames": ["@bob"],
+        "phones": ["+61 2 9999 9999"],
+        "locations": ["Paris"],
+    }
+    assert extract_signals(text, locations=False)["locations"] == []
+
+
+def test_phone_runs_stop_at_separators():
+    def phones(text):
+        return extract_signals(text, locations=False)["phones"]
+
+    assert phones("Tel 0412345678, 0298765432") == ["0412345678", "0298765432"]
+    listed = phones("Tel 0412 345 678; 02 9876 5432")
+    assert listed == ["0412 345 678", "02 9876 5432"]
+    assert phones("ids (12345678) [87654321] and 1234 (5678)") == []
+    assert phones("Call (02) 9999 9999.") == ["9999 9999"]
+    assert phones("Call 02 9999 9999.") == ["02 9999 9999"]
+
+
+def test_minhash_lsh_finds_near_duplicates():
+    base = " ".join(f"word{i}" for i in range(60))
+    edited = base.replace("word30", "changed")
+    other = " ".join(f"term{i}" for i in range(60))
+    assert minhash("too short to fingerprint") is None
+    index = LSHIndex(threshold=0.8)
+    first = index.add(minhash(base))
+    index.add(minhash(other))
+    assert similarity(minhash(base), minhash(edited)) >= 0.8
+    assert similarity(minhash(base), minhash(other)) < 0.2
+    assert index.query(minhash(edited)) == first
+    dedupe = Deduplicator(threshold=0.8)
+    assert dedupe.cluster(base, "a") is None
+    assert dedupe.cluster(edited, "b") == "a"
+    assert dedupe.cluster(other, "c") is None
+    assert not dedupe.seen("https://x") and dedupe.seen("https://x")
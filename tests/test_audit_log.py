@@ -1,5 +1,7 @@
 """Tests for the append-only audit log."""
 
+import hashlib
+import json
 import sys
 from pathlib import Path
 from datetime import date
@@ -20,3 +22,17 @@ def test_merkle_root_changes():
     assert first != "" and second != ""
     assert first != second
 
+
+
+def test_merkle_leaves_are_canonical_event_hashes():
+    log = AuditLog()
+    events = [{"b": 1, "a": "é"}, {"a": 2}, {"c": [3]}]
+    for event in events:
+        log.append(event)
+    leaves = [
+        hashlib.sha256(json.dumps(e, sort_keys=True).encode()).digest() for e in events
+    ]
+    while len(leaves) > 1:
+        it = iter(leaves)
+        leaves = [hashlib.sha256(a + next(it, a)).digest() for a in it]
+    assert log.merkle_root(date.today()) == leaves[0].hex()
@@ -0,0 +1,65 @@
+"""Tests for canonical JSON encoding and hashing."""
+import hashlib
+import json
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.api import canonical
+
+
+def _legacy_id(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()[:8]
+
+
+PROFILE = {
+    "query": "Zoë",
+    "type": "person",
+    "aliases": [],
+    "confidence": 0.6,
+    "signals": {"emails": ["z@example.com"], "phones": []},
+    "facts": {},
+    "sources": [
+        {
+            "id": f"{i:08x}",
+            "title": "Café   \"quoted\"",
+            "raw": {"content": "x" * 50, "n": i, "nested": {"b": [1, None, True]}},
+            "provenance": {"url": f"https://example.com/{i}"},
+        }
+        for i in range(200)
+    ],
+    "connectors": {"rdap": "ok"},
+}
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        PROFILE,
+        {},
+        [],
+        {"a": {}, "b": [[], {}], "c": (1, 2)},
+        {"nan": float("nan"), "inf": float("-inf"), "big": 2**70},
+        "plain",
+        [1, "two", None],
+    ],
+)
+def test_canonical_matches_json_dumps_sort_keys(obj):
+    expected = json.dumps(obj, sort_keys=True)
+    assert "".join(canonical.iter_canonical(obj)) == expected
+    assert canonical.dumps(obj) == expected
+    assert canonical.sha256_hex(obj) == hashlib.sha256(expected.encode()).hexdigest()
+
+
+def test_entity_id_is_unchanged():
+    assert canonical.entity_id(PROFILE) == _legacy_id(PROFILE)
+
+
+def test_compact_round_trip():
+    assert canonical.loads(canonical.dumps_compact(PROFILE)) == PROFILE
+    # NaN is valid for the json module, which earlier stores wrote with
+    assert math.isnan(canonical.loads(b'{"x": NaN}')["x"])
@@ -1,19 +1,38 @@
 """Unit tests for connector framework and implementations."""
 import asyncio
+import contextlib
 import json
 import sys
+import time
+import xml.etree.ElementTree as ET
 from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 import services.connectors as connectors
+from services.connectors import breaker
+from services.connectors.breaker import CircuitBreaker, RetryBudget
+from services.connectors.limits import SourceLimiter, TokenBucket
+from services.connectors.policy import POLICIES, SourcePolicy
 from services.connectors import (
+    CircuitOpenError,
     GitHubUsersConnector,
     GoogleNewsConnector,
     MediaWikiConnector,
     RDAPConnector,
     WikidataConnector,
 )
+from services.fetcher.fetcher import HTTPStatusError
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    breaker.reset()
+    yield
+    breaker.reset()
 
 
 def test_mediawiki_connector(monkeypatch):
@@ -26,37 +45,87 @@ def test_mediawiki_connector(monkeypatch):
 
 
 def test_google_news_connector(monkeypatch):
-    async def fake_fetch_text(url, host):
-        return (
+    async def fake_fetch_xml(url, host):
+        return ET.fromstring(
             "<rss><channel><item><title>News</title><link>https://example.com"\
             "</link><description>Summary</description></item></channel></rss>"
         )
 
-    monkeypatch.setattr(connectors, "_fetch_text", fake_fetch_text)
+    monkeypatch.setattr(connectors, "_fetch_xml", fake_fetch_xml)
     docs = asyncio.run(GoogleNewsConnector().search("test"))
     assert docs[0]["url"] == "https://example.com"
 
 
+def test_fetch_xml_parses_incrementally(monkeypatch):
+    class FakeStream:
+        size = 0
+
+        async def __aiter__(self):
+            for chunk in (b"<rss><channel><item><ti", b"tle>News</title></item>"):
+                self.size += len(chunk)
+                yield chunk
+            yield b"</channel></rss>"
+
+    @contextlib.asynccontextmanager
+    async def fake_astream(url, **kwargs):
+        yield FakeStream()
+
+    monkeypatch.setattr(connectors, "astream", fake_astream)
+    root = asyncio.run(connectors._fetch_xml("https://news.google.com/rss", "x"))
+    assert root.findtext("channel/item/title") == "News"
+
+
 def test_rdap_connector_domain_only(monkeypatch):
-    async def fake_fetch_json(url, host):
-        return {"name": "example.com"}
+    async def fake_fetch_payload(url, host):
+        return {"name": "example.com"}, "ab" * 32
 
-    monkeypatch.setattr(connectors, "_fetch_json", fake_fetch_json)
+    monkeypatch.setattr(connectors, "_fetch_payload", fake_fetch_payload)
     connector = RDAPConnector()
     docs = asyncio.run(connector.search("example.com"))
     assert docs and docs[0]["source"] == "rdap"
+    assert docs[0]["content_hash"] == "ab" * 32
     assert asyncio.run(connector.search("notadomain")) == []
 
 
+def test_rdap_may_follow_redirects_to_registries():
+    hosts = connectors._fetch_options("rdap.org")["allowed_hosts"]
+    assert {"rdap.org", "rdap.verisign.com"} <= hosts
+    assert connectors._fetch_options("api.github.com")["allowed_hosts"] == {
+        "api.github.com"
+    }
+
+
 def test_github_users_connector(monkeypatch):
-    async def fake_fetch_json(url, host):
-        return {"login": "octocat", "html_url": "https://github.com/octocat", "bio": "hi"}
+    async def fake_fetch_payload(url, host):
+        data = {"login": "octocat", "html_url": "https://github.com/octocat"}
+        return dict(data, bio="hi"), "cd" * 32
 
-    monkeypatch.setattr(connectors, "_fetch_json", fake_fetch_json)
+    monkeypatch.setattr(connectors, "_fetch_payload", fake_fetch_payload)
     docs = asyncio.run(GitHubUsersConnector().search("octocat"))
     assert docs[0]["title"] == "octocat"
 
 
+def test_connector_urls_quote_the_query(monkeypatch):
+    seen = []
+
+    async def fake_fetch_payload(url, host):
+        seen.append(url)
+        return {}, "cd" * 32
+
+    monkeypatch.setattr(connectors, "_fetch_payload", fake_fetch_payload)
+    asyncio.run(GitHubUsersConnector().search("Jane Doe/../orgs?x"))
+    assert seen == ["https://api.github.com/users/Jane%20Doe%2F..%2Forgs%3Fx"]
+
+
+def test_github_unknown_user_is_ok_and_empty(monkeypatch):
+    async def not_found(url, host):
+        raise HTTPStatusError(404)
+
+    monkeypatch.setattr(connectors, "_fetch_payload", not_found)
+    result = asyncio.run(GitHubUsersConnector().run("no-such-user"))
+    assert (result.status, result.docs) == ("ok", [])
+
+
 def test_stub_connectors_return_empty():
     docs = asyncio.run(WikidataConnector().search("foo"))
     assert docs == []
@@ -71,3 +140,289 @@ def test_connector_handles_error(monkeypatch, caplog):
     docs = asyncio.run(MediaWikiConnector().search("alice"))
     assert docs == []
     assert "connector_error" in caplog.text
+
+
+def test_policies_follow_source_registry():
+    registry = Path(__file__).resolve().parents[1] / "docs" / "source_registry.md"
+    retention = {}
+    for line in registry.read_text().splitlines():
+        cells = [c.strip() for c in line.strip("|").split("|")]
+        if len(cells) == 8 and cells[5].endswith("days"):
+            retention[cells[0]] = int(cells[5].split()[0])
+    for policy in POLICIES.values():
+        assert policy.retention_days == retention[policy.registry], policy.source
+        assert policy.fresh_for <= policy.retention_days * 86400
+
+
+def test_connectors_for_different_sources_run_in_parallel():
+    class SlowConnector(connectors.Connector):
+        async def _search(self, query, **kwargs):
+            await asyncio.sleep(0.05)
+            return [{"source": self.source}]
+
+    slow = [
+        type(f"Slow{i}", (SlowConnector,), {"source": f"slow_{i}"})() for i in range(4)
+    ]
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(c.search("q") for c in slow))
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.15  # not the sum of all four latencies
+
+
+def test_source_limiter_caps_concurrency():
+    limiter = SourceLimiter(SourcePolicy("capped", "", concurrency=2))
+    active = []
+
+    async def work():
+        async with limiter:
+            active.append(limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(work() for _ in range(6)))
+
+    asyncio.run(run())
+    assert max(active) == 2 and limiter.in_flight == 0
+
+
+def test_token_bucket_spaces_requests():
+    bucket = TokenBucket(2, 0.1)  # 2 requests per 100 ms
+    assert bucket.reserve() == 0 and bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.05, abs=0.01)
+    limiter = SourceLimiter(SourcePolicy("github_like", "", rate=(60, 60.0)))
+    assert limiter.bucket.rate == 1.0
+
+
+def test_identical_concurrent_searches_share_one_call():
+    calls = []
+
+    class CountingConnector(connectors.Connector):
+        source = "counting"
+
+        async def _search(self, query, **kwargs):
+            calls.append(query)
+            await asyncio.sleep(0.01)
+            return [{"title": query}]
+
+    connector = CountingConnector()
+    before = connectors.singleflight_stats()["coalesced"]
+
+    async def run():
+        same = [connector.search("trending", type="person") for _ in range(5)]
+        other = connector.search("other", type="person")
+        return await asyncio.gather(*same, other)
+
+    results = asyncio.run(run())
+    assert sorted(calls) == ["other", "trending"]
+    assert all(r == [{"title": "trending"}] for r in results[:5])
+    assert results[0][0] is not results[1][0]  # callers never share records
+    assert connectors.singleflight_stats()["coalesced"] - before == 4
+    # nothing is cached once the call has completed
+    asyncio.run(connector.search("trending", type="person"))
+    assert calls.count("trending") == 2
+
+
+def test_run_enforces_deadline_and_reports_status():
+    class StuckConnector(connectors.Connector):
+        source = "stuck"
+
+        async def _search(self, query, **kwargs):
+            await asyncio.sleep(5)
+            return [{"title": query}]
+
+    start = time.monotonic()
+    result = asyncio.run(StuckConnector().run("q", timeout_ms=50))
+    assert time.monotonic() - start < 1
+    assert result.status == "timeout" and result.docs == []
+
+    async def bad_fetch_json(url, host):
+        raise ValueError("boom")
+
+    original = connectors._fetch_json
+    connectors._fetch_json = bad_fetch_json
+    try:
+        assert asyncio.run(MediaWikiConnector().run("q")).status == "error"
+    finally:
+        connectors._fetch_json = original
+
+
+def test_retries_stop_at_deadline(monkeypatch):
+    monkeypatch.setattr(connectors, "backoff", lambda attempt: 0.5 * 2**attempt)
+    attempts = []
+
+    async def failing():
+        attempts.append(time.monotonic())
+        raise ConnectionError("down")
+
+    async def run():
+        connectors.set_deadline(connectors.Deadline.after_ms(800))
+        await connectors._retry(failing, "en.wikipedia.org")
+
+    start = time.monotonic()
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+    # the second (1 s) backoff would overrun the deadline, so it is skipped
+    assert len(attempts) == 2
+    assert time.monotonic() - start < 1
+
+
+def test_hedged_request_returns_first_success():
+    calls = []
+
+    async def operation():
+        calls.append(len(calls))
+        await asyncio.sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    start = time.monotonic()
+    assert asyncio.run(connectors._hedged(operation, 0.02)) == 2
+    assert time.monotonic() - start < 0.3
+
+
+def test_search_many_fans_out_per_distinct_query():
+    calls = []
+
+    class EchoConnector(connectors.Connector):
+        source = "echo"
+
+        async def _search(self, query, **kwargs):
+            calls.append(query)
+            return [{"title": query}]
+
+    results = asyncio.run(EchoConnector().search_many(["a", "b", "a"]))
+    assert results == {"a": [{"title": "a"}], "b": [{"title": "b"}]}
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_run_many_deadline_starts_when_admitted(monkeypatch):
+    from services.connectors import limits
+
+    serial = SourceLimiter(SourcePolicy("serial", "", concurrency=1))
+    monkeypatch.setitem(limits._LIMITERS, "serial", serial)
+
+    class SerialConnector(connectors.Connector):
+        source = "serial"
+
+        async def _search(self, query, **kwargs):
+            await asyncio.sleep(0.3 if query == "stuck" else 0.02)
+            return [{"title": query}]
+
+    # 30 queries x 20 ms on one slot is three times the 200 ms deadline
+    queries = [f"q{i}" for i in range(30)] + ["stuck"]
+    results = asyncio.run(SerialConnector().run_many(queries, timeout_ms=200))
+    statuses = {q: r.status for q, r in results.items()}
+    assert statuses.pop("stuck") == "timeout"
+    assert set(statuses.values()) == {"ok"}
+    assert max(r.latency_ms for r in results.values()) < 250
+
+
+def test_wikidata_search_many_batches_ids(monkeypatch):
+    requests = []
+
+    async def fake_fetch_json(url, host):
+        ids = parse_qs(urlparse(url).query)["ids"][0].split("|")
+        requests.append(ids)
+        entities = {
+            i: {"id": i, "labels": {"en": {"value": f"label {i}"}}} for i in ids
+        }
+        entities["Q1"] = {"id": "Q1", "missing": ""}
+        return {"entities": entities}
+
+    monkeypatch.setattr(connectors, "_fetch_json", fake_fetch_json)
+    queries = [f"Q{i}" for i in range(1, 121)] + ["not an id"]
+    results = asyncio.run(WikidataConnector().search_many(queries))
+    assert [len(ids) for ids in requests] == [50, 50, 20]
+    assert results["Q42"][0]["title"] == "label Q42"
+    assert results["Q42"][0]["url"] == "https://www.wikidata.org/wiki/Q42"
+    assert results["Q1"] == [] and results["not an id"] == []
+
+
+def test_batches_share_calls_and_fail_fast_when_open(monkeypatch):
+    requests = []
+
+    async def fake_fetch_json(url, host):
+        ids = parse_qs(urlparse(url).query)["ids"][0].split("|")
+        requests.append(ids)
+        await asyncio.sleep(0.01)
+        return {"entities": {i: {"id": i} for i in ids}}
+
+    monkeypatch.setattr(connectors, "_fetch_json", fake_fetch_json)
+    connector = WikidataConnector()
+
+    async def run():
+        return await asyncio.gather(
+            *(connector.search_many(["Q1", "Q2"]) for _ in range(3))
+        )
+
+    first, second, _ = asyncio.run(run())
+    assert requests == [["Q1", "Q2"]]  # one upstream call for identical batches
+    assert first == second and first["Q1"][0] is not second["Q1"][0]
+
+    cb = breaker.breaker_for("wikidata")
+    for _ in range(cb.failure_threshold):
+        cb.record_failure()
+    results = asyncio.run(connector.run_many(["Q1", "Q2"]))
+    assert [r.status for r in results.values()] == ["error", "error"]
+    assert len(requests) == 1
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    cb = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    cb.record_failure()
+    assert cb.allow()
+    cb.record_failure()
+    assert cb.state == "open" and not cb.allow()
+    time.sleep(0.06)
+    assert cb.allow()  # single half-open probe
+    assert not cb.allow()
+    cb.record_failure()
+    assert cb.is_open()
+    time.sleep(0.06)
+    assert cb.allow()
+    cb.record_success()
+    assert cb.stats()["state"] == "closed" and cb.stats()["opened"] == 2
+
+
+def test_open_breaker_fails_fast(monkeypatch):
+    monkeypatch.setattr(connectors, "backoff", lambda attempt: 0)
+    calls = []
+
+    async def down():
+        calls.append(1)
+        raise ConnectionError("down")
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises((ConnectionError, CircuitOpenError)):
+                await connectors._retry(down, "api.github.com")
+
+    asyncio.run(run())
+    # the breaker opens after five failures and later calls never run
+    assert len(calls) == 5
+    assert breaker.breaker_stats()["github_users"]["state"] == "open"
+    result = asyncio.run(GitHubUsersConnector().run("octocat"))
+    assert result.status == "error" and result.latency_ms < 50
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    async def not_found():
+        calls.append(1)
+        raise HTTPStatusError(404)
+
+    with pytest.raises(HTTPStatusError):
+        asyncio.run(connectors._retry(not_found, "api.github.com"))
+    assert len(calls) == 1
+    assert breaker.breaker_stats()["github_users"]["state"] == "closed"
+
+
+def test_retry_budget_caps_retries():
+    budget = RetryBudget(ratio=0.5, reserve=1)
+    assert budget.withdraw() and not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
@@ -20,10 +20,10 @@ def test_json_schemas_load():
 
 
 def test_openapi_spec_load():
-    with open("services/api/openapi.json") as f:
-    with open("services/api/openapi.yaml") as f:
-        spec = json.load(f)
-    assert spec["openapi"].startswith("3"), "openapi version"
-    for path in ["/health", "/search", "/profile", "/entities", "/entities/{id}", "/export"]:
-        assert path in spec["paths"], path
-    assert "Doc" in spec["components"]["schemas"]
+    for name in ["openapi.json", "openapi.yaml"]:
+        with open(Path("services/api") / name) as f:
+            spec = json.load(f)
+        assert spec["openapi"].startswith("3"), "openapi version"
+        for path in ["/health", "/search", "/profile", "/entities", "/entities/{id}", "/export"]:
+            assert path in spec["paths"], path
+        assert "Doc" in spec["components"]["schemas"]
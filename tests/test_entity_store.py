@@ -0,0 +1,167 @@
+"""Tests for the SQLite-backed entity store."""
+import asyncio
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.api import main as api
+from services.api.entity_store import EntityStore
+
+
+def _profile(i):
+    return {
+        "query": f"entity {i}",
+        "type": "person",
+        "canonical_name": f"Person {i % 50}",
+        "aliases": [f"P{i}", "Common Alias"],
+        "signals": {"emails": [f"user{i}@example.com"], "domains": ["example.com"]},
+    }
+
+
+def test_bulk_insert_lookup_and_persistence(tmp_path):
+    path = str(tmp_path / "entities.sqlite3")
+    store = EntityStore(path, cache_size=8)
+    assert store.put_many((f"id{i:04d}", _profile(i)) for i in range(1000)) == 1000
+    assert store.get("id0007") == _profile(7)
+    assert store.get("missing") is None
+    assert store.find_by_name("person 7") == [f"id{i:04d}" for i in range(7, 1000, 50)]
+    assert store.find_by_alias("p7") == ["id0007"]
+    assert len(store.find_by_alias("Common Alias", limit=5)) == 5
+    assert store.find_by_signal("emails", "user9@example.com") == ["id0009"]
+
+    # re-storing an id replaces its index rows
+    store.put("id0009", dict(_profile(9), aliases=[], signals={}))
+    assert store.find_by_signal("emails", "user9@example.com") == []
+    assert store.find_by_alias("p9") == []
+    store.close()
+
+    reopened = EntityStore(path)
+    assert len(reopened) == 1000
+    assert reopened.get("id0007") == _profile(7)
+    reopened.close()
+
+
+def test_read_cache_is_bounded():
+    store = EntityStore(cache_size=2)
+    store.put_many((f"id{i}", _profile(i)) for i in range(5))
+    assert store.stats()["cached"] == 2
+    store.get("id4")
+    store.get("id0")
+    stats = store.stats()
+    assert (stats["cache_hits"], stats["cache_misses"]) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "sql, params",
+    [
+        ("SELECT body FROM entities WHERE id = ?", ("x",)),
+        ("SELECT id FROM entities WHERE canonical_name = ? ORDER BY id", ("x",)),
+        ("SELECT entity_id FROM entity_aliases WHERE alias = ?", ("x",)),
+        (
+            "SELECT entity_id FROM entity_signals WHERE kind = ? AND value = ?",
+            ("emails", "x"),
+        ),
+    ],
+)
+def test_lookups_use_indexes(sql, params):
+    store = EntityStore()
+    plan = store._db.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "SEARCH" in details and "SCAN" not in details
+
+
+def test_entity_endpoints(monkeypatch):
+    monkeypatch.setattr(api, "ENTITIES", EntityStore())
+    profile = api.EntityProfileModel(
+        query="alice", type="person", canonical_name="Alice", aliases=["A. Smith"]
+    )
+    created = asyncio.run(api.create_entity(profile))
+    assert asyncio.run(api.get_entity(created["id"]))["canonical_name"] == "Alice"
+    found = asyncio.run(api.find_entities(alias="a. smith"))
+    assert found == {"ids": [created["id"]]}
+    with pytest.raises(api.HTTPException):
+        asyncio.run(api.get_entity("missing"))
+    with pytest.raises(api.HTTPException):
+        asyncio.run(api.find_entities())
+
+
+def test_lookup_limits_are_bounded(monkeypatch):
+    store = EntityStore()
+    store.put_many((f"id{i:04d}", _profile(i)) for i in range(20))
+    for limit in (-1, 0, 1001):
+        with pytest.raises(ValueError):
+            store.find_by_alias("Common Alias", limit)
+        with pytest.raises(ValueError):
+            store.search_signals("emails", suffix="example.com", limit=limit)
+    monkeypatch.setattr(api, "ENTITIES", store)
+    for limit in (-1, 0, 1001):
+        with pytest.raises(api.HTTPException) as exc:
+            asyncio.run(api.find_entities(alias="Common Alias", limit=limit))
+        assert exc.value.status_code == 400
+        with pytest.raises(api.HTTPException):
+            asyncio.run(api.find_signals(suffix="example.com", limit=limit))
+    found = asyncio.run(api.find_entities(alias="Common Alias", limit=3))
+    assert len(found["ids"]) == 3
+
+
+def test_signal_prefix_and_suffix_queries(tmp_path, monkeypatch):
+    store = EntityStore(str(tmp_path / "entities.sqlite3"))
+    store.put_many((f"id{i:04d}", _profile(i)) for i in range(200))
+    store.put("other", {"signals": {"emails": ["user1@elsewhere.org"]}})
+    at_domain = store.search_signals("emails", suffix="@elsewhere.org")
+    assert at_domain == [("user1@elsewhere.org", "other")]
+    users = store.search_signals("emails", prefix="user19")
+    expected = [f"user{i}@example.com" for i in [19, *range(190, 200)]]
+    assert [v for v, _ in users] == sorted(expected)
+    assert len(store.search_signals("emails", suffix="example.com", limit=7)) == 7
+    with pytest.raises(ValueError):
+        store.search_signals("emails", prefix="a", suffix="b")
+    plan = store._db.execute(
+        "EXPLAIN QUERY PLAN SELECT value, entity_id FROM entity_signals"
+        " WHERE kind = ? AND reversed >= ? AND reversed < ?",
+        ("emails", "a", "b"),
+    ).fetchall()
+    assert "USING COVERING INDEX entity_signals_reversed" in plan[0][-1]
+
+    monkeypatch.setattr(api, "ENTITIES", store)
+    matches = asyncio.run(api.find_signals(suffix="@elsewhere.org"))["matches"]
+    assert matches == [
+        {"kind": "emails", "value": "user1@elsewhere.org", "entity_id": "other"}
+    ]
+
+
+def test_signal_index_migrates_existing_database(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE entity_signals (kind TEXT, value TEXT, entity_id TEXT,"
+        " PRIMARY KEY (kind, value, entity_id)) WITHOUT ROWID"
+    )
+    db.execute("INSERT INTO entity_signals VALUES ('emails', 'a@b.com', 'x')")
+    db.commit()
+    db.close()
+    store = EntityStore(path)
+    assert store.search_signals("emails", suffix="@b.com") == [("a@b.com", "x")]
+
+
+
+def test_count_is_maintained_without_scanning(tmp_path):
+    path = str(tmp_path / "entities.sqlite3")
+    store = EntityStore(path)
+    store.put_many((f"id{i}", _profile(i)) for i in range(10))
+    store.put("id3", _profile(3))  # replacing keeps the count
+    statements = []
+    store._db.set_trace_callback(statements.append)
+    assert store.stats()["entities"] == 10
+    assert not any("COUNT" in sql for sql in statements)
+    store._db.set_trace_callback(None)
+    store.close()
+
+    reopened = EntityStore(path)
+    assert len(reopened) == 10
+    reopened.clear()
+    assert len(reopened) == 0
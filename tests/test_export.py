@@ -0,0 +1,207 @@
+"""Tests for streaming JSONL/CSV/PDF exports and background export jobs."""
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.api import export
+from services.api import main as api
+from services.api.entity_store import EntityStore
+
+
+def _source(i, classification="OFFICIAL"):
+    return {
+        "id": f"doc{i}",
+        "title": f"Title {i}",
+        "summary": f"Summary of document {i} (with parentheses)",
+        "url": f"https://example.com/{i}",
+        "source": "dummy",
+        "fetched_at": "2024-01-01T00:00:00",
+        "raw": {},
+        "hash": f"{i:064x}",
+        "classification": classification,
+        "provenance": {},
+    }
+
+
+def _profile(n, classification="OFFICIAL"):
+    sources = [_source(i) for i in range(n)]
+    if n:
+        sources[-1]["classification"] = classification
+    return {
+        "id": "abcd1234",
+        "query": "alice",
+        "type": "person",
+        "canonical_name": "Alice",
+        "aliases": ["A. Smith"],
+        "confidence": 1.0,
+        "signals": {"emails": ["alice@example.com"]},
+        "sources": sources,
+    }
+
+
+def _wait(jobs, job_id, timeout=10.0):
+    """Poll until the export job *job_id* has finished."""
+
+    deadline = time.monotonic() + timeout
+    job = jobs.get(job_id)
+    while job.status in {"pending", "running"} and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def _collect(stream):
+    async def drain():
+        return [chunk async for chunk in stream]
+
+    return asyncio.run(drain())
+
+
+def test_jsonl_and_csv_rows():
+    lines = b"".join(export.render_jsonl([_profile(3, "PROTECTED")])).splitlines()
+    records = [json.loads(line) for line in lines]
+    assert records[0]["record"] == "profile"
+    assert records[0]["classification"] == "PROTECTED"
+    assert records[0]["source_count"] == 3
+    assert [r["id"] for r in records[1:]] == ["doc0", "doc1", "doc2"]
+
+    text = b"".join(export.render_csv([_profile(3)])).decode()
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert [r["id"] for r in rows] == ["doc0", "doc1", "doc2"]
+    assert rows[0]["entity"] == "abcd1234"
+    assert rows[0]["canonical_name"] == "Alice"
+
+
+def test_pdf_structure_and_banner():
+    data = b"".join(export.render_pdf([_profile(200, "SECRET"), _profile(1)]))
+    assert data.startswith(b"%PDF-1.4") and data.endswith(b"%%EOF\n")
+    startxref = int(data.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+    xref = data[startxref:].split(b"trailer")[0].splitlines()
+    entries = xref[3:]
+    for number, entry in enumerate(entries, 1):
+        offset = int(entry.split()[0])
+        assert data[offset:].startswith(b"%d 0 obj" % number)
+    pages = int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", data)[1])
+    assert pages > 2
+    # two banners per page: the first profile's marking, then the second's
+    assert data.count(b"(SECRET) Tj") == 2 * (pages - 1)
+    assert data.count(b"(OFFICIAL) Tj") == 2
+    assert b"\\(with parentheses\\)" in data
+
+
+def test_streamed_chunks_are_bounded():
+    profile = _profile(5000)
+    for format in export.RENDERERS:
+        chunks = list(export.render(format, [profile]))
+        assert max(map(len, chunks)) <= export.CHUNK_SIZE + 4096
+        batches = _collect(export.iterate_off_loop(iter(chunks)))
+        assert b"".join(batches) == b"".join(chunks)
+        assert max(map(len, batches)) < 2 * export.CHUNK_SIZE + 4096
+    with pytest.raises(ValueError):
+        export.render("docx", [profile])
+
+
+def test_export_endpoint_streams():
+    profile = api.EntityProfileModel(
+        query="alice", type="person", sources=[api.DocModel(**_source(0))]
+    )
+    assert asyncio.run(api.export(profile)) is profile
+    response = asyncio.run(api.export(profile, format="csv"))
+    assert response.media_type == "text/csv"
+    assert "profile.csv" in response.headers["Content-Disposition"]
+    assert b"doc0" in b"".join(_collect(response.body_iterator))
+    with pytest.raises(api.HTTPException):
+        asyncio.run(api.export(profile, format="docx"))
+
+
+def test_background_export_jobs(tmp_path, monkeypatch):
+    store = EntityStore()
+    store.put_many([("e1", _profile(3)), ("e2", _profile(2, "PROTECTED"))])
+    jobs = export.ExportJobs(tmp_path)
+    monkeypatch.setattr(api, "ENTITIES", store)
+    monkeypatch.setattr(api, "EXPORTS", jobs)
+
+    request = api.ExportRequest(ids=["e1", "e2"], format="jsonl")
+    job = asyncio.run(api.create_export(request))
+    assert _wait(jobs, job["id"]).status == "done"
+    status = asyncio.run(api.get_export(job["id"]))
+    assert status["bytes"] == (tmp_path / f"{job['id']}.jsonl").stat().st_size
+    response = asyncio.run(api.download_export(job["id"]))
+    lines = b"".join(_collect(response.body_iterator)).splitlines()
+    headers = [json.loads(line) for line in lines if b'"profile"' in line]
+    assert [h["id"] for h in headers] == ["e1", "e2"]
+    assert headers[1]["classification"] == "PROTECTED"
+    assert not list(tmp_path.glob("*.part"))
+
+    with pytest.raises(api.HTTPException):
+        asyncio.run(api.create_export(api.ExportRequest(ids=["nope"], format="csv")))
+    with pytest.raises(api.HTTPException):
+        asyncio.run(api.get_export("nope"))
+
+    failing = jobs.submit("csv", lambda: iter([None]), 1)
+    assert _wait(jobs, failing.id).status == "error"
+    with pytest.raises(api.HTTPException):
+        asyncio.run(api.download_export(failing.id))
+    jobs.shutdown()
+
+
+def test_csv_neutralises_formulas():
+    profile = _profile(1)
+    profile["canonical_name"] = "=HYPERLINK(\"http://evil\")"
+    profile["sources"][0].update(title="+1 caller", summary="-2", url="@SUM(A1)")
+    text = b"".join(export.render_csv([profile])).decode()
+    row = next(csv.DictReader(io.StringIO(text)))
+    assert row["canonical_name"] == "'=HYPERLINK(\"http://evil\")"
+    cells = (row["title"], row["summary"], row["url"])
+    assert cells == ("'+1 caller", "'-2", "'@SUM(A1)")
+    assert row["source"] == "dummy"
+
+
+def test_finished_jobs_expire_and_are_capped(tmp_path, monkeypatch):
+    stale = tmp_path / "old.csv"
+    stale.write_text("left by an earlier process")
+    os.utime(stale, (0, 0))
+    jobs = export.ExportJobs(tmp_path, ttl=60, max_jobs=2)
+    first = jobs.submit("csv", lambda: [_profile(1)], 1)
+    assert not stale.exists()
+    _wait(jobs, first.id)
+    second = jobs.submit("csv", lambda: [_profile(1)], 1)
+    _wait(jobs, second.id)
+    # a third job makes room by dropping the oldest finished one
+    third = jobs.submit("csv", lambda: [_profile(1)], 1)
+    _wait(jobs, third.id)
+    assert jobs.get(first.id) is None
+    assert not jobs.path(first).exists()
+    assert jobs.get(second.id) is not None
+
+    clock = [export.time.time() + 120]
+    monkeypatch.setattr(export.time, "time", lambda: clock[0])
+    assert jobs.get(second.id) is None and jobs.get(third.id) is None
+    assert not list(tmp_path.iterdir())
+    jobs.shutdown()
+
+
+def test_unfinished_jobs_are_never_evicted(tmp_path):
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return [_profile(1)]
+
+    jobs = export.ExportJobs(tmp_path, max_jobs=1)
+    job = jobs.submit("csv", blocked, 1)
+    with pytest.raises(export.ExportLimitError):
+        jobs.submit("csv", lambda: [], 0)
+    release.set()
+    assert _wait(jobs, job.id).status == "done"
+    jobs.shutdown()
@@ -1,14 +1,36 @@
 """Unit tests for the SSRF-safe fetcher."""
 
+import asyncio
+import hashlib
 import sys
+import threading
+import time
 from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urlparse
 from unittest import mock
 
 import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from services.fetcher.fetcher import FetchResult, fetch
+from services.fetcher import fetcher
+from services.fetcher.fetcher import MAX_BYTES, FetchResult, afetch, astream, fetch
+from services.fetcher.cache import CachePolicy, ResponseCache
+from services.fetcher.pool import ConnectionPool, PoolConfig
+from services.fetcher.replay import (
+    RecordingTransport,
+    ReplayConfig,
+    ReplayTransport,
+)
+from services.fetcher.resolver import ResolverCache
+
+
+@pytest.fixture(autouse=True)
+def clear_resolver_cache():
+    fetcher.RESOLVER.clear()
+    yield
+    fetcher.RESOLVER.clear()
 
 
 class DummyResponse:
@@ -20,7 +42,7 @@ class DummyResponse:
         return self._content
 
 
-@mock.patch("services.fetcher.fetcher.urlopen")
+@mock.patch("services.fetcher.fetcher._open")
 @mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
 def test_fetch_allowlisted(mock_addr, mock_open):
     mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
@@ -28,6 +50,58 @@ def test_fetch_allowlisted(mock_addr, mock_open):
     res = fetch("https://example.com", allowed_hosts={"example.com"})
     assert isinstance(res, FetchResult)
     assert res.content == b"ok"
+    # the connection is pinned to the address that passed validation
+    assert mock_open.call_args[0][1] == "93.184.216.34"
+
+
+@mock.patch("services.fetcher.fetcher._open")
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_fetch_caches_validated_addresses(mock_addr, mock_open):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    mock_open.return_value.__enter__.return_value = DummyResponse(b"ok")
+    fetch("https://example.com", allowed_hosts={"example.com"})
+    fetch("https://example.com/other", allowed_hosts={"example.com"})
+    assert mock_addr.call_count == 1
+    stats = fetcher.resolver_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+@mock.patch("services.fetcher.fetcher._open")
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_fetch_follows_checked_redirects(mock_addr, mock_open):
+    addresses = {"a.example": "93.184.216.34", "b.example": "93.184.216.35"}
+    mock_addr.side_effect = lambda host, *args: [
+        (None, None, None, None, (addresses[host], 0))
+    ]
+    moved = HTTPError(
+        "https://a.example/x", 302, "Found", {"Location": "//b.example/y"}, None
+    )
+    response = mock.MagicMock()
+    response.__enter__.return_value = DummyResponse(b"ok")
+    mock_open.side_effect = [moved, response]
+    res = fetch("https://a.example/x", allowed_hosts={"a.example", "b.example"})
+    assert res.content == b"ok"
+    hops = [(c[0][0].full_url, c[0][1]) for c in mock_open.call_args_list]
+    assert hops == [
+        ("https://a.example/x", "93.184.216.34"),
+        ("https://b.example/y", "93.184.216.35"),
+    ]
+
+    mock_open.side_effect = [moved]
+    with pytest.raises(ValueError, match="not allowlisted"):
+        fetch("https://a.example/x", allowed_hosts={"a.example"})
+
+
+def test_resolver_cache_ttl_and_size():
+    cache = ResolverCache(ttl=60, max_entries=2)
+    cache.put("a.example", ["93.184.216.34"])
+    cache.put("b.example", ["93.184.216.35"])
+    cache.put("c.example", ["93.184.216.36"])
+    assert cache.get("a.example") is None  # evicted as least recently used
+    assert cache.get("c.example") == ("93.184.216.36",)
+    expired = ResolverCache(ttl=0.0)
+    expired.put("a.example", ["93.184.216.34"])
+    assert expired.get("a.example") is None
 
 
 @mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
@@ -41,3 +115,438 @@ def test_fetch_blocks_unlisted_host():
     with pytest.raises(ValueError):
         fetch("https://example.org", allowed_hosts={"example.com"})
 
+
+
+class FakeWriter:
+    def __init__(self):
+        self.sent = b""
+        self.closed = False
+
+    def write(self, data: bytes) -> None:
+        self.sent += data
+
+    async def drain(self) -> None:
+        return None
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _http_response(
+    body: bytes, content_type: str = "application/json", extra: str = ""
+) -> bytes:
+    head = (
+        "HTTP/1.1 200 OK\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n{extra}\r\n"
+    )
+    return head.encode() + body
+
+
+def _fake_connection(*responses: bytes):
+    opened = []
+
+    async def open_connection(host, port, **kwargs):
+        reader = asyncio.StreamReader()
+        for response in responses:
+            reader.feed_data(response)
+        writer = FakeWriter()
+        opened.append((host, port, writer))
+        return reader, writer
+
+    return open_connection, opened
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_reuses_keep_alive_connection(mock_addr):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    open_connection, opened = _fake_connection(
+        _http_response(b'{"a": 1}'), _http_response(b'{"b": 2}')
+    )
+
+    async def run():
+        pool = ConnectionPool(PoolConfig(max_per_host=2))
+        hosts = {"example.com"}
+        first = await afetch("https://example.com/x", allowed_hosts=hosts, pool=pool)
+        second = await afetch("https://example.com/y", allowed_hosts=hosts, pool=pool)
+        return pool, first, second
+
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        pool, first, second = asyncio.run(run())
+    assert first.content == b'{"a": 1}'
+    assert first.sha256 == hashlib.sha256(b'{"a": 1}').hexdigest()
+    assert second.content == b'{"b": 2}'
+    assert len(opened) == 1
+    assert opened[0][0] == "93.184.216.34"  # dialled the validated address
+    assert mock_addr.call_count == 1
+    assert pool.reused == 1
+    assert b"GET /y HTTP/1.1" in opened[0][2].sent
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_reads_chunked_body(mock_addr):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    chunked = (
+        b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+        b"Transfer-Encoding: chunked\r\n\r\n"
+        b"3\r\nfoo\r\n3\r\nbar\r\n0\r\n\r\n"
+    )
+    open_connection, _ = _fake_connection(chunked)
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        res = asyncio.run(afetch("https://example.com", pool=ConnectionPool()))
+    assert res.content == b"foobar"
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_enforces_limits(mock_addr):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    too_large = _http_response(b"x" * (MAX_BYTES + 1), "text/plain")
+    open_connection, _ = _fake_connection(too_large)
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        with pytest.raises(ValueError, match="too large"):
+            asyncio.run(afetch("https://example.com", pool=ConnectionPool()))
+
+    open_connection, _ = _fake_connection(_http_response(b"x", "image/png"))
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        with pytest.raises(ValueError, match="content type"):
+            asyncio.run(afetch("https://example.com", pool=ConnectionPool()))
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_blocks_private(mock_addr):
+    mock_addr.return_value = [(None, None, None, None, ("10.0.0.1", 0))]
+    with pytest.raises(ValueError):
+        asyncio.run(afetch("https://internal.example", pool=ConnectionPool()))
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_refuses_control_characters(mock_addr):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    open_connection, opened = _fake_connection(_http_response(b"{}"))
+    urls = [
+        "https://example.com/users/Jane Doe",
+        "https://example.com/x\r\nX-Injected: 1",
+        "https://example.com/?q=a\x00b",
+    ]
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        for url in urls:
+            with pytest.raises(ValueError, match="control character"):
+                asyncio.run(afetch(url, pool=ConnectionPool()))
+    assert not opened
+
+
+def test_pool_refuses_header_injection():
+    pool = ConnectionPool()
+    with pytest.raises(ValueError, match="header"):
+        pool.request(urlparse("https://example.com/"), {"X-A": "1\r\nX-B: 2"})
+    pool.request(urlparse("https://example.com/"), {"User-Agent": "a b\tc"})
+
+
+def _redirect_response(location: str, status: int = 302) -> bytes:
+    return (
+        f"HTTP/1.1 {status} Found\r\nLocation: {location}\r\n"
+        "Content-Length: 0\r\n\r\n"
+    ).encode()
+
+
+def _one_response_per_connection(*responses: bytes):
+    """Like _fake_connection, but each new connection gets the next response."""
+
+    queue = list(responses)
+    opened = []
+
+    async def open_connection(host, port, **kwargs):
+        reader = asyncio.StreamReader()
+        reader.feed_data(queue.pop(0))
+        reader.feed_eof()
+        writer = FakeWriter()
+        opened.append((host, kwargs.get("server_hostname"), writer))
+        return reader, writer
+
+    return open_connection, opened
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_follows_checked_redirects(mock_addr):
+    addresses = {"rdap.org": "93.184.216.34", "rdap.verisign.com": "93.184.216.35"}
+    mock_addr.side_effect = lambda host, *args: [
+        (None, None, None, None, (addresses.get(host, "10.0.0.1"), 0))
+    ]
+    hosts = {"rdap.org", "rdap.verisign.com", "internal.example"}
+    open_connection, opened = _one_response_per_connection(
+        _redirect_response("https://rdap.verisign.com/com/v1/domain/example.com"),
+        _http_response(b'{"name": "EXAMPLE.COM"}', "application/rdap+json"),
+    )
+    url = "https://rdap.org/domain/example.com"
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        res = asyncio.run(afetch(url, allowed_hosts=hosts, pool=ConnectionPool()))
+    assert res.content == b'{"name": "EXAMPLE.COM"}'
+    # each hop dialled its own validated address and verified its own name
+    assert [(host, name) for host, name, _ in opened] == [
+        ("93.184.216.34", "rdap.org"),
+        ("93.184.216.35", "rdap.verisign.com"),
+    ]
+    assert b"GET /com/v1/domain/example.com HTTP/1.1" in opened[1][2].sent
+
+    refused = [
+        ("https://elsewhere.example/", "not allowlisted"),
+        ("https://internal.example/", "private address"),
+    ]
+    for location, message in refused:
+        open_connection, opened = _one_response_per_connection(
+            _redirect_response(location)
+        )
+        with mock.patch(
+            "services.fetcher.pool.asyncio.open_connection", open_connection
+        ):
+            with pytest.raises(ValueError, match=message):
+                asyncio.run(afetch(url, allowed_hosts=hosts, pool=ConnectionPool()))
+        assert len(opened) == 1
+
+    loop = [_redirect_response(url, 301)] * (fetcher.MAX_REDIRECTS + 1)
+    open_connection, opened = _one_response_per_connection(*loop)
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        with pytest.raises(ValueError, match="too many redirects"):
+            asyncio.run(afetch(url, allowed_hosts=hosts, pool=ConnectionPool()))
+    assert len(opened) == fetcher.MAX_REDIRECTS + 1
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_astream_hashes_and_limits_incrementally(mock_addr):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    chunked = (
+        b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+        b"Transfer-Encoding: chunked\r\n\r\n"
+        b"3\r\nfoo\r\n3\r\nbar\r\n0\r\n\r\n"
+    )
+
+    async def collect(max_bytes):
+        pool = ConnectionPool()
+        async with astream("https://example.com", pool=pool, max_bytes=max_bytes) as s:
+            chunks = [chunk async for chunk in s]
+        return chunks, s
+
+    open_connection, _ = _fake_connection(chunked)
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        chunks, stream = asyncio.run(collect(MAX_BYTES))
+    assert chunks == [b"foo", b"bar"]
+    assert stream.size == 6
+    assert stream.sha256 == hashlib.sha256(b"foobar").hexdigest()
+
+    # chunked bodies carry no length up front; the limit trips mid-stream
+    open_connection, _ = _fake_connection(chunked)
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", open_connection):
+        with pytest.raises(ValueError, match="too large"):
+            asyncio.run(collect(4))
+
+
+def test_pool_config_from_env(monkeypatch):
+    monkeypatch.setenv("FETCHER_POOL_SIZE", "3")
+    monkeypatch.setenv("FETCHER_POOL_IDLE_TIMEOUT", "1.5")
+    config = PoolConfig.from_env()
+    assert config.max_per_host == 3
+    assert config.idle_timeout == 1.5
+
+
+def _store(cache, url, body, etag=""):
+    pending = cache.begin(url, "application/json", etag=etag)
+    pending.write(body)
+    pending.commit(hashlib.sha256(body).hexdigest())
+
+
+def test_response_cache_is_content_addressed_with_lru_budget(tmp_path):
+    policy = CachePolicy(fresh_for=60)
+    cache = ResponseCache(tmp_path, max_bytes=10)
+    _store(cache, "https://Example.com/a?b=2&a=1", b"12345")
+    _store(cache, "https://example.com/copy", b"12345")
+    assert cache.total_bytes() == 5  # one blob shared by both URLs
+    entry = cache.lookup("https://example.com/a?a=1&b=2", policy)
+    assert entry is not None and b"".join(cache.read(entry)) == b"12345"
+
+    _store(cache, "https://example.com/b", b"abcdef")
+    # over budget: the least recently used entry goes, the shared blob stays
+    assert cache.lookup("https://example.com/copy", policy) is None
+    assert cache.lookup("https://example.com/a?a=1&b=2", policy) is None
+    assert cache.lookup("https://example.com/b", policy) is not None
+    assert cache.total_bytes() == 6
+
+
+def test_response_cache_hits_and_writes_avoid_full_scans(tmp_path):
+    policy = CachePolicy(fresh_for=60)
+    cache = ResponseCache(tmp_path, max_bytes=10)
+    _store(cache, "https://example.com/a", b"12345")
+    _store(cache, "https://example.com/b", b"123")
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    for _ in range(3):
+        entry = cache.lookup("https://example.com/a", policy)
+    # a hit is one indexed SELECT: its access time waits in memory
+    assert len(statements) == 3 and all(s.startswith("SELECT") for s in statements)
+
+    async def read():
+        return [chunk async for chunk in await cache.aopen(entry)]
+
+    assert b"".join(asyncio.run(read())) == b"12345"
+
+    statements.clear()
+    _store(cache, "https://example.com/c", b"abcd")
+    assert not [s for s in statements if "SUM" in s]
+    # the pending access made b, not a, the least recently used
+    assert cache.lookup("https://example.com/b", policy) is None
+    assert cache.lookup("https://example.com/a", policy) is not None
+    assert cache.total_bytes() == 9
+    cache._db.set_trace_callback(None)
+    assert ResponseCache(tmp_path).total_bytes() == 9
+
+
+def test_response_cache_purges_past_retention(tmp_path):
+    cache = ResponseCache(tmp_path)
+    _store(cache, "https://example.com/a", b"old")
+    assert cache.lookup("https://example.com/a", CachePolicy(0, retention=0)) is None
+    assert cache.stats()["entries"] == 0
+    assert not [p for p in (tmp_path / "objects").rglob("*") if p.is_file()]
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_serves_and_revalidates_from_cache(mock_addr, tmp_path):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    cache = ResponseCache(tmp_path)
+    url = "https://example.com/data"
+
+    async def get(policy):
+        pool = ConnectionPool()
+        return await afetch(url, pool=pool, cache=cache, cache_policy=policy)
+
+    etag = 'ETag: "v1"\r\n'
+    first, opened = _fake_connection(_http_response(b'{"v": 1}', extra=etag))
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", first):
+        res = asyncio.run(get(CachePolicy(fresh_for=60)))
+    assert res.content == b'{"v": 1}' and len(opened) == 1
+
+    # fresh: served from disk without touching the network
+    with mock.patch("services.fetcher.pool.asyncio.open_connection") as never:
+        res = asyncio.run(get(CachePolicy(fresh_for=60)))
+        never.assert_not_called()
+    assert res.sha256 == hashlib.sha256(b'{"v": 1}').hexdigest()
+
+    # stale: a conditional request is answered with 304 Not Modified
+    not_modified = b"HTTP/1.1 304 Not Modified\r\nETag: \"v1\"\r\n\r\n"
+    conditional, opened = _fake_connection(not_modified)
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", conditional):
+        res = asyncio.run(get(CachePolicy(fresh_for=0)))
+    assert res.content == b'{"v": 1}'
+    assert b'If-None-Match: "v1"' in opened[0][2].sent
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_response_cache_places_blobs_under_the_index_lock(tmp_path):
+    cache = ResponseCache(tmp_path)
+    body = b"shared body"
+    blob = cache._blob_path(hashlib.sha256(body).hexdigest())
+    with cache._lock:
+        writer = threading.Thread(
+            target=_store, args=(cache, "https://example.com/a", body)
+        )
+        writer.start()
+        writer.join(0.1)
+        # a drop holding the lock can never see the blob without its row
+        assert writer.is_alive() and not blob.exists()
+    writer.join()
+    assert blob.exists()
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_afetch_refetches_bodies_evicted_after_lookup(mock_addr, tmp_path):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    cache = ResponseCache(tmp_path)
+    url = "https://example.com/data"
+    _store(cache, url, b'{"v": 1}', etag='"v1"')
+    lookup = cache.lookup
+
+    def evicting_lookup(*args):
+        entry = lookup(*args)
+        if entry is not None:
+            cache._blob_path(entry.content_hash).unlink()
+        return entry
+
+    cache.lookup = evicting_lookup
+
+    async def get(policy):
+        pool = ConnectionPool()
+        return await afetch(url, pool=pool, cache=cache, cache_policy=policy)
+
+    fresh, opened = _fake_connection(_http_response(b'{"v": 2}'))
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", fresh):
+        assert asyncio.run(get(CachePolicy(fresh_for=60))).content == b'{"v": 2}'
+    assert len(opened) == 1 and b"If-None-Match" not in opened[0][2].sent
+
+    # stale and answered 304: the conditional request is repeated in full
+    _store(cache, url, b'{"v": 1}', etag='"v1"')
+    not_modified = b"HTTP/1.1 304 Not Modified\r\nETag: \"v1\"\r\n\r\n"
+    responses, opened = _one_response_per_connection(
+        not_modified, _http_response(b'{"v": 3}')
+    )
+    with mock.patch("services.fetcher.pool.asyncio.open_connection", responses):
+        assert asyncio.run(get(CachePolicy(fresh_for=0))).content == b'{"v": 3}'
+    assert b"If-None-Match" in opened[0][2].sent
+    assert b"If-None-Match" not in opened[1][2].sent
+    assert cache.stats()["revalidated"] == 0
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_record_then_replay_offline(mock_addr, tmp_path):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    open_connection, _ = _fake_connection(_http_response(b'{"a": 1}'))
+    recorder = RecordingTransport(tmp_path, pool=ConnectionPool())
+    with mock.patch("asyncio.open_connection", open_connection):
+        recorded = asyncio.run(afetch("https://example.com/x?b=2&a=1", pool=recorder))
+    assert len(recorder.recorded) == 1
+
+    mock_addr.reset_mock()
+    replayer = ReplayTransport(tmp_path)
+    res = asyncio.run(afetch("https://example.com/x?a=1&b=2", pool=replayer))
+    assert res.content == recorded.content and res.sha256 == recorded.sha256
+    assert res.content_type == "application/json"
+    mock_addr.assert_not_called()  # replay never resolves or connects
+    with pytest.raises(fetcher.HTTPStatusError):
+        asyncio.run(afetch("https://example.com/missing", pool=replayer))
+    assert replayer.stats() == {"served": 1, "missing": 1, "errors": 0}
+
+
+@mock.patch("services.fetcher.fetcher.socket.getaddrinfo")
+def test_recorded_redirects_replay(mock_addr, tmp_path):
+    mock_addr.return_value = [(None, None, None, None, ("93.184.216.34", 0))]
+    open_connection, _ = _one_response_per_connection(
+        _redirect_response("https://example.com/final"),
+        _http_response(b'{"a": 1}'),
+    )
+    recorder = RecordingTransport(tmp_path, pool=ConnectionPool())
+    with mock.patch("asyncio.open_connection", open_connection):
+        asyncio.run(afetch("https://example.com/start", pool=recorder))
+    assert len(recorder.recorded) == 2
+
+    replayer = ReplayTransport(tmp_path)
+    res = asyncio.run(afetch("https://example.com/start", pool=replayer))
+    assert res.content == b'{"a": 1}'
+    assert replayer.stats()["served"] == 2
+
+
+def test_replay_simulates_latency_and_errors(tmp_path):
+    failing = ReplayTransport(tmp_path, ReplayConfig(error_rate=1.0))
+    with pytest.raises(ConnectionError):
+        asyncio.run(afetch("https://example.com", pool=failing))
+    throttled = ReplayTransport(
+        tmp_path, ReplayConfig(error_rate=1.0, error_status=503)
+    )
+    with pytest.raises(fetcher.HTTPStatusError) as err:
+        asyncio.run(afetch("https://example.com", pool=throttled))
+    assert err.value.retryable
+
+    slow = ReplayTransport(tmp_path, ReplayConfig(latency=0.05, jitter=0.02, seed=1))
+    start = time.perf_counter()
+    with pytest.raises(fetcher.HTTPStatusError):
+        asyncio.run(afetch("https://example.com", pool=slow))
+    assert 0.05 <= time.perf_counter() - start < 0.5
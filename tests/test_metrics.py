@@ -0,0 +1,114 @@
+"""Tests for pipeline metrics and the /metrics endpoint."""
+import asyncio
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.api import main as api
+from services.api import metrics
+from services.connectors import Connector, breaker
+
+
+class DuplicatingConnector(Connector):
+    source = "dup"
+
+    async def _search(self, query: str, **kwargs):
+        doc = {
+            "title": "Title",
+            "summary": "Summary",
+            "url": "https://example.com/a",
+            "source": self.source,
+            "fetched_at": "2024-01-01T00:00:00",
+            "raw": {"content": f"alice@example.com writes about {query}"},
+        }
+        return [doc, dict(doc)]
+
+
+class FailingConnector(Connector):
+    source = "failing"
+
+    async def _search(self, query: str, **kwargs):
+        raise RuntimeError("upstream down")
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    original = api.CONNECTORS[:]
+    api.CONNECTORS[:] = [DuplicatingConnector(), FailingConnector()]
+    api.QUERY_CACHE.clear()
+    api.PROFILE_STATES.clear()
+    api.PLANNER.reset()
+    metrics.REGISTRY.reset()
+    yield
+    api.CONNECTORS[:] = original
+    api.QUERY_CACHE.clear()
+    api.PROFILE_STATES.clear()
+    api.PLANNER.reset()
+    metrics.REGISTRY.reset()
+
+
+def _samples(text):
+    found = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            found[name] = float(value)
+    return found
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = metrics.Registry()
+    hist = registry.histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        hist.labels('a"b').observe(value)
+    samples = _samples(registry.render())
+    assert samples['t_seconds_bucket{stage="a\\"b",le="0.1"}'] == 1
+    assert samples['t_seconds_bucket{stage="a\\"b",le="1.0"}'] == 3
+    assert samples['t_seconds_bucket{stage="a\\"b",le="+Inf"}'] == 4
+    assert samples['t_seconds_count{stage="a\\"b"}'] == 4
+    assert samples['t_seconds_sum{stage="a\\"b"}'] == pytest.approx(4.05)
+    with pytest.raises(ValueError):
+        hist.labels()
+    with pytest.raises(ValueError):
+        registry.counter("t_seconds", "again")
+
+
+def test_profile_records_stage_timings_and_counters():
+    asyncio.run(api.profile(q="alice", type="person"))
+    response = asyncio.run(api.prometheus_metrics())
+    assert response.media_type == metrics.CONTENT_TYPE
+    text = response.body.decode()
+    samples = _samples(text)
+    for stage in ("normalise", "dedupe", "signals"):
+        assert samples[f'osint_stage_seconds_count{{stage="{stage}"}}'] == 1
+    assert samples['osint_connector_fetch_seconds_count{source="failing"}'] == 1
+    assert samples['osint_connector_errors_total{source="failing",status="error"}'] == 1
+    assert 'osint_connector_errors_total{source="dup"' not in text
+    assert samples['osint_docs_fetched_total{source="dup"}'] == 2
+    assert samples['osint_docs_kept_total{source="dup"}'] == 1
+    assert samples['osint_dedupe_dropped_total{kind="url"}'] == 1
+    assert samples["osint_query_cache_misses"] == 1
+    assert "osint_entity_store_entities" in samples
+    assert re.search(r"^# TYPE osint_stage_seconds histogram$", text, re.M)
+
+
+def test_source_state_is_exported_per_source():
+    quarantined = breaker.breaker_for("failing")
+    for _ in range(quarantined.failure_threshold):
+        quarantined.record_failure()
+    try:
+        asyncio.run(api.profile(q="alice", type="person"))
+        samples = _samples(asyncio.run(api.prometheus_metrics()).body.decode())
+    finally:
+        breaker.reset()
+    assert samples['osint_breaker_open{source="failing"}'] == 1
+    failures = samples['osint_breaker_failures{source="failing"}']
+    assert failures == quarantined.failure_threshold
+    assert samples['osint_limiter_in_flight{source="dup"}'] == 0
+    assert samples['osint_limiter_concurrency{source="dup"}'] >= 1
+    assert samples["osint_singleflight_in_flight"] == 0
+    assert samples["osint_singleflight_leaders"] >= 1
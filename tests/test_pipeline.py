@@ -1,7 +1,9 @@
 """Tests for deterministic search/profile pipeline using dummy connector."""
 import asyncio
 from datetime import datetime
+import json
 import sys
+import time
 from pathlib import Path
 
 import pytest
@@ -9,7 +11,9 @@ import pytest
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from services.api import main as api
-from services.connectors import Connector
+import services.connectors as connectors
+from services.connectors import BatchConnector, Connector
+from services.workers import pool as workers
 
 
 class DummyConnector(Connector):
@@ -32,43 +36,455 @@ class DummyConnector(Connector):
 def patch_connectors():
     original = api.CONNECTORS[:]
     api.CONNECTORS[:] = [DummyConnector()]
+    api.QUERY_CACHE.clear()
+    api.PROFILE_STATES.clear()
+    api.PLANNER.reset()
     yield
     api.CONNECTORS[:] = original
+    api.QUERY_CACHE.clear()
+    api.PROFILE_STATES.clear()
+    api.PLANNER.reset()
 
 
 def test_search_deduplicates_and_hashes():
     data = asyncio.run(api.search(q="alice", type="person"))
+    assert data["count"] == 1  # duplicate URLs collapsed
+    doc = data["docs"][0]
+    assert doc["url"] == "https://example.com/article"
+    assert len(doc["hash"]) == 64
+
+
+def test_normalise_doc_reuses_streamed_hash():
+    raw = {
+        "title": "RDAP data for example.com",
+        "url": "https://rdap.org/domain/example.com",
+        "source": "rdap",
+        "raw": {"name": "EXAMPLE.COM"},
+        "content_hash": "ab" * 32,
+    }
+    doc = api.normalise_doc(raw).to_dict()
+    assert doc["hash"] == "ab" * 32
+    assert doc["provenance"]["content_hash"] == "ab" * 32
+    assert doc["id"] == "abababab"
+    assert doc["raw"] == {"name": "EXAMPLE.COM"}
+    assert doc["provenance"]["fetched_at"] == ""  # not stamped like fetched_at
+
+
+def test_pipeline_returns_partial_results_at_deadline():
+    class SlowConnector(Connector):
+        source = "slow"
+
+        async def _search(self, query: str, **kwargs):
+            await asyncio.sleep(5)
+            return []
+
+    api.CONNECTORS.append(SlowConnector())
+    data = asyncio.run(api.search(q="alice", type="person", timeout_ms=100))
     assert data["count"] == 1
-"""Tests for deterministic search/profile pipeline."""
-import asyncio
-import sys
-from pathlib import Path
+    assert data["connectors"] == {"dummy": "ok", "slow": "timeout"}
 
-sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from services.api.main import profile, search  # noqa: E402
+async def _collect(response):
+    events = []
+    async for line in response.body_iterator:
+        events.append((time.monotonic(), json.loads(line)))
+    return events
 
 
-def test_search_deduplicates_and_hashes():
-    data = asyncio.run(search(q="alice", type="person"))
-    assert data["count"] == 1  # duplicate URLs collapsed
-    doc = data["docs"][0]
-    assert doc["url"] == "https://example.com/article"
-    assert len(doc["hash"]) == 64
+def test_search_stream_emits_fast_connectors_first():
+    class SlowConnector(DummyConnector):
+        source = "slow"
+
+        async def _search(self, query: str, **kwargs):
+            await asyncio.sleep(0.3)
+            docs = await super()._search(query)
+            other = {"content": "A slower source publishes an unrelated report on it."}
+            return [dict(d, url="https://example.com/slow", raw=other) for d in docs]
+
+    api.CONNECTORS.insert(0, SlowConnector())
+
+    async def run():
+        start = time.monotonic()
+        response = await api.search_stream(q="alice", type="person")
+        return start, await _collect(response)
+
+    start, events = asyncio.run(run())
+    assert [e["event"] for _, e in events] == ["connector", "connector", "summary"]
+    first_at, first = events[0]
+    assert first["source"] == "dummy" and first_at - start < 0.2
+    assert len(first["docs"]) == 1  # deduplicated within the connector
+    summary = events[-1][1]
+    assert summary["count"] == 2
+    assert summary["connectors"] == {"slow": "ok", "dummy": "ok"}
 
 
-def test_profile_extracts_signals():
-    result = asyncio.run(api.profile(q="alice", type="person"))
-    assert "alice@example.com" in result["signals"]["emails"]
-    assert result["confidence"] <= 1
-    assert result["query"] == "alice"
+def test_profile_stream_updates_aggregates_and_matches_profile():
+    async def run():
+        return await _collect(await api.profile_stream(q="alice", type="person"))
 
+    events = asyncio.run(run())
+    connector, summary = events[0][1], events[-1][1]
+    assert connector["signals"]["emails"] == ["alice@example.com"]
+    assert connector["canonical_name"] == "Example Title"
+    full = asyncio.run(api.profile(q="alice", type="person"))
+    assert summary["event"] == "summary" and summary["count"] == len(full["sources"])
+    for key in ("canonical_name", "aliases", "confidence", "signals", "connectors"):
+        assert summary[key] == full[key]
 
-def test_profile_includes_advanced_facts(monkeypatch):
+
+class CountingConnector(DummyConnector):
+    source = "counting"
+    calls = 0
+
+    async def _search(self, query: str, **kwargs):
+        CountingConnector.calls += 1
+        return await super()._search(query)
+
+
+def test_query_cache_serves_repeats_and_revalidates(monkeypatch):
+    CountingConnector.calls = 0
+    api.CONNECTORS[:] = [CountingConnector()]
+    monkeypatch.setattr(api.QUERY_CACHE, "ttl", 0.05)
+
+    async def run():
+        first = await api.search(q="alice", type="person")
+        second = await api.profile(q="alice", type="person")
+        assert CountingConnector.calls == 1
+        await asyncio.sleep(0.06)
+        stale = await api.search(q="alice", type="person")
+        assert stale["docs"] == first["docs"]  # served before the refresh
+        await asyncio.sleep(0.01)
+        return second
+
+    profile = asyncio.run(run())
+    assert profile["sources"][0]["title"] == "Example Title"
+    assert CountingConnector.calls == 2  # one background refresh
+    stats = api.QUERY_CACHE.stats()
+    assert stats["hits"] == 1 and stats["stale_hits"] == 1 and stats["misses"] == 1
+    assert stats["refreshes"] == 1 and stats["hit_ratio"] == pytest.approx(2 / 3)
+
+
+def test_query_cache_skips_partial_results():
+    class FailingConnector(Connector):
+        source = "failing"
+
+        async def _search(self, query: str, **kwargs):
+            raise ConnectionError("down")
+
+    CountingConnector.calls = 0
+    api.CONNECTORS[:] = [CountingConnector(), FailingConnector()]
+    asyncio.run(api.search(q="alice"))
+    asyncio.run(api.search(q="alice"))
+    assert CountingConnector.calls == 2
+    assert api.QUERY_CACHE.stats()["entries"] == 0
+
+
+def test_profile_is_identical_with_worker_processes(monkeypatch):
+    class OtherConnector(DummyConnector):
+        source = "other"
+
+        async def _search(self, query: str, **kwargs):
+            docs = await super()._search(query)
+            raw = {"content": "Reach bob@example.org about a different matter today."}
+            return [dict(docs[0], url="https://example.org/other", raw=raw)]
+
+    api.CONNECTORS.append(OtherConnector())
     monkeypatch.setenv("ADVANCED_FACTS", "true")
-    result = asyncio.run(api.profile(q="alice", type="person"))
-    assert set(result["facts"].keys()) == {"tech", "geo", "legal", "media"}
-    result = asyncio.run(profile(q="alice", type="person"))
-    assert "alice@example.com" in result["signals"]["emails"]
-    assert result["confidence"] <= 1
-    assert result["query"] == "alice"
+    inline = asyncio.run(api.profile(q="alice", type="person"))
+    api.QUERY_CACHE.clear()
+    api.PROFILE_STATES.clear()
+    offload = workers.WorkerConfig(processes=2, chunk_size=1)
+    monkeypatch.setattr(workers, "CONFIG", offload)
+    try:
+        offloaded = asyncio.run(api.profile(q="alice", type="person"))
+    finally:
+        workers.shutdown()
+    assert len(offloaded["sources"]) == 2
+    # sources carry per-fetch timestamps; every aggregate must match exactly
+    urls = [d["url"] for d in offloaded.pop("sources")]
+    assert urls == [d["url"] for d in inline.pop("sources")]
+    assert offloaded == inline
+
+
+def test_compact_docs_round_trip_and_save_memory():
+    import tracemalloc
+
+    def raw(i):
+        return {
+            "title": "RDAP data",
+            "url": f"https://rdap.org/domain/example{i}.com",
+            "source": "rdap",
+            "fetched_at": "2026-01-01T00:00:00",
+            "raw": {
+                "ldhName": f"EXAMPLE{i}.COM",
+                "nameservers": [{"ldhName": f"NS{j}.HOST.NET"} for j in range(4)],
+                "entities": [{"roles": [r]} for r in ("registrant", "abuse")],
+            },
+        }
+
+    doc = api.normalise_doc(raw(1))
+    assert not hasattr(doc, "__dict__")
+    data = doc.to_dict()
+    assert data["raw"] == raw(1)["raw"] and data["id"] == doc.hash[:8]
+    schema = json.loads(Path("packages/schemas/doc.schema.json").read_text())
+    assert set(data) == set(schema["required"])
+
+    def retained(build):
+        tracemalloc.start()
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size, kept
+
+    loose, _ = retained(
+        lambda: [api.normalise_doc(raw(i)).to_dict() for i in range(300)]
+    )
+    compact, _ = retained(lambda: [api.normalise_doc(raw(i)) for i in range(300)])
+    assert compact < loose / 2
+
+
+def test_blob_interner_is_bounded_by_bytes_and_caches_decoding():
+    from services.api import records
+
+    interner = records._BlobInterner(max_bytes=1000)
+    blobs = [json.dumps({"n": i, "pad": "x" * 80}).encode() for i in range(20)]
+    for blob in blobs:
+        assert interner.intern(blob) is blob
+    assert interner.total_bytes() <= 1000
+    # an equal payload gets the kept object; evicted ones are kept anew
+    assert interner.intern(bytes(bytearray(blobs[-1]))) is blobs[-1]
+    assert interner.intern(bytes(bytearray(blobs[0]))) is not blobs[0]
+    decoded = interner.decode(blobs[-1])
+    assert decoded == {"n": 19, "pad": "x" * 80}
+    assert interner.decode(blobs[-1]) is decoded
+    assert interner.total_bytes() <= 1000
+    # too large to share: neither kept nor cached
+    big = json.dumps({"pad": "x" * 200}).encode()
+    assert interner.intern(big) is big
+    assert interner.decode(big) is not interner.decode(big)
+
+
+def test_near_duplicates_cluster_under_one_representative():
+    story = (
+        "The city council approved the new harbour bridge budget on Monday "
+        "after a lengthy debate about costs and environmental impact"
+    )
+
+    class SyndicatedConnector(Connector):
+        source = "syndicated"
+
+        async def _search(self, query: str, **kwargs):
+            variants = [story, story + " (AP)", "Unrelated: " + story[::-1]]
+            return [
+                {
+                    "title": f"Copy {i}",
+                    "summary": "",
+                    "url": f"https://mirror{i}.example/story",
+                    "source": self.source,
+                    "raw": {"content": text},
+                }
+                for i, text in enumerate(variants)
+            ]
+
+    api.CONNECTORS[:] = [SyndicatedConnector()]
+    data = asyncio.run(api.search(q="bridge"))
+    assert [d["title"] for d in data["docs"]] == ["Copy 0", "Copy 2"]
+    duplicates = data["docs"][0]["provenance"]["duplicates"]
+    assert duplicates == [
+        {
+            "url": "https://mirror1.example/story",
+            "connector": "syndicated",
+            "content_hash": api.normalise_doc(
+                {"url": "https://x", "raw": {"content": story + " (AP)"}}
+            ).hash,
+        }
+    ]
+
+
+def test_profile_refresh_applies_only_changed_docs():
+    class ChangingConnector(Connector):
+        source = "changing"
+        titles = ["Alice"] * 6
+
+        async def _search(self, query: str, **kwargs):
+            return [
+                {
+                    "title": title,
+                    "summary": "",
+                    "url": f"https://example.com/{i}",
+                    "source": self.source,
+                    "raw": {"content": f"Mail alice{i}@example.com"},
+                }
+                for i, title in enumerate(self.titles)
+            ]
+
+    connector = ChangingConnector()
+    api.CONNECTORS[:] = [connector]
+
+    def profile():
+        api.QUERY_CACHE.clear()
+        data = asyncio.run(api.profile(q="alice", type="person"))
+        # docs are stamped with their fetch time on every run
+        for doc in data["sources"]:
+            del doc["fetched_at"], doc["provenance"]["fetched_at"]
+        return data
+
+    first = profile()
+    state = api.PROFILE_STATES.get("alice", "person")
+    assert state.extracted == 6
+    assert profile() == first
+    assert state.extracted == 6  # nothing changed, nothing re-extracted
+
+    connector.titles = ["Alice", "A. Smith", "A. Smith", "A. Smith", "Alice"]
+    updated = profile()
+    assert state.extracted == 6  # retitled docs keep their signals
+    assert updated["canonical_name"] == "A. Smith"
+    assert updated["aliases"] == ["Alice"]
+    assert "alice5@example.com" not in updated["signals"]["emails"]
+
+    connector.titles.append("Alice")
+    profile()
+    assert state.extracted == 7  # only the new doc
+
+    connector.titles.pop()
+    assert profile() == updated
+    api.PROFILE_STATES.clear()
+    assert profile() == updated  # same as building from scratch
+
+
+def test_concurrent_profiles_update_the_kept_state_in_turn(monkeypatch):
+    extract = workers.extract_signals_many
+
+    async def slow_extract(texts):
+        await asyncio.sleep(0.01)
+        return await extract(texts)
+
+    monkeypatch.setattr(workers, "extract_signals_many", slow_extract)
+
+    async def run():
+        return await asyncio.gather(
+            api.profile(q="alice", type="person"),
+            api.profile(q="alice", type="person"),
+        )
+
+    first, second = asyncio.run(run())
+    state = api.PROFILE_STATES.get("alice", "person")
+    assert state.extracted == 1
+    assert len(state.docs) == 1
+    assert first["signals"] == second["signals"]
+    assert first["signals"]["emails"] == ["alice@example.com"]
+
+
+def test_profile_stream_shares_the_kept_state():
+    async def stream():
+        return await _collect(await api.profile_stream(q="alice", type="person"))
+
+    asyncio.run(api.profile(q="alice", type="person"))
+    state = api.PROFILE_STATES.get("alice", "person")
+    assert state.extracted == 1
+    api.QUERY_CACHE.clear()
+    summary = asyncio.run(stream())[-1][1]
+    assert state.extracted == 1  # streamed docs reuse the kept signals
+    assert summary["signals"]["emails"] == ["alice@example.com"]
+
+    api.PROFILE_STATES.clear()
+    asyncio.run(stream())
+    state = api.PROFILE_STATES.get("alice", "person")
+    assert len(state.docs) == 1
+    api.QUERY_CACHE.clear()
+    asyncio.run(api.profile(q="alice", type="person"))
+    assert state.extracted == 0  # the stream brought the state up to date
+
+
+def test_profiles_batch_shares_fanout_and_reports_per_item(monkeypatch):
+    class BatchingConnector(BatchConnector, Connector):
+        source = "batching"
+        batch_size = 10
+        batches = []
+
+        async def _search_batch(self, queries, type=None, limit=5):
+            self.batches.append(list(queries))
+            return {
+                q: [
+                    {
+                        "title": q.title(),
+                        "summary": "",
+                        "url": f"https://example.com/{q}",
+                        "source": self.source,
+                        "raw": {"content": f"Write to {q}@example.com"},
+                    }
+                ]
+                for q in queries
+            }
+
+        async def _search(self, query: str, **kwargs):  # pragma: no cover
+            raise AssertionError("batch connectors are searched in batches")
+
+    counting = CountingConnector()
+    CountingConnector.calls = 0
+    api.CONNECTORS[:] = [BatchingConnector(), counting]
+    build = api._build_profile
+
+    async def failing_build(q, type, result):
+        if q == "carol":
+            raise RuntimeError("extraction failed")
+        return await build(q, type, result)
+
+    monkeypatch.setattr(api, "_build_profile", failing_build)
+    names = ["alice", "bob", "alice", "", "carol", "bob"]
+    items = [api.BatchProfileItem(q=q, type="person") for q in names]
+
+    async def run():
+        return await _collect(await api.profiles_batch(items))
+
+    events = [e for _, e in asyncio.run(run())]
+    assert BatchingConnector.batches == [["alice", "bob", "carol"]]
+    assert CountingConnector.calls == 3  # one upstream call per distinct query
+    by_index = {e["index"]: e for e in events if "index" in e}
+    assert sorted(by_index) == list(range(len(names)))
+    assert by_index[3]["event"] == "error" and by_index[4]["event"] == "error"
+    assert by_index[4]["error"] == "extraction failed"
+    assert by_index[0]["profile"] == by_index[2]["profile"]
+    assert by_index[1]["profile"]["signals"]["emails"] == [
+        "alice@example.com",
+        "bob@example.com",
+    ]
+    assert events[-1] == {"event": "summary", "count": 6, "unique": 3, "errors": 2}
+
+    # the shared fan-out populated the query cache for later single calls
+    single = asyncio.run(api.profile(q="bob", type="person"))
+    assert single["signals"] == by_index[1]["profile"]["signals"]
+    assert CountingConnector.calls == 3
+
+
+def test_abandoned_batch_cancels_its_upstream_calls():
+    cancelled = []
+
+    class HangingConnector(Connector):
+        def __init__(self, source):
+            self.source = source
+
+        async def _search(self, query: str, **kwargs):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append((self.source, query))
+                raise
+            return []  # pragma: no cover
+
+    # each item awaits the first source's calls before the second's
+    api.CONNECTORS[:] = [HangingConnector("first"), HangingConnector("second")]
+    items = [api.BatchProfileItem(q=q, type="person") for q in ("alice", "bob")]
+
+    async def run():
+        response = await api.profiles_batch(items)
+        first = asyncio.ensure_future(response.body_iterator.__anext__())
+        await asyncio.sleep(0.05)
+        first.cancel()  # the client went away
+        await asyncio.sleep(0.05)
+        return connectors.singleflight_stats()["in_flight"]
+
+    assert asyncio.run(run()) == 0
+    assert sorted(cancelled) == [
+        (source, q) for source in ("first", "second") for q in ("alice", "bob")
+    ]
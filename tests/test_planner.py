@@ -0,0 +1,175 @@
+"""Tests for query classification and connector planning."""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.api import main as api
+from services.connectors import Connector, ConnectorResult
+from services.connectors.planner import ConnectorPlanner, classify, source_query
+
+
+@pytest.mark.parametrize(
+    "query, type, kinds",
+    [
+        ("example.com", "person", ("domain",)),
+        ("alice@example.com", None, ("email",)),
+        ("Q42", None, ("wikidata_id",)),
+        ("@octocat", "person", ("username",)),
+        ("octocat", None, ("username", "person")),
+        ("alice", "person", ("person", "username")),
+        ("Barack Obama", "person", ("person",)),
+        ("Acme Pty Ltd", None, ("company",)),
+        ("Acme Widgets", "organisation", ("company",)),
+        ("Jane Smith", None, ("person", "company")),
+    ],
+)
+def test_classify(query, type, kinds):
+    assert classify(query, type) == kinds
+
+
+def _sources(plan):
+    return [c.source for c in plan.connectors]
+
+
+def test_default_connectors_are_routed_by_kind(monkeypatch):
+    monkeypatch.setenv("PHASE1_CONNECTORS", "true")
+    connectors = api.build_connectors()
+    planner = ConnectorPlanner()
+    person = planner.plan("Barack Obama", "person", connectors)
+    assert "rdap" not in _sources(person)
+    assert "github_users" not in _sources(person)
+    assert "wikipedia" in _sources(person)
+    domain = planner.plan("example.com", None, connectors)
+    assert {"rdap", "crt_sh", "wayback"} <= set(_sources(domain))
+    assert "github_users" not in _sources(domain)
+    assert set(_sources(planner.plan("octocat", None, connectors))) == {
+        "github_users",
+        "wikipedia",
+        "google_news",
+        "openalex",
+        "companies_house",
+        "gdelt",
+    }
+    assert _sources(planner.plan("Q42", None, connectors)) == ["wikidata"]
+    everything = ConnectorPlanner(enabled=False).plan("Q42", None, connectors)
+    assert len(everything.connectors) == len(connectors)
+
+
+class _Counting(Connector):
+    def __init__(self, source, kinds=None, docs=1):
+        self.source = source
+        self.kinds = frozenset(kinds) if kinds else None
+        self.docs = docs
+        self.calls = 0
+        self.queries = []
+
+    async def _search(self, query: str, **kwargs):
+        self.calls += 1
+        self.queries.append(query)
+        return [
+            {"title": query, "url": f"https://{self.source}.example/{query}/{i}"}
+            for i in range(self.docs)
+        ]
+
+
+def test_history_orders_prunes_and_explores():
+    fast, slow = _Counting("fast"), _Counting("slow")
+    empty = _Counting("empty", docs=0)
+    planner = ConnectorPlanner(min_calls=5, min_hit_rate=0.2, explore_every=3)
+    connectors = [slow, empty, fast]
+    for _ in range(5):
+        plan = planner.plan("Jane Smith", None, connectors)
+        for connector in plan.connectors:
+            status = "ok"
+            docs = [{}] * connector.docs
+            latency = 900 if connector is slow else 10
+            result = ConnectorResult(connector.source, status, docs, latency)
+            planner.record(plan.kind, result)
+    plan = planner.plan("Jane Smith", None, connectors)
+    assert _sources(plan) == ["fast", "slow"]
+    assert plan.skipped == {1: ("empty", "low_hit_rate")}
+    # every explore_every-th pruned query still reaches the source
+    probes = [
+        "empty" in _sources(planner.plan("Jane Smith", None, connectors))
+        for _ in range(5)
+    ]
+    assert probes == [False, True, False, False, True]
+    budget = ConnectorPlanner(max_sources=1)
+    budget._history = planner._history
+    capped = budget.plan("Jane Smith", None, connectors)
+    assert _sources(capped) == ["fast"]
+    assert capped.skipped[0] == ("slow", "budget")
+
+
+def test_search_skips_inapplicable_connectors(monkeypatch):
+    rdap = _Counting("rdap", {"domain"})
+    github = _Counting("github_users", {"username"})
+    news = _Counting("news", {"person", "company", "domain"})
+    original = api.CONNECTORS[:]
+    api.CONNECTORS[:] = [rdap, github, news]
+    api.QUERY_CACHE.clear()
+    api.PLANNER.reset()
+    try:
+        data = asyncio.run(api.search(q="Barack Obama", type="person"))
+        assert data["connectors"] == {
+            "rdap": "skipped",
+            "github_users": "skipped",
+            "news": "ok",
+        }
+        assert data["count"] == 1
+        assert (rdap.calls, github.calls, news.calls) == (0, 0, 1)
+        # results with skipped sources are complete and cached
+        asyncio.run(api.search(q="Barack Obama", type="person"))
+        assert news.calls == 1
+
+        queries = [("example.com", None), ("octocat", None), ("Ada Lovelace", None)]
+        batch = api.profiles_batch(
+            [api.BatchProfileItem(q=q, type=t or "") for q, t in queries]
+        )
+        response = asyncio.run(batch)
+
+        async def drain():
+            return [chunk async for chunk in response.body_iterator]
+
+        asyncio.run(drain())
+        assert (rdap.calls, github.calls, news.calls) == (1, 1, 4)
+    finally:
+        api.CONNECTORS[:] = original
+        api.QUERY_CACHE.clear()
+        api.PROFILE_STATES.clear()
+        api.PLANNER.reset()
+
+
+def test_handles_reach_username_sources_without_at():
+    github = _Counting("github_users", {"username"})
+    anything = _Counting("anything")
+    assert source_query("@torvalds", github) == "torvalds"
+    assert source_query("@torvalds", anything) == "@torvalds"
+    assert source_query("torvalds", github) == "torvalds"
+    assert source_query("@not a handle", github) == "@not a handle"
+
+    original = api.CONNECTORS[:]
+    api.CONNECTORS[:] = [github, anything]
+    api.QUERY_CACHE.clear()
+    api.PLANNER.reset()
+    try:
+        asyncio.run(api.search(q="@torvalds"))
+        items = [api.BatchProfileItem(q=q, type="") for q in ("@linus", "linus")]
+        response = asyncio.run(api.profiles_batch(items))
+
+        async def drain():
+            return [chunk async for chunk in response.body_iterator]
+
+        asyncio.run(drain())
+        # both spellings of the handle share one upstream call
+        assert github.queries == ["torvalds", "linus"]
+        assert anything.queries == ["@torvalds", "@linus", "linus"]
+    finally:
+        api.CONNECTORS[:] = original
+        api.QUERY_CACHE.clear()
+        api.PROFILE_STATES.clear()
+        api.PLANNER.reset()
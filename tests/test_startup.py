@@ -0,0 +1,72 @@
+"""Start-up guard: importing the API must not load connectors, NER or weights."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# a stand-in for spaCy whose import is slow, like the real one
+_FAKE_SPACY = """
+import time
+time.sleep(1.0)
+
+
+class _Pipeline:
+    pipe_names = ["ner"]
+
+    def __call__(self, text):
+        return type("Doc", (), {"ents": []})()
+
+
+def load(name):
+    return _Pipeline()
+"""
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import services.api.main as api
+from services.analytics import confidence
+from services.ner import ner
+state = {
+    "import_s": time.perf_counter() - start,
+    "spacy": "spacy" in sys.modules,
+    "connectors": "CONNECTORS" in vars(api),
+    "weights": confidence.get_weights.cache_info().currsize,
+}
+api.warm_up()
+state["warm"] = {
+    "spacy": "spacy" in sys.modules,
+    "connectors": len(api.CONNECTORS),
+    "weights": confidence.get_weights.cache_info().currsize,
+    "nlp": ner.get_nlp() is not None,
+}
+print(json.dumps(state))
+"""
+
+
+def test_import_is_lazy_and_warm_up_loads_everything(tmp_path):
+    (tmp_path / "spacy.py").write_text(_FAKE_SPACY)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), str(ROOT)]))
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    state = json.loads(out.stdout.strip().splitlines()[-1])
+    assert not state["spacy"]
+    assert not state["connectors"]
+    assert state["weights"] == 0
+    # the slow fake spaCy import alone would take a second
+    assert state["import_s"] < 1.0
+    assert state["warm"] == {
+        "spacy": True,
+        "connectors": 4,
+        "weights": 1,
+        "nlp": True,
+    }
@@ -0,0 +1,97 @@
+"""Tests for the CPU offload process pool."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.workers import pool as workers
+from services.workers.pool import WorkerConfig
+
+
+@pytest.fixture(autouse=True)
+def stop_workers():
+    yield
+    workers.shutdown()
+
+
+def _texts(n):
+    return [
+        f"Doc {i}: write to user{i}@example{i % 7}.com or @handle{i}, "
+        f"call +1 555 {100 + i} {1000 + i}. Barack Obama visited Paris."
+        for i in range(n)
+    ]
+
+
+def test_chunked_results_match_inline_and_keep_order():
+    texts = _texts(50)
+    inline = workers.signals_chunk(texts)
+    config = WorkerConfig(processes=2, chunk_size=8)
+    offloaded = asyncio.run(workers.extract_signals_many(texts, config))
+    assert offloaded == inline
+    assert offloaded[7]["emails"] == ["user7@example0.com"]
+    assert offloaded[0]["locations"] == ["Paris"]
+
+
+def test_small_inputs_are_split_across_workers(monkeypatch):
+    sizes = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, chunk):
+            sizes.append(len(chunk))
+            return super().submit(fn, chunk)
+
+    executor = RecordingExecutor(2)
+    monkeypatch.setattr(workers, "get_executor", lambda config: executor)
+    texts = _texts(10)
+    config = WorkerConfig(processes=2)
+    assert asyncio.run(workers.extract_signals_many(texts, config)) == (
+        workers.signals_chunk(texts)
+    )
+    assert sizes == [5, 5]
+    sizes.clear()
+    asyncio.run(workers.extract_signals_many(_texts(150), config))
+    assert sizes == [64, 64, 22]
+    assert asyncio.run(workers.extract_signals_many([], config)) == []
+    assert sizes == [64, 64, 22]
+    executor.shutdown()
+
+
+def test_disabled_pool_runs_inline():
+    assert workers.get_executor(WorkerConfig(processes=0)) is None
+    texts = _texts(3)
+    result = asyncio.run(workers.extract_signals_many(texts, WorkerConfig()))
+    assert result == workers.signals_chunk(texts)
+
+
+def test_event_loop_stays_responsive_while_offloaded():
+    texts = _texts(400) * 5
+    config = WorkerConfig(processes=2, chunk_size=200)
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.001)
+                ticks += 1
+
+        beat = asyncio.ensure_future(heartbeat())
+        await workers.extract_signals_many(texts, config)
+        beat.cancel()
+        return ticks
+
+    assert asyncio.run(run()) > 0
+
+
+def test_config_is_read_once(monkeypatch):
+    monkeypatch.setattr(workers, "CONFIG", WorkerConfig())
+    monkeypatch.setenv("PROFILE_WORKERS", "2")
+    # the environment was read at import; later changes are not picked up
+    assert workers.get_executor() is None
+    monkeypatch.setattr(workers, "CONFIG", WorkerConfig(processes=1))
+    assert workers.get_executor() is not None